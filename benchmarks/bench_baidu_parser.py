@@ -0,0 +1,95 @@
+"""百度marketData解析基准测试
+
+对比逐行split构造DataFrame的原解析方式与parse_baidu_market_data。
+
+用法：
+    python benchmarks/bench_baidu_parser.py                 # 使用已录制的载荷
+    python benchmarks/bench_baidu_parser.py --record IF888  # 从百度接口录制载荷
+    python benchmarks/bench_baidu_parser.py --synthetic 20000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import update
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+DEFAULT_PAYLOAD = os.path.join(FIXTURE_DIR, 'baidu_kline_IF888.json')
+
+
+def parse_legacy(raw_str: str, keys: list) -> pd.DataFrame:
+    """原解析方式：Python中逐行split后构造DataFrame"""
+    rows = [line.split(',') for line in raw_str.split(';') if line]
+    df = pd.DataFrame(rows, columns=keys)
+    df['time'] = pd.to_datetime(df['time'])
+    df['close'] = pd.to_numeric(df['close'], errors='coerce')
+    return df[['time', 'close']]
+
+
+def record_payload(code: str, path: str) -> None:
+    """从百度接口录制完整K线载荷"""
+    payload = update.http_get_json(update.get_baidu_kline_url(code, is_futures=not code.isdigit()))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False)
+    print(f"已录制{code}载荷到 {path}")
+
+
+def synthetic_payload(n: int) -> dict:
+    """生成与百度接口格式一致的合成载荷"""
+    keys = ['timestamp', 'time', 'open', 'close', 'volume', 'high', 'low', 'amount', 'range', 'ratio', 'avgPrice']
+    times = pd.date_range('2010-04-16', periods=n, freq='B')
+    close = 3000 + np.random.default_rng(0).standard_normal(n).cumsum() * 20
+    rows = [
+        f"{int(t.timestamp())},{t:%Y-%m-%d},{c:.2f},{c:.2f},1000,{c + 5:.2f},{c - 5:.2f},1e8,1.20,0.04,{c:.2f}"
+        for t, c in zip(times, close)
+    ]
+    return {'Result': {'newMarketData': {'keys': keys, 'marketData': ';'.join(rows)}}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='百度marketData解析基准测试')
+    parser.add_argument('payload', nargs='?', default=DEFAULT_PAYLOAD, help='载荷JSON文件路径')
+    parser.add_argument('--record', metavar='CODE', help='从百度接口录制指定代码的载荷')
+    parser.add_argument('--synthetic', type=int, metavar='N', help='使用N根K线的合成载荷')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数')
+    args = parser.parse_args()
+    
+    if args.record:
+        record_payload(args.record, args.payload)
+    
+    if args.synthetic:
+        payload = synthetic_payload(args.synthetic)
+    elif os.path.exists(args.payload):
+        with open(args.payload, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+    else:
+        print(f"载荷文件 {args.payload} 不存在，请先使用 --record 录制或使用 --synthetic")
+        return 1
+    
+    raw_str = payload['Result']['newMarketData']['marketData']
+    keys = payload['Result']['newMarketData']['keys']
+    
+    pd.testing.assert_frame_equal(
+        parse_legacy(raw_str, keys).reset_index(drop=True),
+        update.parse_baidu_market_data(raw_str, keys).reset_index(drop=True),
+        check_dtype=False
+    )
+    
+    bars = raw_str.count(';') + 1
+    print(f"载荷：{bars} 根K线，{len(raw_str) / 1024:.0f} KB")
+    for label, func in [('legacy', parse_legacy), ('vectorized', update.parse_baidu_market_data)]:
+        best = min(timeit.repeat(lambda: func(raw_str, keys), number=1, repeat=args.repeat))
+        print(f"{label:>10}: {best * 1000:8.2f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""update.py各阶段离线基准测试
+
+用fixture_store录制的数据回放全部外部接口，在临时工作目录中分别计时各阶段，
+结果写入JSON文件，并可与保存的基线比较，任一阶段变慢超过阈值时返回非零退出码。
+每次计时前清空缓存目录和构建状态，测量的是没有任何缓存时的耗时。
+
+用法：
+    python benchmarks/fixture_store.py synthetic             # 先准备录制数据
+    python benchmarks/bench_pipeline.py                      # 计时并写入结果
+    python benchmarks/bench_pipeline.py --save-baseline      # 将本次结果保存为基线
+    python benchmarks/bench_pipeline.py --threshold 0.2      # 与基线比较
+"""
+import argparse
+import contextlib
+import datetime
+import glob
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import timeit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import pandas as pd
+
+import update
+from config import STOCK_CONFIG, INDEX_CONFIG, FUTURES_CONFIG, FILE_PATHS
+
+import fixture_store
+
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, 'results.json')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+
+def prepare_workdir(fixture_dir: str) -> str:
+    """创建临时工作目录，放入模板、策略片段和热门个股文件"""
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    shutil.copytree(os.path.join(fixture_store.REPO_DIR, FILE_PATHS['template_dir']),
+                    os.path.join(workdir, FILE_PATHS['template_dir']))
+    for filename in fixture_store.HOT_STOCK_FILES:
+        source = os.path.join(fixture_dir, filename)
+        if os.path.exists(source):
+            shutil.copyfile(source, os.path.join(workdir, filename))
+    fragment = os.path.join(fixture_store.REPO_DIR, FILE_PATHS['strategy_fragment'])
+    if os.path.exists(fragment):
+        shutil.copyfile(fragment, os.path.join(workdir, FILE_PATHS['strategy_fragment']))
+    return workdir
+
+
+def reset_caches() -> None:
+    """清空缓存目录、图表数据、概念索引和构建状态"""
+    shutil.rmtree(FILE_PATHS['cache_dir'], ignore_errors=True)
+    shutil.rmtree(FILE_PATHS['chart_data_dir'], ignore_errors=True)
+    for index_file in glob.glob('*.index.json'):
+        os.remove(index_file)
+    update._build_state = None
+    update._template_env = None
+
+
+def time_stage(func, repeat: int) -> dict:
+    """计时一个阶段，每次运行前清空缓存，阶段内的打印输出被丢弃"""
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+    
+    times = timeit.repeat(run, setup=reset_caches, number=1, repeat=repeat)
+    return {
+        'best_ms': round(min(times) * 1000, 3),
+        'median_ms': round(statistics.median(times) * 1000, 3),
+        'mean_ms': round(statistics.mean(times) * 1000, 3)
+    }
+
+
+def run_benchmarks(fixture_dir: str, repeat: int) -> dict:
+    """在临时工作目录中依次计时各阶段，返回各阶段的耗时统计"""
+    symbol = STOCK_CONFIG['main_stock']['symbol']
+    name = STOCK_CONFIG['main_stock']['name']
+    payloads = {code: fixture_store.load_baidu_fixture(fixture_dir, code)['Result']['newMarketData']
+                for code, _ in fixture_store.get_baidu_codes()}
+
+    def parse_payloads():
+        return {code: update.parse_baidu_market_data(market['marketData'], market['keys'])
+                for code, market in payloads.items()}
+    
+    klines = parse_payloads()
+    contracts = [code for code, is_futures in fixture_store.get_baidu_codes() if is_futures]
+
+    def compute_basis():
+        closes = pd.concat({code: df.set_index('time')['close'] for code, df in klines.items()}, axis=1).sort_index()
+        return update.compute_basis_matrix(closes, contracts, {code: None for code in contracts})
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine = compute_basis()
+        basis = {key: update.get_contract_basis_frame(engine, futures['future_code'])
+                 for key, futures in FUTURES_CONFIG.items()}
+        update.get_stock_history(symbol)
+        context = {
+            'stock_data': update.get_stock_data(symbol, name),
+            'indices': [update.get_index_data(idx['symbol'], idx['name']) for idx in INDEX_CONFIG],
+            'latest_png': None,
+            'strategy_html': update.read_strategy_fragment(),
+            'hot_concepts': update.get_hot_concepts(),
+            'stocks_by_concept': update.get_stocks_by_concept(),
+            'recent_trading_data': update.get_recent_trading_days_data(symbol, name),
+            'stock_kline_html': update.create_stock_kline_chart(symbol, name),
+            'intraday_charts': []
+        }
+        for key, futures in FUTURES_CONFIG.items():
+            chart_html = update.create_basis_chart(basis[key], futures['name'], futures['chart_file'])
+            context[f"has_{key}_chart"] = bool(chart_html)
+            context[f"{key}_chart_html"] = chart_html
+
+    def create_basis_charts():
+        for key, futures in FUTURES_CONFIG.items():
+            update.create_basis_chart(basis[key], futures['name'], futures['chart_file'])
+    
+    stages = {
+        'parse_baidu_payloads': parse_payloads,
+        'basis_matrix': compute_basis,
+        'create_basis_chart': create_basis_charts,
+        'create_stock_kline_chart': lambda: update.create_stock_kline_chart(symbol, name),
+        'get_stocks_by_concept': update.get_stocks_by_concept,
+        'render_html_to_file': lambda: update.render_html_to_file(
+            FILE_PATHS['index_html'], date=datetime.date.today().isoformat(), published=[], **context)
+    }
+    
+    results = {}
+    for stage, func in stages.items():
+        results[stage] = time_stage(func, repeat)
+        print(f"{stage:>26}: {results[stage]['best_ms']:10.2f} ms")
+    results['_rows'] = {code: len(df) for code, df in klines.items()}
+    results['_rows'].update({f"basis_{key}": len(df) for key, df in basis.items()})
+    return results
+
+
+def compare_with_baseline(stages: dict, baseline: dict, threshold: float) -> list:
+    """比较各阶段最优耗时与基线，返回超出阈值的阶段说明"""
+    regressions = []
+    for stage, stats in baseline['stages'].items():
+        if stage not in stages:
+            continue
+        ratio = stages[stage]['best_ms'] / max(stats['best_ms'], 1e-6)
+        mark = '❌' if ratio > 1 + threshold else '✅'
+        print(f"{mark} {stage:>26}: {stats['best_ms']:10.2f} → {stages[stage]['best_ms']:10.2f} ms ({ratio:.2f}x)")
+        if ratio > 1 + threshold:
+            regressions.append(f"{stage} 变慢 {ratio:.2f}x")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='update.py各阶段离线基准测试')
+    parser.add_argument('--fixture-dir', default=fixture_store.FIXTURE_DIR, help='录制数据目录')
+    parser.add_argument('--repeat', type=int, default=5, help='每个阶段的重复次数')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='结果JSON文件路径')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基线JSON文件路径')
+    parser.add_argument('--threshold', type=float, default=0.25, help='允许相对基线变慢的比例')
+    parser.add_argument('--save-baseline', action='store_true', help='将本次结果保存为基线')
+    args = parser.parse_args()
+    
+    try:
+        manifest = fixture_store.load_manifest(args.fixture_dir)
+    except FileNotFoundError:
+        print(f"录制数据 {args.fixture_dir} 不存在，请先运行 fixture_store.py record 或 synthetic")
+        return 1
+    
+    fixture_dir = os.path.abspath(args.fixture_dir)
+    output = os.path.abspath(args.output)
+    baseline_file = os.path.abspath(args.baseline)
+    
+    fixture_store.install_replay(fixture_dir)
+    workdir = prepare_workdir(fixture_dir)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        stages = run_benchmarks(fixture_dir, args.repeat)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    rows = stages.pop('_rows')
+    result = {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'fixtures': {'source': manifest['source'], 'recorded_at': manifest['recorded_at'], 'rows': rows},
+        'repeat': args.repeat,
+        'stages': stages
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {output}")
+    
+    if args.save_baseline:
+        shutil.copyfile(output, baseline_file)
+        print(f"基线已保存到 {baseline_file}")
+        return 0
+    
+    if not os.path.exists(baseline_file):
+        print("没有基线文件，跳过回归检查（使用 --save-baseline 保存基线）")
+        return 0
+    
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare_with_baseline(stages, baseline, args.threshold)
+    if regressions:
+        print(f"❌ 性能回归（阈值 {args.threshold:.0%}）：{'；'.join(regressions)}")
+        return 1
+    print("✅ 所有阶段均在基线阈值内")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
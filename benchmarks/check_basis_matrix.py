@@ -0,0 +1,97 @@
+"""基差矩阵正确性检查
+
+构造带缺口的期现货收盘价（合约上市晚于现货、期货和现货各自随机缺少若干时间点），
+用compute_basis_matrix一次性计算全部合约，再对每个合约按时间内连接期现货、
+用pandas rolling单独计算，逐列比较。任一指标不一致时返回非零退出码。
+
+用法：
+    python benchmarks/check_basis_matrix.py
+    python benchmarks/check_basis_matrix.py --rows 3000 --gap-rate 0.05 --seed 1
+"""
+import argparse
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import numpy as np
+import pandas as pd
+
+import update
+from config import BASIS_CONFIG, TECHNICAL_INDICATORS
+
+CONTRACTS = ['IF888', 'IH888', 'IC888', 'IM888', 'IF2612']
+
+
+def make_closes(rows: int, gap_rate: float, seed: int) -> pd.DataFrame:
+    """生成外连接对齐后的收盘价矩阵，缺口处为NaN"""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range('2015-01-05', periods=rows)
+    closes = {}
+    for product in BASIS_CONFIG['products'].values():
+        closes[product['spot_code']] = 4000 + rng.standard_normal(rows).cumsum() * 20
+    for code in CONTRACTS:
+        spot = closes[BASIS_CONFIG['products'][code[:2]]['spot_code']]
+        closes[code] = spot + rng.standard_normal(rows) * 10 - 5
+    df = pd.DataFrame(closes, index=index)
+
+    # 各列随机缺少若干时间点，部分合约晚于现货上市
+    df = df.mask(rng.random(df.shape) < gap_rate)
+    df.iloc[:rows // 3, df.columns.get_loc('IM888')] = np.nan
+    df.iloc[:rows - 200, df.columns.get_loc('IF2612')] = np.nan
+    return df
+
+
+def reference_frame(closes: pd.DataFrame, code: str) -> pd.DataFrame:
+    """按旧的日线算法计算单个合约：期现货按时间内连接后用pandas rolling"""
+    spot_code = BASIS_CONFIG['products'][code[:2]]['spot_code']
+    df = pd.concat({'close_fut': closes[code], 'close_spot': closes[spot_code]}, axis=1).dropna()
+    basis = df['close_fut'] - df['close_spot']
+    bollinger = TECHNICAL_INDICATORS['BOLLINGER_WINDOW']
+    multiplier = TECHNICAL_INDICATORS['STD_MULTIPLIER']
+
+    ref = pd.DataFrame({'basis': basis})
+    ref['ma60'] = basis.rolling(TECHNICAL_INDICATORS['MA60_WINDOW']).mean()
+    ref['mid'] = basis.rolling(bollinger).mean()
+    ref['std'] = basis.rolling(bollinger).std()
+    ref['upper'] = ref['mid'] + multiplier * ref['std']
+    ref['lower'] = ref['mid'] - multiplier * ref['std']
+    for window in BASIS_CONFIG['zscore_windows']:
+        ref[f"zscore_{window}"] = (basis - basis.rolling(window).mean()) / basis.rolling(window).std()
+    for window in BASIS_CONFIG['percentile_windows']:
+        ref[f"pct_rank_{window}"] = basis.rolling(window).apply(lambda w: (w <= w[-1]).mean() * 100, raw=True)
+    return ref.reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='基差矩阵正确性检查')
+    parser.add_argument('--rows', type=int, default=1500, help='时间点数量')
+    parser.add_argument('--gap-rate', type=float, default=0.03, help='每列随机缺失时间点的比例')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+    args = parser.parse_args()
+
+    closes = make_closes(args.rows, args.gap_rate, args.seed)
+    engine = update.compute_basis_matrix(closes, CONTRACTS, {code: None for code in CONTRACTS})
+
+    failures = []
+    for code in CONTRACTS:
+        actual = update.get_contract_basis_frame(engine, code)
+        expected = reference_frame(closes, code)
+        if len(actual) != len(expected):
+            failures.append(f"{code}: 行数 {len(actual)} ≠ {len(expected)}")
+            continue
+        for column in expected.columns:
+            if not np.allclose(actual[column], expected[column], equal_nan=True):
+                failures.append(f"{code}.{column}")
+        print(f"{code}: {len(actual)}行")
+
+    if failures:
+        print(f"❌ 与pandas rolling不一致：{'，'.join(failures)}")
+        return 1
+    print("✅ 基差矩阵与pandas rolling一致")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
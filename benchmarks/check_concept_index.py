@@ -0,0 +1,141 @@
+"""概念索引正确性检查
+
+在临时工作目录中为热门个股数据构建概念索引，将get_top_concepts、get_stocks_in_concepts、
+get_stock_concepts和get_stocks_by_concept的结果与直接遍历原始数据的结果逐项比较，
+并确认数据文件只改变修改时间时复用已保存的索引、内容改变时重新构建。
+任一检查不通过时返回非零退出码。
+
+用法：
+    python benchmarks/check_concept_index.py
+    python benchmarks/check_concept_index.py --data-file all_hot_stocks.json --pairs 500
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import update
+from config import FILE_PATHS
+
+
+def scan_concepts(data: dict) -> tuple:
+    """直接遍历原始数据，返回(代码→首次出现的个股记录, 概念→股票代码列表, 代码→概念列表)"""
+    records, concept_codes, code_concepts = {}, {}, {}
+    for stocks_list in data.values():
+        if not isinstance(stocks_list, list):
+            continue
+        for stock in stocks_list:
+            records.setdefault(stock['code'], stock)
+            for concept in (stock.get('concept') or '').split():
+                if stock['code'] not in concept_codes.setdefault(concept, []):
+                    concept_codes[concept].append(stock['code'])
+                    code_concepts.setdefault(stock['code'], []).append(concept)
+    return records, concept_codes, code_concepts
+
+
+def check_queries(index: dict, data: dict, pairs: int, seed: int) -> list:
+    """比较索引查询与直接遍历的结果，返回不一致项的说明"""
+    records, concept_codes, code_concepts = scan_concepts(data)
+    failures = []
+
+    counts = sorted((len(codes) for codes in concept_codes.values()), reverse=True)
+    for k in (1, 10, len(counts)):
+        top = update.get_top_concepts(index, k)
+        if [item['count'] for item in top] != counts[:k]:
+            failures.append(f"get_top_concepts({k})的股票数")
+        if any(len(concept_codes[item['concept']]) != item['count'] for item in top):
+            failures.append(f"get_top_concepts({k})的概念")
+
+    for code, concepts in code_concepts.items():
+        if update.get_stock_concepts(index, code) != concepts:
+            failures.append(f"get_stock_concepts({code})")
+    if update.get_stock_concepts(index, '000000') != []:
+        failures.append("get_stock_concepts(不存在的代码)")
+
+    rng = random.Random(seed)
+    names = sorted(concept_codes)
+    for _ in range(pairs if names else 0):
+        concepts = rng.sample(names, min(len(names), rng.randint(1, 3)))
+        expected = [records[code] for code in concept_codes[concepts[0]]
+                    if all(code in concept_codes[concept] for concept in concepts[1:])]
+        if update.get_stocks_in_concepts(index, concepts) != expected:
+            failures.append(f"get_stocks_in_concepts({concepts})")
+    if update.get_stocks_in_concepts(index, []) != []:
+        failures.append("get_stocks_in_concepts([])")
+
+    grouped = update.get_stocks_by_concept()
+    if grouped is None or grouped['total_concepts'] != len(concept_codes) or any(
+            [stock['code'] for stock in group['stocks']] != concept_codes[group['concept']]
+            for group in grouped['sorted_concepts']):
+        failures.append("get_stocks_by_concept")
+    return failures
+
+
+def check_reuse(data_file: str) -> list:
+    """确认只改变修改时间时复用索引、内容改变时重新构建，返回不一致项的说明"""
+    failures = []
+
+    def rebuilt() -> bool:
+        before = update._metrics['counters'].get('concept_index.reused', 0)
+        update.get_concept_index(data_file)
+        return update._metrics['counters'].get('concept_index.reused', 0) == before
+
+    rebuilt()
+    future = time.time() + 3600
+    os.utime(data_file, (future, future))
+    if rebuilt():
+        failures.append("数据文件只改变修改时间时重新构建了索引")
+
+    with open(data_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    data['_check'] = []
+    with open(data_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    if not rebuilt():
+        failures.append("数据文件内容改变后没有重新构建索引")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='概念索引正确性检查')
+    parser.add_argument('--data-file', default=os.path.join(REPO_DIR, FILE_PATHS['hot_stocks_json']),
+                        help='热门个股数据文件')
+    parser.add_argument('--pairs', type=int, default=200, help='随机抽查的概念组合数')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.data_file):
+        print(f"热门个股数据 {args.data_file} 不存在")
+        return 1
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix='check_concept_index_')
+    try:
+        shutil.copyfile(args.data_file, os.path.join(workdir, FILE_PATHS['hot_stocks_json']))
+        os.chdir(workdir)
+        with open(FILE_PATHS['hot_stocks_json'], 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        index = update.get_concept_index(FILE_PATHS['hot_stocks_json'])
+        failures = check_queries(index, data, args.pairs, args.seed) + check_reuse(FILE_PATHS['hot_stocks_json'])
+        print(f"{len(index['records'])}只个股，{len(index['sorted_concepts'])}个概念")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failures:
+        print(f"❌ 概念索引检查不通过：{'，'.join(failures)}")
+        return 1
+    print("✅ 概念索引与直接遍历结果一致")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
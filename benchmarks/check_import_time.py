@@ -0,0 +1,65 @@
+"""update.py导入耗时检查
+
+在全新的解释器中导入update，检查耗时是否在预算内，并确认akshare、pandas等
+重量级模块没有在导入时被加载。超出预算或加载了重量级模块时返回非零退出码。
+
+用法：
+    python benchmarks/check_import_time.py
+    python benchmarks/check_import_time.py --budget-ms 150 --repeat 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['akshare', 'pandas', 'numpy', 'plotly', 'requests', 'jinja2']
+
+PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import update
+elapsed = time.perf_counter() - start
+print(json.dumps({{'elapsed': elapsed, 'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import() -> dict:
+    """在子进程中导入update，返回耗时和已加载的重量级模块"""
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE],
+        cwd=REPO_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='update.py导入耗时检查')
+    parser.add_argument('--budget-ms', type=float, default=200, help='导入耗时预算（毫秒）')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数，取最小值')
+    args = parser.parse_args()
+    
+    results = [measure_import() for _ in range(args.repeat)]
+    best_ms = min(r['elapsed'] for r in results) * 1000
+    loaded = sorted(set(m for r in results for m in r['loaded']))
+    
+    print(f"导入update耗时：{best_ms:.1f} ms（预算 {args.budget_ms:.0f} ms）")
+    ok = True
+    if best_ms > args.budget_ms:
+        print("❌ 导入耗时超出预算")
+        ok = False
+    if loaded:
+        print(f"❌ 导入时加载了重量级模块：{', '.join(loaded)}")
+        ok = False
+    if ok:
+        print("✅ 导入耗时检查通过")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,310 @@
+"""基准测试数据录制与回放
+
+录制update.py用到的全部外部数据：akshare接口返回的DataFrame、百度getstockquotation
+的JSON载荷以及热门个股JSON文件，回放时替换akshare函数和HTTP会话，使整个流程
+可以在没有网络的情况下运行。
+
+用法：
+    python benchmarks/fixture_store.py record      # 从真实接口录制
+    python benchmarks/fixture_store.py synthetic   # 生成与接口格式一致的合成数据
+"""
+import argparse
+import datetime
+import json
+import os
+import shutil
+import sys
+from urllib.parse import parse_qsl, urlparse
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import update
+from config import STOCK_CONFIG, INDEX_CONFIG, FUTURES_CONFIG, BASIS_CONFIG, FILE_PATHS
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+MANIFEST_FILE = 'manifest.json'
+HOT_STOCK_FILES = [FILE_PATHS['hot_stocks_json'], FILE_PATHS['hot_concepts_json']]
+
+
+def ak_fixture_name(func: str, arg: str = '') -> str:
+    """akshare接口录制文件名"""
+    return f"ak_{func}_{arg}.pkl" if arg else f"ak_{func}.pkl"
+
+
+def baidu_fixture_name(code: str) -> str:
+    """百度K线载荷录制文件名，与bench_baidu_parser的默认载荷一致"""
+    return f"baidu_kline_{code}.json"
+
+
+def get_baidu_codes() -> list:
+    """基差引擎用到的全部(代码, 是否期货)
+    
+    近月交割合约的代码每月滚动，录制下来很快就会过期，所以只录制主力连续合约；
+    回放时交割合约请求失败，基差引擎会跳过它们。
+    """
+    contracts = list(dict.fromkeys(BASIS_CONFIG['contracts'] + [f['future_code'] for f in FUTURES_CONFIG.values()]))
+    spot_codes = list(dict.fromkeys(BASIS_CONFIG['products'][code[:2]]['spot_code'] for code in contracts))
+    return [(code, True) for code in contracts] + [(code, False) for code in spot_codes]
+
+
+def get_ak_calls() -> list:
+    """update.py中用到的akshare调用：(函数名, 参数名, 参数值)"""
+    symbol = STOCK_CONFIG['main_stock']['symbol']
+    calls = [('stock_zh_a_hist', 'symbol', symbol), ('tool_trade_date_hist_sina', None, '')]
+    for series in sorted(set(update.get_eastmoney_series(idx['symbol']) for idx in INDEX_CONFIG)):
+        calls.append(('stock_zh_index_spot_em', 'symbol', series))
+    calls.append(('stock_zh_index_spot_sina', None, ''))
+    for idx in INDEX_CONFIG:
+        calls.append(('stock_zh_index_daily', 'symbol', idx['symbol']))
+    return calls
+
+
+def copy_hot_stock_files(fixture_dir: str) -> list:
+    """复制仓库中的热门个股JSON文件"""
+    copied = []
+    for filename in HOT_STOCK_FILES:
+        source = os.path.join(REPO_DIR, filename)
+        if os.path.exists(source):
+            shutil.copyfile(source, os.path.join(fixture_dir, filename))
+            copied.append(filename)
+        else:
+            print(f"⚠️ {filename} 不存在，跳过")
+    return copied
+
+
+def write_manifest(fixture_dir: str, source: str, files: list) -> None:
+    """写入录制清单"""
+    manifest = {
+        'source': source,
+        'recorded_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'files': sorted(files)
+    }
+    with open(os.path.join(fixture_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def record_live(fixture_dir: str) -> int:
+    """从真实接口录制全部数据，返回失败的接口数"""
+    os.makedirs(fixture_dir, exist_ok=True)
+    files = []
+    failures = 0
+    
+    for func, arg_name, arg in get_ak_calls():
+        try:
+            kwargs = {arg_name: arg} if arg_name else {}
+            if func == 'stock_zh_a_hist':
+                kwargs.update(period="daily", start_date='19700101', adjust="")
+            df = getattr(update.ak, func)(**kwargs)
+            filename = ak_fixture_name(func, arg)
+            df.to_pickle(os.path.join(fixture_dir, filename))
+            files.append(filename)
+            print(f"已录制 {func}({arg}): {len(df)} 行")
+        except Exception as e:
+            print(f"❌ 录制 {func}({arg}) 失败：{e}")
+            failures += 1
+    
+    for code, is_futures in get_baidu_codes():
+        try:
+            payload = update.http_get_json(update.get_baidu_kline_url(code, is_futures))
+            filename = baidu_fixture_name(code)
+            with open(os.path.join(fixture_dir, filename), 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False)
+            files.append(filename)
+            print(f"已录制百度K线 {code}")
+        except Exception as e:
+            print(f"❌ 录制百度K线 {code} 失败：{e}")
+            failures += 1
+    
+    files += copy_hot_stock_files(fixture_dir)
+    write_manifest(fixture_dir, 'live', files)
+    return failures
+
+
+def synthetic_baidu_payload(code: str, n: int, seed: int) -> dict:
+    """生成与百度接口格式一致的合成K线载荷，期货相对现货带少量贴水"""
+    keys = ['timestamp', 'time', 'open', 'close', 'volume', 'high', 'low', 'amount', 'range', 'ratio', 'avgPrice']
+    times = pd.bdate_range(end=datetime.date.today(), periods=n)
+    close = 4000 + np.random.default_rng(0).standard_normal(n).cumsum() * 20
+    if not code.isdigit():
+        close = close - 20 + np.random.default_rng(seed).standard_normal(n) * 5
+    rows = [
+        f"{int(t.timestamp())},{t:%Y-%m-%d},{c:.2f},{c:.2f},1000,{c + 5:.2f},{c - 5:.2f},1e8,1.20,0.04,{c:.2f}"
+        for t, c in zip(times, close)
+    ]
+    return {'ResultCode': 0, 'Result': {'newMarketData': {'keys': keys, 'marketData': ';'.join(rows)}}}
+
+
+def synthetic_ak_frame(func: str, arg: str, rng: np.random.Generator) -> pd.DataFrame:
+    """生成与akshare接口列名一致的合成DataFrame"""
+    if func == 'stock_zh_a_hist':
+        dates = pd.bdate_range(end=datetime.date.today(), periods=5000)
+        close = 25 + rng.standard_normal(len(dates)).cumsum() * 0.1
+        return pd.DataFrame({
+            '日期': dates.date, '股票代码': arg, '开盘': close - 0.1, '收盘': close,
+            '最高': close + 0.3, '最低': close - 0.3, '成交量': 100000, '成交额': 2.6e8,
+            '振幅': 1.5, '涨跌幅': 0.2, '涨跌额': 0.05, '换手率': 0.4
+        })
+    if func == 'tool_trade_date_hist_sina':
+        return pd.DataFrame({'trade_date': pd.bdate_range('1990-12-19', f"{datetime.date.today().year}-12-31").date})
+    if func == 'stock_zh_index_daily':
+        dates = pd.bdate_range(end=datetime.date.today(), periods=5000)
+        close = 3000 + rng.standard_normal(len(dates)).cumsum() * 15
+        return pd.DataFrame({'date': dates.date, 'open': close, 'high': close + 10, 'low': close - 10,
+                             'close': close, 'volume': 1e9})
+    
+    # 行情快照：在配置的指数之外补足与真实接口相近的行数
+    symbols = [idx['symbol'] for idx in INDEX_CONFIG]
+    if func == 'stock_zh_index_spot_sina':
+        codes = [f"sh{s}" if s.startswith('000') else f"sz{s}" for s in symbols]
+        codes += [f"sz399{i:03d}" for i in range(100, 650)]
+    else:
+        codes = [s for s in symbols if update.get_eastmoney_series(s) == arg]
+        codes += [f"9{i:05d}" for i in range(300)]
+    price = 1000 + rng.random(len(codes)) * 4000
+    prev = price * (1 - rng.standard_normal(len(codes)) * 0.01)
+    df = pd.DataFrame({
+        '代码': codes, '名称': [f"指数{c}" for c in codes], '最新价': price.round(2),
+        '涨跌额': (price - prev).round(2), '涨跌幅': ((price / prev - 1) * 100).round(2),
+        '昨收': prev.round(2), '今开': prev.round(2), '最高': price.round(2), '最低': prev.round(2),
+        '成交量': 1e8, '成交额': 1e11
+    })
+    if func == 'stock_zh_index_spot_em':
+        df.insert(0, '序号', range(1, len(df) + 1))
+    return df
+
+
+def make_synthetic(fixture_dir: str) -> int:
+    """生成合成数据，返回0"""
+    os.makedirs(fixture_dir, exist_ok=True)
+    rng = np.random.default_rng(0)
+    files = []
+    
+    for func, _, arg in get_ak_calls():
+        filename = ak_fixture_name(func, arg)
+        synthetic_ak_frame(func, arg, rng).to_pickle(os.path.join(fixture_dir, filename))
+        files.append(filename)
+    
+    for seed, (code, _) in enumerate(get_baidu_codes()):
+        filename = baidu_fixture_name(code)
+        with open(os.path.join(fixture_dir, filename), 'w', encoding='utf-8') as f:
+            json.dump(synthetic_baidu_payload(code, 4000, seed), f)
+        files.append(filename)
+    
+    files += copy_hot_stock_files(fixture_dir)
+    write_manifest(fixture_dir, 'synthetic', files)
+    print(f"已生成合成数据到 {fixture_dir}")
+    return 0
+
+
+def load_manifest(fixture_dir: str) -> dict:
+    """读取录制清单，不存在时抛出FileNotFoundError"""
+    with open(os.path.join(fixture_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_ak_fixture(fixture_dir: str, func: str, arg: str = '') -> pd.DataFrame:
+    """读取akshare接口录制数据"""
+    return pd.read_pickle(os.path.join(fixture_dir, ak_fixture_name(func, arg)))
+
+
+def load_baidu_fixture(fixture_dir: str, code: str) -> dict:
+    """读取百度K线载荷"""
+    with open(os.path.join(fixture_dir, baidu_fixture_name(code)), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def filter_payload_since(payload: dict, start_time: str = None) -> dict:
+    """按start_time截取百度K线载荷，与接口增量请求的行为一致"""
+    if not start_time:
+        return payload
+    payload = json.loads(json.dumps(payload))
+    market = payload['Result']['newMarketData']
+    start = start_time[:10]
+    market['marketData'] = ';'.join(
+        row for row in market['marketData'].split(';') if row.split(',')[1][:10] >= start
+    )
+    return payload
+
+
+def frame_to_table(df: pd.DataFrame) -> dict:
+    """将DataFrame转换为update.call_akshare可读取的JSON表格"""
+    return {'columns': [str(c) for c in df.columns], 'data': df.astype(object).values.tolist()}
+
+
+class ReplayResponse:
+    """回放的HTTP响应，只实现update.http_get_json用到的接口"""
+
+    def __init__(self, content: bytes, status_code: int = 200):
+        self.content = content
+        self.status_code = status_code
+        self.headers = {}
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise update.requests.HTTPError(f"{self.status_code}")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ReplaySession:
+    """按code参数回放百度K线载荷的HTTP会话，带start_time时只返回之后的K线"""
+
+    def __init__(self, fixture_dir: str):
+        self.fixture_dir = fixture_dir
+        self.payloads = {}
+
+    def get(self, url, headers=None, timeout=None):
+        query = dict(parse_qsl(urlparse(url).query))
+        code = query.get('code')
+        if code not in self.payloads:
+            try:
+                self.payloads[code] = load_baidu_fixture(self.fixture_dir, code)
+            except FileNotFoundError:
+                return ReplayResponse(b'', 404)
+        payload = filter_payload_since(self.payloads[code], query.get('start_time'))
+        return ReplayResponse(json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+
+
+def install_replay(fixture_dir: str) -> None:
+    """用录制数据替换update中的akshare接口和HTTP会话"""
+    frames = {
+        (func, arg): load_ak_fixture(fixture_dir, func, arg)
+        for func, _, arg in get_ak_calls()
+        if os.path.exists(os.path.join(fixture_dir, ak_fixture_name(func, arg)))
+    }
+
+    def replay(func):
+        def call(symbol='', **kwargs):
+            if (func, symbol) not in frames:
+                raise KeyError(f"没有 {func}({symbol}) 的录制数据")
+            df = frames[(func, symbol)].copy()
+            if func == 'stock_zh_a_hist' and 'start_date' in kwargs:
+                df = df[pd.to_datetime(df['日期']) >= pd.to_datetime(kwargs['start_date'])].reset_index(drop=True)
+            return df
+        return call
+    
+    for func in set(func for func, _, _ in get_ak_calls()):
+        setattr(update.ak, func, replay(func))
+    update._http_session = ReplaySession(fixture_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='基准测试数据录制')
+    parser.add_argument('mode', choices=['record', 'synthetic'], help='record从真实接口录制，synthetic生成合成数据')
+    parser.add_argument('--fixture-dir', default=FIXTURE_DIR, help='录制数据目录')
+    args = parser.parse_args()
+    
+    if args.mode == 'record':
+        failures = record_live(args.fixture_dir)
+        print(f"录制完成，{failures} 个接口失败")
+        return 1 if failures else 0
+    return make_synthetic(args.fixture_dir)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
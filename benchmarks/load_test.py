@@ -0,0 +1,143 @@
+"""基于本地模拟行情服务器的main()压测
+
+启动stand_in_server，将API_CONFIG指向它，在临时工作目录中重复运行main()，
+统计成功率、吞吐量和耗时分位数，以及服务器端收到的请求和注入的故障。
+默认每次运行前清空缓存，使每次运行都完整请求一遍接口；--warm保留缓存。
+
+用法：
+    python benchmarks/fixture_store.py synthetic
+    python benchmarks/load_test.py --runs 20
+    python benchmarks/load_test.py --runs 20 --latency-dist lognormal --latency-ms 100 --error-rate 0.05
+    python benchmarks/load_test.py --runs 10 --truncate-rate 0.3 --hang-rate 0.05 --hang-seconds 15
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import shutil
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import update
+from config import API_CONFIG, FILE_PATHS
+
+import fixture_store
+import stand_in_server
+from bench_pipeline import prepare_workdir, reset_caches
+
+
+def percentile(values: list, pct: float) -> float:
+    """最近秩法计算分位数"""
+    ordered = sorted(values)
+    rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def reset_process_state(cold: bool) -> None:
+    """重置update的进程内状态，模拟每次运行都是新进程"""
+    update._trade_calendar = None
+    update._stock_history_cache.clear()
+    update._index_snapshot_cache.clear()
+    update._watchlist_quotes = None
+    update._basis_engine = None
+    update._source_stats = None
+    update._build_state = None
+    if cold:
+        reset_caches()
+        for output in [FILE_PATHS['price_json'], FILE_PATHS['index_html']]:
+            if os.path.exists(output):
+                os.remove(output)
+
+
+def run_once(verbose: bool) -> tuple:
+    """运行一次main()，返回(是否成功, 耗时秒数)"""
+    start = time.perf_counter()
+    try:
+        if verbose:
+            success = update.main()
+        else:
+            with contextlib.redirect_stdout(io.StringIO()):
+                success = update.main()
+    except Exception as e:
+        print(f"main()抛出异常：{e}")
+        success = False
+    return bool(success), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='基于本地模拟行情服务器的main()压测')
+    parser.add_argument('--runs', type=int, default=10, help='运行次数')
+    parser.add_argument('--warm', action='store_true', help='运行之间保留缓存')
+    parser.add_argument('--backoff-base', type=float, help='覆盖API_CONFIG中的重试退避基数（秒）')
+    parser.add_argument('--output', help='将统计结果写入JSON文件')
+    parser.add_argument('--verbose', action='store_true', help='显示main()的输出')
+    stand_in_server.add_fault_arguments(parser)
+    args = parser.parse_args()
+    
+    try:
+        fixture_store.load_manifest(args.fixture_dir)
+    except FileNotFoundError:
+        print(f"录制数据 {args.fixture_dir} 不存在，请先运行 fixture_store.py record 或 synthetic")
+        return 1
+    
+    fixture_dir = os.path.abspath(args.fixture_dir)
+    output = os.path.abspath(args.output) if args.output else None
+    server = stand_in_server.start_server(fixture_dir, stand_in_server.get_faults(args), seed=args.seed)
+    API_CONFIG['baidu_base_url'] = server.base_url
+    API_CONFIG['akshare_base_url'] = server.base_url
+    if args.backoff_base is not None:
+        API_CONFIG['backoff_base'] = args.backoff_base
+    print(f"模拟行情服务器：{server.base_url}")
+    
+    workdir = prepare_workdir(fixture_dir)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    durations = []
+    successes = 0
+    started = time.perf_counter()
+    try:
+        for run in range(args.runs):
+            reset_process_state(cold=not args.warm)
+            success, elapsed = run_once(args.verbose)
+            successes += success
+            durations.append(elapsed)
+            print(f"第{run + 1}次：{'✅' if success else '❌'} {elapsed * 1000:.0f} ms")
+    finally:
+        wall = time.perf_counter() - started
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        server.shutdown()
+        server.server_close()
+    
+    report = {
+        'runs': args.runs,
+        'successes': successes,
+        'throughput_per_min': round(args.runs / wall * 60, 2),
+        'latency_ms': {
+            'p50': round(percentile(durations, 50) * 1000, 1),
+            'p90': round(percentile(durations, 90) * 1000, 1),
+            'p99': round(percentile(durations, 99) * 1000, 1),
+            'max': round(max(durations) * 1000, 1)
+        },
+        'faults': stand_in_server.get_faults(args),
+        'server': server.stats
+    }
+    print(f"成功 {successes}/{args.runs}，吞吐量 {report['throughput_per_min']} 次/分钟")
+    print("耗时：" + "，".join(f"{k} {v:.0f} ms" for k, v in report['latency_ms'].items()))
+    print(f"服务器请求：{report['server']['requests']}，注入故障：{report['server']['faults']}")
+    
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {output}")
+    return 0 if successes == args.runs else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""本地模拟行情服务器
+
+回放fixture_store录制的百度K线载荷和akshare接口数据，并可注入延迟、错误、
+限流、截断或为空的marketData以及长时间无响应，用于测试get_index_data和
+get_baidu_kline_data在恶劣网络条件下的并发、超时和回退行为。
+
+将API_CONFIG指向服务器即可让update.py从这里获取全部数据：
+    API_CONFIG['baidu_base_url'] = 'http://127.0.0.1:8765'
+    API_CONFIG['akshare_base_url'] = 'http://127.0.0.1:8765'
+
+用法：
+    python benchmarks/stand_in_server.py --port 8765
+    python benchmarks/stand_in_server.py --latency-dist lognormal --latency-ms 80 --error-rate 0.1
+    python benchmarks/stand_in_server.py --truncate-rate 0.2 --empty-rate 0.1 --rate-limit-rate 0.1
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fixture_store
+
+BAIDU_PATH = '/selfselect/getstockquotation'
+AKSHARE_PREFIX = '/akshare/'
+STATS_PATH = '/_stats'
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser) -> None:
+    """添加延迟和故障注入参数，供服务器和压测脚本共用"""
+    parser.add_argument('--fixture-dir', default=fixture_store.FIXTURE_DIR, help='录制数据目录')
+    parser.add_argument('--latency-dist', choices=['fixed', 'uniform', 'lognormal'], default='fixed',
+                        help='响应延迟分布：fixed固定值，uniform为0到2倍均值的均匀分布，lognormal为以均值为中位数的对数正态分布')
+    parser.add_argument('--latency-ms', type=float, default=0, help='延迟均值/中位数（毫秒）')
+    parser.add_argument('--latency-sigma', type=float, default=0.8, help='对数正态分布的sigma，越大长尾越重')
+    parser.add_argument('--error-rate', type=float, default=0, help='返回500/502/503的概率')
+    parser.add_argument('--rate-limit-rate', type=float, default=0, help='返回429的概率')
+    parser.add_argument('--retry-after', type=int, default=1, help='429响应的Retry-After秒数')
+    parser.add_argument('--truncate-rate', type=float, default=0, help='百度marketData在记录中间被截断的概率')
+    parser.add_argument('--empty-rate', type=float, default=0, help='百度marketData为空的概率')
+    parser.add_argument('--hang-rate', type=float, default=0, help='长时间无响应的概率')
+    parser.add_argument('--hang-seconds', type=float, default=30, help='无响应的时长（秒）')
+    parser.add_argument('--fault-routes', default='baidu,akshare', help='注入故障的接口，逗号分隔：baidu、akshare')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+
+
+def get_faults(args: argparse.Namespace) -> dict:
+    """从命令行参数中取出故障注入配置"""
+    return {
+        'latency_dist': args.latency_dist,
+        'latency_ms': args.latency_ms,
+        'latency_sigma': args.latency_sigma,
+        'error_rate': args.error_rate,
+        'rate_limit_rate': args.rate_limit_rate,
+        'retry_after': args.retry_after,
+        'truncate_rate': args.truncate_rate,
+        'empty_rate': args.empty_rate,
+        'hang_rate': args.hang_rate,
+        'hang_seconds': args.hang_seconds,
+        'routes': [route.strip() for route in args.fault_routes.split(',') if route.strip()]
+    }
+
+
+class StandInServer(ThreadingHTTPServer):
+    """回放录制数据并按配置注入故障的HTTP服务器"""
+    
+    daemon_threads = True
+
+    def __init__(self, address: tuple, fixture_dir: str, faults: dict, seed: int = 0):
+        super().__init__(address, StandInHandler)
+        self.fixture_dir = fixture_dir
+        self.faults = faults
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.payloads = {}
+        self.tables = {}
+        self.stats = {'requests': {}, 'faults': {}, 'bytes_sent': 0}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, group: str, key: str) -> None:
+        with self.lock:
+            self.stats[group][key] = self.stats[group].get(key, 0) + 1
+
+    def random(self) -> float:
+        with self.lock:
+            return self.rng.random()
+
+    def sample_latency(self) -> float:
+        """按配置的分布抽取一次响应延迟（秒）"""
+        mean = self.faults['latency_ms'] / 1000
+        if mean <= 0:
+            return 0.0
+        with self.lock:
+            if self.faults['latency_dist'] == 'uniform':
+                return self.rng.uniform(0, 2 * mean)
+            if self.faults['latency_dist'] == 'lognormal':
+                return mean * self.rng.lognormvariate(0, self.faults['latency_sigma'])
+        return mean
+
+    def choose_fault(self, route: str) -> str:
+        """决定本次请求注入的故障，不注入时返回空字符串"""
+        if route not in self.faults['routes']:
+            return ''
+        roll = self.random()
+        for fault in ['hang', 'rate_limit', 'error', 'truncate', 'empty']:
+            rate = self.faults[f"{fault}_rate"]
+            if fault in ('truncate', 'empty') and route != 'baidu':
+                continue
+            if roll < rate:
+                return fault
+            roll -= rate
+        return ''
+
+    def get_baidu_payload(self, code: str) -> dict:
+        with self.lock:
+            if code not in self.payloads:
+                self.payloads[code] = fixture_store.load_baidu_fixture(self.fixture_dir, code)
+            return self.payloads[code]
+
+    def get_table(self, func: str, arg: str) -> dict:
+        with self.lock:
+            if (func, arg) not in self.tables:
+                df = fixture_store.load_ak_fixture(self.fixture_dir, func, arg)
+                self.tables[(func, arg)] = (df, fixture_store.frame_to_table(df))
+            return self.tables[(func, arg)]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """处理百度K线、akshare数据和统计请求"""
+    
+    server: StandInServer
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status: int, body: bytes, headers: dict = None) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            self.server.stats['bytes_sent'] += len(body)
+
+    def send_json(self, status: int, data, headers: dict = None) -> None:
+        self.send_body(status, json.dumps(data, ensure_ascii=False, default=str).encode('utf-8'), headers)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = dict(parse_qsl(parsed.query))
+        
+        if parsed.path == STATS_PATH:
+            with self.server.lock:
+                stats = json.loads(json.dumps(self.server.stats))
+            return self.send_json(200, stats)
+        
+        if parsed.path == BAIDU_PATH:
+            route = 'baidu'
+        elif parsed.path.startswith(AKSHARE_PREFIX):
+            route = 'akshare'
+        else:
+            return self.send_json(404, {'error': 'not found'})
+        self.server.count('requests', route)
+        
+        time.sleep(self.server.sample_latency())
+        fault = self.server.choose_fault(route)
+        if fault:
+            self.server.count('faults', f"{route}:{fault}")
+        
+        if fault == 'hang':
+            time.sleep(self.server.faults['hang_seconds'])
+        elif fault == 'rate_limit':
+            return self.send_json(429, {'error': 'too many requests'},
+                                  {'Retry-After': str(self.server.faults['retry_after'])})
+        elif fault == 'error':
+            return self.send_json([500, 502, 503][int(self.server.random() * 3)], {'error': 'injected'})
+        
+        try:
+            if route == 'baidu':
+                self.serve_baidu(query, fault)
+            else:
+                self.serve_akshare(parsed.path[len(AKSHARE_PREFIX):], query)
+        except FileNotFoundError:
+            self.send_json(404, {'error': 'no fixture'})
+
+    def serve_baidu(self, query: dict, fault: str) -> None:
+        payload = fixture_store.filter_payload_since(self.server.get_baidu_payload(query.get('code')),
+                                                     query.get('start_time'))
+        if fault in ('truncate', 'empty'):
+            payload = json.loads(json.dumps(payload))
+            market = payload['Result']['newMarketData']
+            if fault == 'empty':
+                market['marketData'] = ''
+            else:
+                # 在最后一条记录中间截断，模拟连接提前关闭后的残缺数据
+                cut = market['marketData'].rfind(';') + 1
+                market['marketData'] = market['marketData'][:cut + max(1, (len(market['marketData']) - cut) // 2)]
+        self.send_json(200, payload)
+
+    def serve_akshare(self, func: str, query: dict) -> None:
+        arg = query.get('symbol', '')
+        df, table = self.server.get_table(func, arg)
+        if func == 'stock_zh_a_hist' and 'start_date' in query:
+            df = df[df['日期'].astype(str).str.replace('-', '') >= query['start_date']]
+            table = fixture_store.frame_to_table(df)
+        self.send_json(200, table)
+
+
+def start_server(fixture_dir: str, faults: dict, host: str = '127.0.0.1', port: int = 0,
+                 seed: int = 0) -> StandInServer:
+    """在后台线程中启动服务器，port为0时自动选择空闲端口"""
+    server = StandInServer((host, port), fixture_dir, faults, seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟行情服务器')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口')
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    
+    try:
+        fixture_store.load_manifest(args.fixture_dir)
+    except FileNotFoundError:
+        print(f"录制数据 {args.fixture_dir} 不存在，请先运行 fixture_store.py record 或 synthetic")
+        return 1
+    
+    server = StandInServer((args.host, args.port), args.fixture_dir, get_faults(args), args.seed)
+    print(f"模拟行情服务器已启动：{server.base_url}")
+    print(f"API_CONFIG['baidu_base_url'] = API_CONFIG['akshare_base_url'] = '{server.base_url}'")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -22,34 +22,70 @@ FUTURES_CONFIG = {
     'hs300': {
         'spot_code': '000300',
         'future_code': 'IF888',
+        'intraday_future_code': 'IF0',
         'name': '沪深300',
-        'chart_file': 'hs300_basis_embed.html'
+        'chart_file': 'hs300_basis_embed.html',
+        'intraday_chart_file': 'hs300_basis_intraday_embed.html'
     },
     'zz1000': {
         'spot_code': '000852',
-        'future_code': 'IC888',
+        'future_code': 'IM888',
+        'intraday_future_code': 'IM0',
         'name': '中证1000',
-        'chart_file': 'zz1000_basis_embed.html'
+        'chart_file': 'zz1000_basis_embed.html',
+        'intraday_chart_file': 'zz1000_basis_intraday_embed.html'
     }
 }
 
 
+# 基差引擎配置：一次性计算多个股指期货合约的基差和技术指标
+BASIS_CONFIG = {
+    # 品种代码 → 对应的现货指数
+    'products': {
+        'IF': {'spot_code': '000300', 'name': '沪深300'},
+        'IH': {'spot_code': '000016', 'name': '上证50'},
+        'IC': {'spot_code': '000905', 'name': '中证500'},
+        'IM': {'spot_code': '000852', 'name': '中证1000'}
+    },
+    # 主力连续合约
+    'contracts': ['IF888', 'IH888', 'IC888', 'IM888'],
+    # 每个品种自动加入的近月交割合约个数（当月、下月……），0表示不加入
+    'delivery_months': 2,
+    'zscore_windows': [20, 60, 250],
+    'percentile_windows': [60, 250],
+    'max_workers': 8
+}
+
+
+# 分时基差配置（期货使用新浪分钟线，指数使用东方财富分钟线）
+INTRADAY_CONFIG = {
+    'enabled': False,
+    'period': '1',
+    'tolerance': '30s'
+}
 
 # 文件路径配置
 FILE_PATHS = {
     'price_json': 'price.json',
     'index_html': 'index.html',
     'strategy_fragment': 'strategy_fragment.html',
+    'hot_stocks_json': 'all_hot_stocks.json',
+    'hot_concepts_json': 'hot_concepts_analysis.json',
     'strategy_png_pattern': '红利ETF_三种策略_梯度买卖_*_*.png',
     'template_dir': 'templates',
-    'template_file': 'templates/index.html'
+    'template_file': 'templates/index.html',
+    'cache_dir': '.cache',
+    # lazy模式的图表数据放在缓存目录内，与构建状态和页面参数一起在运行之间保留；
+    # 页面通过发布阶段复制出的带哈希文件（assets/）加载
+    'chart_data_dir': '.cache/charts'
 }
 
 # 技术指标常量
 TECHNICAL_INDICATORS = {
     'MA60_WINDOW': 60,
     'BOLLINGER_WINDOW': 20,
-    'STD_MULTIPLIER': 2
+    'STD_MULTIPLIER': 2,
+    'ROLLBACK_BARS': 5
 }
 
 # 图表配置
@@ -58,14 +94,122 @@ CHART_CONFIG = {
     'height': 600,
     'template': 'plotly_white',
     'include_plotlyjs': 'cdn',
-    'full_html': False
+    'full_html': False,
+    'full_resolution_points': 120,
+    'export_mode': 'lazy',
+    # 图表渲染进程数，None表示CPU核数，不超过1时在当前进程内渲染
+    'render_workers': None,
+    # plotly的JSON序列化引擎，orjson未安装时自动回退到json
+    'json_engine': 'orjson'
 }
 
 # API 配置
 API_CONFIG = {
     'timeout': 10,
+    'pool_size': 10,
+    'max_retries': 3,
+    'backoff_base': 0.5,
+    'backoff_max': 8,
+    'retry_statuses': [429, 500, 502, 503, 504],
+    'baidu_base_url': 'https://finance.pae.baidu.com',
+    # 设置后akshare接口改为从该地址获取数据，用于本地模拟行情服务器（benchmarks/stand_in_server.py）
+    'akshare_base_url': None,
     'headers': {
         'User-Agent': 'Mozilla/5.0',
         'Referer': 'https://gushitong.baidu.com/'
     }
 }
+
+# 缓存配置
+CACHE_CONFIG = {
+    'timezone': 'Asia/Shanghai',
+    'market_open': '09:30',
+    'market_close': '15:00',
+    'intraday_ttl': 300,
+    'settle_delay': 600,
+    'http_cache_dir': 'http',
+    # 响应缓存超过该秒数没有再请求过时删除
+    'http_cache_max_age': 7 * 86400,
+    'template_cache_dir': 'jinja',
+    'page_context_file': 'page_context.json',
+    'calendar_file': 'trade_calendar.json'
+}
+
+# 页面发布配置：共享的CSS、JS、图表数据和图片改为以内容哈希命名的文件，并生成预压缩版本
+PUBLISH_CONFIG = {
+    'enabled': True,
+    'asset_dir': 'assets',
+    'hash_length': 10,
+    # 小于该字节数的内联脚本保留在页面中，避免为很小的脚本多发一次请求
+    'inline_max_bytes': 1024,
+    # 预压缩的文件类型和最小字节数
+    'compress_suffixes': ['.html', '.css', '.js', '.json', '.svg'],
+    'compress_min_bytes': 1024,
+    'gzip_level': 9,
+    'brotli_quality': 11,
+    # 保留最近几次发布引用的资源文件，使仍持有旧页面的访问者也能加载
+    'keep_generations': 2,
+    'manifest_file': 'publish_manifest.json'
+}
+
+# 本地SQLite存档配置：每次运行的行情快照和基差数据，按(代码, 时间)索引
+# 存档默认位于缓存目录，GitHub Actions中只靠actions/cache在运行之间保留：缓存按运行保存、
+# 可能被GitHub逐出（长期未访问或超出仓库配额），逐出后存档从空开始，并不能永久保存。
+# 需要长期保存时将file设为持久位置的绝对路径（绝对路径不再拼接缓存目录）。
+ARCHIVE_CONFIG = {
+    'enabled': True,
+    'file': 'archive.sqlite3',
+    # 每次执行SQL的批量大小
+    'batch_size': 5000
+}
+
+# 并发获取配置（截止时间单位：秒）
+FETCH_CONFIG = {
+    'max_workers': 8,
+    'default_deadline': 60,
+    'deadlines': {
+        'stock_kline': 90,
+        'futures_hs300': 120,
+        'futures_zz1000': 120,
+        'watchlist': 600
+    }
+}
+
+# 指数数据源配置（时间单位：秒）
+SOURCE_CONFIG = {
+    'order': ['eastmoney', 'sina', 'history'],
+    'hedged': True,
+    'hedge_delay': 3.0,
+    'failure_threshold': 3,
+    'cooldown': 6 * 3600,
+    'latency_alpha': 0.3,
+    'stats_file': 'source_stats.json'
+}
+
+# 增量构建配置
+BUILD_CONFIG = {
+    'state_file': 'build_state.json'
+}
+
+# 运行指标配置，每次运行追加一行到缓存目录下的JSON-lines文件
+METRICS_CONFIG = {
+    'file': 'metrics.jsonl',
+    'max_runs': 2000
+}
+
+# 剖析配置（update.py --profile）
+PROFILE_CONFIG = {
+    'dir': 'profiles',
+    'sample_interval': 0.005,
+    'traceback_frames': 1,
+    'top_allocations': 15,
+    'top_functions': 40
+}
+
+# 自选股配置：当前行情取自一次全市场快照，日线历史由有界线程池并发增量刷新
+WATCHLIST_CONFIG = {
+    'enabled': False,
+    'symbols': ['600900', '600036', '601318', '600519', '000333', '000858'],
+    'max_workers': 8,
+    'kline_days': 120
+}
@@ -1,14 +1,65 @@
-import akshare as ak
+from __future__ import annotations
+
 import json
 import datetime
-import jinja2
-import requests
-import pandas as pd
-import numpy as np
+import importlib
+import importlib.util
+import multiprocessing
+import io
 import os
+import math
 import glob
-from typing import Dict, List, Optional, Any
-import plotly.graph_objects as go
+import gzip
+import re
+import time
+import random
+import sqlite3
+import hashlib
+import itertools
+import tempfile
+import sys
+from urllib.parse import quote, urlencode, urlparse
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from zoneinfo import ZoneInfo
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional, Any
+
+if TYPE_CHECKING:
+    import akshare as ak
+    import jinja2
+    import requests
+    import pandas as pd
+    import numpy as np
+    import plotly.graph_objects as go
+
+
+class LazyModule:
+    """延迟导入的模块代理，首次访问属性时才真正导入模块
+    
+    akshare、pandas等模块导入耗时较长，只在用到它们的函数里才加载，
+    只读缓存或只渲染页面的调用无需付出这部分启动时间。
+    """
+    
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+    
+    def __getattr__(self, attr: str) -> Any:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+if not TYPE_CHECKING:
+    ak = LazyModule('akshare')
+    jinja2 = LazyModule('jinja2')
+    requests = LazyModule('requests')
+    pd = LazyModule('pandas')
+    np = LazyModule('numpy')
+    go = LazyModule('plotly.graph_objects')
 
 from config import (
     STOCK_CONFIG,
@@ -17,9 +68,81 @@ from config import (
     FILE_PATHS,
     TECHNICAL_INDICATORS,
     CHART_CONFIG,
-    API_CONFIG
+    API_CONFIG,
+    CACHE_CONFIG,
+    FETCH_CONFIG,
+    SOURCE_CONFIG,
+    INTRADAY_CONFIG,
+    BUILD_CONFIG,
+    METRICS_CONFIG,
+    PROFILE_CONFIG,
+    WATCHLIST_CONFIG,
+    BASIS_CONFIG,
+    ARCHIVE_CONFIG,
+    PUBLISH_CONFIG
 )
 
+# 运行内缓存项的锁，键为缓存项名称
+_cache_locks: Dict[str, threading.Lock] = {}
+_cache_locks_guard = threading.Lock()
+
+# 共享的HTTP会话及其锁
+_http_session: Optional[requests.Session] = None
+_http_session_lock = threading.Lock()
+
+# 持久化的数据源统计及其锁，首次使用时从缓存目录加载
+_source_stats: Optional[Dict[str, Dict[str, Any]]] = None
+_source_stats_lock = threading.RLock()
+
+# 已放弃等待但可能仍在运行的后台任务及其锁
+_abandoned_tasks: List[Future] = []
+_abandoned_tasks_lock = threading.Lock()
+
+# 各产物上次构建时的输入指纹及其锁，首次使用时从缓存目录加载
+_build_state: Optional[Dict[str, str]] = None
+_build_state_lock = threading.RLock()
+_code_fingerprint: Optional[str] = None
+
+# 页面模板环境及其锁
+_template_env: Optional[jinja2.Environment] = None
+_template_env_lock = threading.Lock()
+
+# 本次运行内的交易日历和交易日集合，首次使用时加载
+_trade_calendar: Optional[List[datetime.date]] = None
+_trading_days: frozenset = frozenset()
+_trade_calendar_lock = threading.Lock()
+
+# 本次运行内的股票历史数据缓存，键为股票代码，获取失败的代码值为None
+_stock_history_cache: Dict[str, Optional[pd.DataFrame]] = {}
+
+# 本次运行内的指数行情快照，键为 数据源:系列
+_index_snapshot_cache: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+# 本次运行内从全市场行情快照中取出的自选股行情，键为股票代码
+_watchlist_quotes: Optional[Dict[str, Dict[str, Any]]] = None
+
+# 本地SQLite存档的写锁
+_archive_lock = threading.Lock()
+
+# 图表渲染进程池、允许使用的进程数及其锁，只在完整更新的获取阶段启用
+_render_pool: Optional[ProcessPoolExecutor] = None
+_render_workers = 0
+_render_pool_lock = threading.Lock()
+
+# plotly使用的JSON序列化引擎
+_json_engine: Optional[str] = None
+
+# 本次运行内的全部合约基差矩阵，计算失败时为空字典
+_basis_engine: Optional[Dict[str, Any]] = None
+
+# 本次运行的耗时和I/O指标及其锁
+_metrics: Dict[str, Any] = {'started_at': time.time(), 'start': time.perf_counter(), 'spans': [], 'counters': {}, 'labels': {}}
+_metrics_lock = threading.Lock()
+
+# 剖析模式下的状态（获取任务的CPU剖析结果和各阶段的内存快照），未开启剖析时为None
+_profiler: Optional[Dict[str, Any]] = None
+_profiler_lock = threading.Lock()
+
 
 def calculate_price_change(current_price: float, previous_price: float) -> Dict[str, float]:
     """计算价格变化和涨跌幅"""
@@ -28,732 +151,3443 @@ def calculate_price_change(current_price: float, previous_price: float) -> Dict[
     return {'change': change, 'change_pct': change_pct}
 
 
-def get_stock_data(symbol: str, name: str) -> Optional[Dict[str, Any]]:
-    """获取股票数据
+def now_cn() -> datetime.datetime:
+    """获取交易所所在时区的当前时间"""
+    return datetime.datetime.now(ZoneInfo(CACHE_CONFIG['timezone']))
+
+
+def get_cache_path(filename: str) -> str:
+    """获取缓存文件路径，缓存目录不存在时自动创建"""
+    os.makedirs(FILE_PATHS['cache_dir'], exist_ok=True)
+    return os.path.join(FILE_PATHS['cache_dir'], filename)
+
+
+def get_trade_calendar() -> List[datetime.date]:
+    """获取交易日历，同一次运行内只加载一次
     
-    Args:
-        symbol: 股票代码
-        name: 股票名称
-        
     Returns:
-        包含股票信息的字典，如果获取失败则返回None
+        升序排列的交易日列表，获取失败时返回空列表
+    """
+    global _trade_calendar, _trading_days
+    
+    with _trade_calendar_lock:
+        if _trade_calendar is None:
+            _trade_calendar = load_trade_calendar()
+            _trading_days = frozenset(_trade_calendar)
+        return _trade_calendar
+
+
+def load_trade_calendar() -> List[datetime.date]:
+    """加载交易日历，优先读取本地缓存
+    
+    本地日历覆盖到当前日期时直接使用，否则重新从新浪接口下载。
+    
+    Returns:
+        升序排列的交易日列表，获取失败时返回空列表
     """
+    calendar_file = get_cache_path(CACHE_CONFIG['calendar_file'])
+    today = now_cn().date()
+    
     try:
-        df = ak.stock_zh_a_hist(symbol=symbol, period="daily", adjust="")
-        latest_row = df.iloc[-1]
-        previous_row = df.iloc[-2]
-        
-        price = round(latest_row['收盘'], 2)
-        prev_price = round(previous_row['收盘'], 2)
-        change_data = calculate_price_change(price, prev_price)
-        
-        return {
-            'name': name,
-            'symbol': symbol,
-            'price': price,
-            'prev_price': prev_price,
-            **change_data
-        }
-    except (KeyError, IndexError, ValueError) as e:
-        print(f"获取{name}({symbol})数据失败：{e}")
-        return None
+        if os.path.exists(calendar_file):
+            with open(calendar_file, 'r', encoding='utf-8') as f:
+                dates = [datetime.date.fromisoformat(d) for d in json.load(f)]
+            if dates and dates[-1] >= today:
+                return dates
     except Exception as e:
-        print(f"获取{name}({symbol})时发生未知错误：{e}")
-        return None
+        print(f"读取交易日历缓存失败：{e}")
+    
+    try:
+        df = call_akshare('tool_trade_date_hist_sina')
+        dates = sorted(pd.to_datetime(df['trade_date']).dt.date)
+        with open(calendar_file, 'w', encoding='utf-8') as f:
+            json.dump([d.isoformat() for d in dates], f)
+        return dates
+    except Exception as e:
+        print(f"获取交易日历失败：{e}")
+        return []
 
 
-def get_index_data_from_eastmoney(symbol: str, name: str) -> Optional[Dict[str, Any]]:
-    """从东方财富网获取指数数据"""
+def is_trading_day(day: datetime.date, calendar: List[datetime.date]) -> bool:
+    """判断是否为交易日，没有交易日历时按工作日判断"""
+    if calendar:
+        # 本次运行加载的日历直接查预先建好的集合
+        return day in (_trading_days if calendar is _trade_calendar else set(calendar))
+    return day.weekday() < 5
+
+
+def get_last_closed_trading_day(now: datetime.datetime, calendar: List[datetime.date]) -> datetime.date:
+    """获取最近一个已收盘的交易日
+    
+    Args:
+        now: 当前时间（交易所时区）
+        calendar: 交易日历
+        
+    Returns:
+        最近一个收盘时间早于now的交易日
+    """
+    close_time = datetime.time.fromisoformat(CACHE_CONFIG['market_close'])
+    day = now.date()
+    if now.time() < close_time or not is_trading_day(day, calendar):
+        day -= datetime.timedelta(days=1)
+    while not is_trading_day(day, calendar):
+        day -= datetime.timedelta(days=1)
+    return day
+
+
+def is_market_open(now: datetime.datetime, calendar: List[datetime.date]) -> bool:
+    """判断当前是否处于交易时段"""
+    open_time = datetime.time.fromisoformat(CACHE_CONFIG['market_open'])
+    close_time = datetime.time.fromisoformat(CACHE_CONFIG['market_close'])
+    return is_trading_day(now.date(), calendar) and open_time <= now.time() < close_time
+
+
+def is_snapshot_time(now: datetime.datetime, calendar: List[datetime.date]) -> bool:
+    """判断当前是否需要记录行情快照：交易日开盘之后（含收盘后）"""
+    open_time = datetime.time.fromisoformat(CACHE_CONFIG['market_open'])
+    return is_trading_day(now.date(), calendar) and now.time() >= open_time
+
+
+def get_last_settled_time(now: datetime.datetime, calendar: List[datetime.date]) -> datetime.datetime:
+    """获取最近一次收盘后数据结算完成的时间（收盘时间加settle_delay）"""
+    close_time = datetime.time.fromisoformat(CACHE_CONFIG['market_close'])
+    last_close = datetime.datetime.combine(get_last_closed_trading_day(now, calendar), close_time, tzinfo=now.tzinfo)
+    return last_close + datetime.timedelta(seconds=CACHE_CONFIG['settle_delay'])
+
+
+def is_history_fresh(cache_file: str, last_date: datetime.date) -> bool:
+    """根据交易日历判断本地历史数据是否需要更新
+    
+    盘中按intraday_ttl限制刷新频率；非交易时段要求已包含最近一个已收盘交易日的数据，
+    且缓存写于该交易日收盘结算之后，否则盘中写入的未完成K线会被当作收盘数据。
+    """
+    now = now_cn()
+    calendar = get_trade_calendar()
+    
+    if is_market_open(now, calendar):
+        age = now.timestamp() - os.path.getmtime(cache_file)
+        return age < CACHE_CONFIG['intraday_ttl']
+    return (last_date >= get_last_closed_trading_day(now, calendar)
+            and os.path.getmtime(cache_file) >= get_last_settled_time(now, calendar).timestamp())
+
+
+def get_cache_lock(key: str) -> threading.Lock:
+    """获取运行内缓存项对应的锁，保证并发请求同一数据时只获取一次"""
+    with _cache_locks_guard:
+        return _cache_locks.setdefault(key, threading.Lock())
+
+
+def start_daemon_task(func: Callable[..., Any], *args: Any) -> Future:
+    """在守护线程中执行func，返回对应的Future
+    
+    与ThreadPoolExecutor的工作线程不同，守护线程在进程退出时不会被等待，
+    放弃等待的任务即使卡在没有超时的请求上也不会拖住进程退出。
+    """
+    future = Future()
+    
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func(*args))
+        except BaseException as e:
+            future.set_exception(e)
+    
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def abandon_task(future: Future) -> None:
+    """放弃等待一个后台任务，仍在运行的任务会被记录下来，供退出时判断"""
+    if not future.cancel() and not future.done():
+        with _abandoned_tasks_lock:
+            _abandoned_tasks.append(future)
+
+
+def exit_process(code: int) -> None:
+    """以code退出进程
+    
+    有被放弃的任务仍在运行时直接结束进程：这些任务内部可能还在等待线程池中卡住的请求，
+    正常退出会等待线程池的工作线程结束。
+    """
+    with _abandoned_tasks_lock:
+        running = sum(1 for future in _abandoned_tasks if not future.done())
+    if running:
+        print(f"仍有{running}个已放弃的任务未结束，直接退出进程")
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+    sys.exit(code)
+
+
+def reset_metrics() -> None:
+    """清空本次运行的指标，从当前时刻开始计时"""
+    global _metrics
+    with _metrics_lock:
+        _metrics = {'started_at': time.time(), 'start': time.perf_counter(), 'spans': [], 'counters': {}, 'labels': {}}
+
+
+@contextmanager
+def metric_span(name: str, **tags: Any) -> Iterator[None]:
+    """记录一段代码的开始时间、耗时和是否抛出异常
+    
+    Args:
+        name: 阶段名称，按"类别.名称"命名，如fetch.stock、source.sina
+        tags: 附加字段，如指数代码
+    """
+    start = time.perf_counter()
+    status = 'ok'
     try:
-        if symbol.startswith('000'):
-            df_em = ak.stock_zh_index_spot_em(symbol="上证系列指数")
-        elif symbol.startswith('399'):
-            df_em = ak.stock_zh_index_spot_em(symbol="深证系列指数")
-        else:
-            df_em = ak.stock_zh_index_spot_em(symbol="中证系列指数")
-        
-        index_data = df_em[df_em['代码'] == symbol]
-        if not index_data.empty:
-            row = index_data.iloc[0]
-            price = round(float(row['最新价']), 2)
-            prev_price = round(float(row['昨收']), 2)
-            change = round(float(row['涨跌额']), 2)
-            change_pct = round(float(row['涨跌幅']), 2)
-            
-            print(f"成功从东方财富网获取{name}({symbol})数据")
-            return {
+        yield
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        end = time.perf_counter()
+        with _metrics_lock:
+            _metrics['spans'].append({
                 'name': name,
-                'symbol': symbol,
-                'price': price,
-                'prev_price': prev_price,
-                'change': change,
-                'change_pct': change_pct
-            }
-    except Exception as e:
-        print(f"从东方财富网获取{name}({symbol})失败：{e}")
-    return None
+                'start': round(start - _metrics['start'], 4),
+                'duration': round(end - start, 4),
+                'status': status,
+                **tags
+            })
 
 
-def get_index_data_from_sina(symbol: str, name: str) -> Optional[Dict[str, Any]]:
-    """从新浪财经获取指数数据"""
+def count_metric(name: str, value: float = 1) -> None:
+    """累加计数指标，如传输字节数、行数、缓存命中次数"""
+    with _metrics_lock:
+        _metrics['counters'][name] = _metrics['counters'].get(name, 0) + value
+
+
+def set_metric_label(name: str, value: Any) -> None:
+    """记录标签指标，如每个指数实际使用的数据源"""
+    with _metrics_lock:
+        _metrics['labels'][name] = value
+
+
+def get_timing_summary() -> Dict[str, Any]:
+    """生成供页面模板显示的简要耗时汇总
+    
+    Returns:
+        {'elapsed': 已运行秒数, 'stages': [(阶段, 秒数)], 'slowest': 最慢的3个获取任务[(任务, 秒数)]}
+    """
+    with _metrics_lock:
+        spans = list(_metrics['spans'])
+        elapsed = time.perf_counter() - _metrics['start']
+    stages = [(span['name'].split('.', 1)[1], round(span['duration'], 2)) for span in spans if span['name'].startswith('stage.')]
+    fetches = sorted((span for span in spans if span['name'].startswith('fetch.')), key=lambda span: -span['duration'])
+    return {
+        'elapsed': round(elapsed, 2),
+        'stages': stages,
+        'slowest': [(span['name'].split('.', 1)[1], round(span['duration'], 2)) for span in fetches[:3]]
+    }
+
+
+def write_metrics(tier: str, success: bool) -> None:
+    """将本次运行的指标追加到JSON-lines文件，只保留最近max_runs次运行"""
+    with _metrics_lock:
+        record = {
+            'run_at': datetime.datetime.fromtimestamp(_metrics['started_at']).isoformat(timespec='seconds'),
+            'tier': tier,
+            'success': success,
+            'duration': round(time.perf_counter() - _metrics['start'], 4),
+            'spans': sorted(_metrics['spans'], key=lambda span: span['start']),
+            'counters': dict(_metrics['counters']),
+            'labels': dict(_metrics['labels'])
+        }
+    
+    metrics_file = get_cache_path(METRICS_CONFIG['file'])
     try:
-        df_sina = ak.stock_zh_index_spot_sina()
-        sina_symbol = f"sh{symbol}" if symbol.startswith('000') else f"sz{symbol}"
-        index_data_sina = df_sina[df_sina['代码'] == sina_symbol]
-        
-        if not index_data_sina.empty:
-            row = index_data_sina.iloc[0]
-            price = round(float(row['最新价']), 2)
-            prev_price = round(float(row['昨收']), 2)
-            change = round(float(row['涨跌额']), 2)
-            change_pct = round(float(row['涨跌幅']), 2)
-            
-            print(f"成功从新浪财经获取{name}({symbol})数据")
-            return {
-                'name': name,
-                'symbol': symbol,
-                'price': price,
-                'prev_price': prev_price,
-                'change': change,
-                'change_pct': change_pct
-            }
+        lines = []
+        if os.path.exists(metrics_file):
+            with open(metrics_file, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        lines.append(json.dumps(record, ensure_ascii=False, default=str))
+        write_atomic(metrics_file, [line + '\n' for line in lines[-METRICS_CONFIG['max_runs']:]])
     except Exception as e:
-        print(f"从新浪财经获取{name}({symbol})失败：{e}")
-    return None
+        print(f"保存运行指标失败：{e}")
 
 
-def get_index_data_from_history(symbol: str, name: str) -> Optional[Dict[str, Any]]:
-    """从历史数据接口获取指数数据"""
-    try:
-        df_daily = ak.stock_zh_index_daily(symbol=symbol)
-        
-        if 'date' in df_daily.columns:
-            latest_row = df_daily.iloc[-1]
-            previous_row = df_daily.iloc[-2]
-            price = round(latest_row['close'], 2)
-            prev_price = round(previous_row['close'], 2)
+def get_code_fingerprint() -> str:
+    """获取update.py源码的指纹，代码变化时所有产物都视为过期"""
+    global _code_fingerprint
+    if _code_fingerprint is None:
+        with open(os.path.abspath(__file__), 'rb') as f:
+            _code_fingerprint = hashlib.sha1(f.read()).hexdigest()
+    return _code_fingerprint
+
+
+def fingerprint(*parts: Any) -> str:
+    """计算构建输入的指纹
+    
+    DataFrame按内容哈希，bytes直接参与计算，其他对象按排序后的JSON序列化。
+    """
+    h = hashlib.sha1(get_code_fingerprint().encode('utf-8'))
+    for part in parts:
+        if isinstance(part, pd.DataFrame):
+            h.update(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes())
+        elif isinstance(part, bytes):
+            h.update(part)
         else:
-            latest_row = df_daily.iloc[-1]
-            previous_row = df_daily.iloc[-2]
-            price = round(latest_row[df_daily.columns[3]], 2)
-            prev_price = round(previous_row[df_daily.columns[3]], 2)
-        
-        change_data = calculate_price_change(price, prev_price)
-        
-        print(f"成功从历史数据接口获取{name}({symbol})数据")
-        return {
-            'name': name,
-            'symbol': symbol,
-            'price': price,
-            'prev_price': prev_price,
-            **change_data
-        }
-    except Exception as e:
-        print(f"从历史数据接口获取{name}({symbol})失败：{e}")
-    return None
+            h.update(json.dumps(part, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+    return h.hexdigest()
 
 
+def read_file_bytes(filepath: str) -> bytes:
+    """读取文件内容用于计算指纹，文件不存在时返回空bytes"""
+    if os.path.exists(filepath):
+        with open(filepath, 'rb') as f:
+            return f.read()
+    return b""
 
 
+def load_build_state() -> Dict[str, str]:
+    """读取各产物上次构建时的输入指纹"""
+    global _build_state
+    with _build_state_lock:
+        if _build_state is None:
+            _build_state = {}
+            state_file = get_cache_path(BUILD_CONFIG['state_file'])
+            try:
+                if os.path.exists(state_file):
+                    with open(state_file, 'r', encoding='utf-8') as f:
+                        _build_state = json.load(f)
+            except Exception as e:
+                print(f"读取构建状态失败：{e}")
+        return _build_state
 
-def get_index_data(symbol: str, name: str) -> Optional[Dict[str, Any]]:
-    """获取指数数据，尝试多个数据源
+
+def is_artifact_clean(name: str, fp: str, outputs: List[str]) -> bool:
+    """判断产物是否无需重建：输入指纹未变且输出文件都存在"""
+    return load_build_state().get(name) == fp and all(os.path.exists(output) for output in outputs)
+
+
+def mark_artifact_built(name: str, fp: str) -> None:
+    """记录产物的输入指纹并写回构建状态文件"""
+    state = load_build_state()
+    with _build_state_lock:
+        state[name] = fp
+        state_file = get_cache_path(BUILD_CONFIG['state_file'])
+        try:
+            tmp_file = f"{state_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, state_file)
+        except Exception as e:
+            print(f"保存构建状态失败：{e}")
+
+
+def build_chart_artifact(name: str, fp: str, build: Callable[[], str]) -> str:
+    """按输入指纹构建图表HTML，输入未变时直接复用上次的结果
+    
+    缓存的HTML和lazy模式的图表数据都在缓存目录内，CI中随缓存恢复，新检出的仓库也能跳过重建。
     
     Args:
-        symbol: 指数代码
-        name: 指数名称
+        name: 产物名称，同时也是lazy模式下的图表数据文件名
+        fp: 输入指纹
+        build: 构建函数，返回图表HTML，失败时返回空字符串
         
     Returns:
-        包含指数信息的字典，如果获取失败则返回None
+        图表HTML内容
     """
-    print(f"尝试获取{name}({symbol})数据...")
-    
-    data = get_index_data_from_eastmoney(symbol, name)
-    if data:
-        return data
+    cached_file = get_cache_path(f"build_{name}.html")
+    outputs = [cached_file]
+    if CHART_CONFIG['export_mode'] == 'lazy':
+        outputs.append(os.path.join(FILE_PATHS['chart_data_dir'], f"{name}.json"))
     
-    data = get_index_data_from_sina(symbol, name)
-    if data:
-        return data
+    if is_artifact_clean(name, fp, outputs):
+        print(f"{name}输入未变化，跳过重建")
+        count_metric('build.reused')
+        with open(cached_file, 'r', encoding='utf-8') as f:
+            return f.read()
     
-    data = get_index_data_from_history(symbol, name)
-    if data:
-        return data
+    with metric_span(f"chart.{name}"):
+        chart_html = build()
+    count_metric('build.built')
+    if chart_html:
+        with open(cached_file, 'w', encoding='utf-8') as f:
+            f.write(chart_html)
+        mark_artifact_built(name, fp)
+    return chart_html
+
+
+# 存档表 → 除symbol和ts外的列及其类型，主键均为(symbol, ts)
+QUOTE_ARCHIVE_COLUMNS = {'name': 'TEXT', 'price': 'REAL', 'prev_price': 'REAL', 'change': 'REAL', 'change_pct': 'REAL'}
+ARCHIVE_TABLES = {
+    'stock_quotes': QUOTE_ARCHIVE_COLUMNS,
+    'index_quotes': QUOTE_ARCHIVE_COLUMNS,
+    'basis': {column: 'REAL' for column in
+              ['close_fut', 'close_spot', 'basis', 'ma60', 'mid', 'upper', 'lower', 'basis_rate']}
+}
+
+
+def to_archive_ts(value: Any) -> int:
+    """将时间转换为存档使用的Unix秒，无时区的时间按交易所时区解释"""
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize(CACHE_CONFIG['timezone'])
+    return int(ts.timestamp())
+
+
+@contextmanager
+def open_archive() -> Iterator[sqlite3.Connection]:
+    """打开本地存档，不存在的表自动创建，退出时提交事务并关闭连接
     
-    print(f"所有数据源均失败，返回None")
-    return None
+    各表以(symbol, ts)为主键并使用WITHOUT ROWID，数据按主键顺序聚集存储，
+    按代码查询时间范围或最近N条都只需一次索引范围扫描。存档文件的持久性取决于所在目录，
+    见ARCHIVE_CONFIG的说明。
+    """
+    conn = sqlite3.connect(get_cache_path(ARCHIVE_CONFIG['file']))
+    try:
+        for table, columns in ARCHIVE_TABLES.items():
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (symbol TEXT NOT NULL, ts INTEGER NOT NULL, "
+                f"{', '.join(f'{name} {kind}' for name, kind in columns.items())}, "
+                f"PRIMARY KEY (symbol, ts)) WITHOUT ROWID"
+            )
+        with conn:
+            yield conn
+    finally:
+        conn.close()
 
 
-def get_baidu_kline_data(code: str, is_futures: bool) -> Optional[pd.DataFrame]:
-    """从百度接口获取K线数据
+def write_archive(batches: Dict[str, List[tuple]]) -> int:
+    """在一个事务内批量写入存档，相同(symbol, ts)的行以新数据为准
     
     Args:
-        code: 代码
-        is_futures: 是否为期货
+        batches: 表名 → 行元组列表，元组依次为symbol、ts和ARCHIVE_TABLES中的各列
         
     Returns:
-        包含时间和收盘价的DataFrame
+        写入的行数，存档未启用或写入失败时返回0
     """
+    if not ARCHIVE_CONFIG['enabled']:
+        return 0
+    
+    written = 0
     try:
-        f_type = "true" if is_futures else "false"
-        url = f"https://finance.pae.baidu.com/selfselect/getstockquotation?all=1&code={code}&isIndex={not is_futures}&isBk=false&isBlock=false&isFutures={f_type}&isStock=false&newFormat=1&ktype=1&market_type=ab&group=quotation_futures_kline&finClientType=pc"
-        
-        response = requests.get(url, headers=API_CONFIG['headers'], timeout=API_CONFIG['timeout'])
-        response.raise_for_status()
-        res_json = response.json()
-        
-        raw_str = res_json['Result']['newMarketData']['marketData']
-        keys = res_json['Result']['newMarketData']['keys']
-        
-        rows = [line.split(',') for line in raw_str.split(';') if line]
-        df = pd.DataFrame(rows, columns=keys)
-        df['time'] = pd.to_datetime(df['time'])
-        df['close'] = pd.to_numeric(df['close'], errors='coerce')
-        
-        return df[['time', 'close']]
+        with _archive_lock, metric_span('archive.write'), open_archive() as conn:
+            for table, rows in batches.items():
+                columns = ['symbol', 'ts', *ARCHIVE_TABLES[table]]
+                sql = f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+                for start in range(0, len(rows), ARCHIVE_CONFIG['batch_size']):
+                    conn.executemany(sql, rows[start:start + ARCHIVE_CONFIG['batch_size']])
+                written += len(rows)
     except Exception as e:
-        print(f"从百度接口获取{code}数据失败：{e}")
-        return None
+        print(f"写入本地存档失败：{e}")
+        return 0
+    
+    count_metric('archive.rows', written)
+    return written
+
 
+def read_archive(table: str, sql: str, params: tuple) -> pd.DataFrame:
+    """执行存档查询，REAL列转换为浮点数，ts列转换为交易所时区的无时区时间列time"""
+    with open_archive() as conn:
+        df = pd.read_sql_query(sql, conn, params=params)
+    df = df.astype({name: 'float64' for name, kind in ARCHIVE_TABLES[table].items() if kind == 'REAL'})
+    df.insert(0, 'time', pd.to_datetime(df.pop('ts'), unit='s', utc=True)
+              .dt.tz_convert(CACHE_CONFIG['timezone']).dt.tz_localize(None))
+    return df
 
-def get_index_futures_data(spot_code: str, future_code: str, index_name: str) -> Optional[pd.DataFrame]:
-    """获取指数现货和期货数据并计算基差
+
+def query_archive_range(table: str, symbol: str, start: Any = None, end: Any = None) -> pd.DataFrame:
+    """查询存档中某代码在时间范围内的全部记录
     
     Args:
-        spot_code: 现货代码
-        future_code: 期货代码
-        index_name: 指数名称
+        table: 存档表名，见ARCHIVE_TABLES
+        symbol: 代码；基差表为期货合约代码
+        start: 开始时间（含），None表示不限
+        end: 结束时间（含），None表示不限
         
     Returns:
-        包含基差和技术指标的DataFrame
+        按时间升序的DataFrame，包含time列和该表的各列
     """
-    try:
-        df_spot = get_baidu_kline_data(spot_code, is_futures=False)
-        df_future = get_baidu_kline_data(future_code, is_futures=True)
-        
-        if df_spot is None or df_future is None:
-            return None
-        
-        df_basis = pd.merge(df_future, df_spot, on='time', suffixes=('_fut', '_spot'))
-        df_basis['basis'] = df_basis['close_fut'] - df_basis['close_spot']
-        
-        ma60_window = TECHNICAL_INDICATORS['MA60_WINDOW']
-        bollinger_window = TECHNICAL_INDICATORS['BOLLINGER_WINDOW']
-        std_multiplier = TECHNICAL_INDICATORS['STD_MULTIPLIER']
-        
-        df_basis['ma60'] = df_basis['basis'].rolling(window=ma60_window).mean()
-        df_basis['mid'] = df_basis['basis'].rolling(window=bollinger_window).mean()
-        df_basis['std'] = df_basis['basis'].rolling(window=bollinger_window).std()
-        df_basis['upper'] = df_basis['mid'] + std_multiplier * df_basis['std']
-        df_basis['lower'] = df_basis['mid'] - std_multiplier * df_basis['std']
-        
-        return df_basis
-    except Exception as e:
-        print(f"获取{index_name}数据时出错: {e}")
-        return None
+    columns = ARCHIVE_TABLES[table]
+    start_ts = to_archive_ts(start) if start is not None else -2 ** 63
+    end_ts = to_archive_ts(end) if end is not None else 2 ** 63 - 1
+    return read_archive(
+        table,
+        f"SELECT ts, {', '.join(columns)} FROM {table} WHERE symbol = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+        (symbol, start_ts, end_ts)
+    )
 
 
-def create_basis_chart(df_basis: pd.DataFrame, index_name: str, output_file: str) -> bool:
-    """创建基差交互式图表
+def query_archive_latest(table: str, symbol: str, n: int = 1) -> pd.DataFrame:
+    """查询存档中某代码最近的n条记录，按时间升序返回"""
+    columns = ARCHIVE_TABLES[table]
+    df = read_archive(
+        table,
+        f"SELECT ts, {', '.join(columns)} FROM {table} WHERE symbol = ? ORDER BY ts DESC LIMIT ?",
+        (symbol, n)
+    )
+    return df.iloc[::-1].reset_index(drop=True)
+
+
+def quote_archive_rows(quotes: Iterable[Dict[str, Any]], ts: int) -> List[tuple]:
+    """将行情字典转换为存档行"""
+    return [(quote['symbol'], ts, *(quote.get(column) for column in ARCHIVE_TABLES['stock_quotes']))
+            for quote in quotes]
+
+
+def changed_quote_rows(conn: sqlite3.Connection, table: str, rows: List[tuple], since_ts: int) -> List[tuple]:
+    """过滤掉与存档中该代码since_ts之后最近一次快照相同的行情行
+    
+    行情没有变化时（如收盘后的多次运行）不重复写入快照，页面的当日走势也不会因此变化。
+    """
+    columns = ', '.join(ARCHIVE_TABLES[table])
+    changed = []
+    for row in rows:
+        last = conn.execute(
+            f"SELECT {columns} FROM {table} WHERE symbol = ? AND ts >= ? ORDER BY ts DESC LIMIT 1",
+            (row[0], since_ts)
+        ).fetchone()
+        if last != row[2:]:
+            changed.append(row)
+    return changed
+
+
+def basis_archive_rows(engine: Optional[Dict[str, Any]], conn: sqlite3.Connection) -> List[tuple]:
+    """将基差矩阵中存档还没有的行转换为存档行
+    
+    每个合约从存档中最后一行（含）开始写入，最后一根K线盘中可能还在变化，重新写入以新数据为准。
+    """
+    if not engine:
+        return []
+    
+    rows = []
+    columns = list(ARCHIVE_TABLES['basis'])
+    for code in engine['contracts']:
+        df = get_contract_basis_frame(engine, code)
+        if df.empty:
+            continue
+        ts = ((df['time'].dt.tz_localize(CACHE_CONFIG['timezone']) - pd.Timestamp(0, tz='UTC'))
+              // pd.Timedelta(seconds=1)).to_numpy()
+        last = conn.execute("SELECT MAX(ts) FROM basis WHERE symbol = ?", (code,)).fetchone()[0]
+        mask = ts >= last if last is not None else np.ones(len(ts), dtype=bool)
+        values = df.loc[mask, columns].astype(object).where(df.loc[mask, columns].notna(), None)
+        rows += [(code, int(t), *row) for t, row in zip(ts[mask], values.itertuples(index=False, name=None))]
+    return rows
+
+
+def archive_run(stock_data: Dict[str, Any], indices: List[Dict[str, Any]],
+                watchlist: Optional[List[Dict[str, Any]]] = None,
+                engine: Optional[Dict[str, Any]] = None) -> int:
+    """将本次运行的行情快照和基差数据批量写入本地存档
+    
+    行情以本次运行的时间为时间戳，只在交易日开盘后写入，且只写入与当天上一次快照不同的行情；
+    基差以K线时间为时间戳。
     
     Args:
-        df_basis: 基差数据DataFrame
-        index_name: 指数名称
-        output_file: 输出文件路径
+        stock_data: 股票行情
+        indices: 指数行情列表
+        watchlist: 自选股行情列表
+        engine: 基差矩阵，轻量更新时为None
         
     Returns:
-        是否成功创建图表
+        写入的行数
+    """
+    if not ARCHIVE_CONFIG['enabled']:
+        return 0
+    
+    now = now_cn()
+    ts = to_archive_ts(now)
+    batches = {}
+    try:
+        with open_archive() as conn:
+            if is_snapshot_time(now, get_trade_calendar()):
+                since_ts = to_archive_ts(now.replace(hour=0, minute=0, second=0, microsecond=0))
+                batches['stock_quotes'] = changed_quote_rows(
+                    conn, 'stock_quotes', quote_archive_rows([stock_data, *(watchlist or [])], ts), since_ts)
+                batches['index_quotes'] = changed_quote_rows(
+                    conn, 'index_quotes', quote_archive_rows(indices, ts), since_ts)
+            if engine:
+                batches['basis'] = basis_archive_rows(engine, conn)
+    except Exception as e:
+        print(f"读取本地存档失败：{e}")
+    
+    written = write_archive(batches)
+    if written:
+        print(f"已写入本地存档{written}行")
+    return written
+
+
+def query_archived_basis(code: str) -> Optional[pd.DataFrame]:
+    """从存档读取合约此前各次运行写入的基差历史，用于K线获取失败时绘制基差图表
+    
+    Returns:
+        包含time以及存档中基差各列的DataFrame，存档未启用或没有该合约的记录时返回None
+    """
+    if not ARCHIVE_CONFIG['enabled']:
+        return None
+    try:
+        df = query_archive_range('basis', code)
+    except Exception as e:
+        print(f"读取本地存档失败：{e}")
+        return None
+    if df.empty:
+        return None
+    print(f"{code}的K线获取失败，使用本地存档中的{len(df)}行基差历史")
+    count_metric('archive.basis_fallbacks')
+    return df
+
+
+def get_quote_trail(symbol: str) -> List[Dict[str, Any]]:
+    """从存档中读取某只股票当天各次运行的行情快照，供页面显示当日走势
+    
+    非交易日和开盘前不写入快照，此时返回空列表，页面不显示当日走势。
+    """
+    if not ARCHIVE_CONFIG['enabled']:
+        return []
+    try:
+        start = now_cn().replace(hour=0, minute=0, second=0, microsecond=0)
+        df = query_archive_range('stock_quotes', symbol, start=start)
+    except Exception as e:
+        print(f"读取本地存档失败：{e}")
+        return []
+    return [{'time': row['time'].strftime('%H:%M'), 'price': row['price'], 'change_pct': row['change_pct']}
+            for row in df.to_dict('records')]
+
+
+def get_stock_history(symbol: str) -> Optional[pd.DataFrame]:
+    """获取股票日线历史数据（不复权）
+    
+    同一次运行内只获取一次，并发调用会等待同一次获取的结果；获取失败也会被记住，
+    依赖历史数据的任务不会在数据源故障时各自重新下载一遍。
+    
+    Args:
+        symbol: 股票代码
+        
+    Returns:
+        akshare格式的日线DataFrame，获取失败时返回None
+    """
+    with get_cache_lock(f"stock_hist:{symbol}"):
+        if symbol not in _stock_history_cache:
+            _stock_history_cache[symbol] = load_stock_history(symbol)
+        return _stock_history_cache[symbol]
+
+
+def load_stock_history(symbol: str) -> Optional[pd.DataFrame]:
+    """从本地缓存加载股票日线历史数据，并按需增量更新
+    
+    本地以parquet文件缓存，更新时只请求最后一个缓存交易日及之后的数据，
+    并用新数据覆盖重叠部分。
+    
+    Args:
+        symbol: 股票代码
+        
+    Returns:
+        akshare格式的日线DataFrame，获取失败时返回None
+    """
+    cache_file = get_cache_path(f"stock_hist_{symbol}.parquet")
+    df_cached = None
+    
+    try:
+        if os.path.exists(cache_file):
+            df_cached = pd.read_parquet(cache_file)
+    except Exception as e:
+        print(f"读取{symbol}历史数据缓存失败：{e}")
+    
+    if df_cached is not None and not df_cached.empty:
+        last_date = pd.to_datetime(df_cached['日期'].iloc[-1]).date()
+        if is_history_fresh(cache_file, last_date):
+            count_metric('stock_history.cache_hits')
+            return df_cached
+        start_date = last_date.strftime('%Y%m%d')
+    else:
+        df_cached = None
+        start_date = '19700101'
+    
+    try:
+        df_new = call_akshare('stock_zh_a_hist', symbol=symbol, period="daily", start_date=start_date, adjust="")
+    except Exception as e:
+        print(f"获取{symbol}历史数据失败：{e}")
+        df_new = None
+    
+    if df_new is None or df_new.empty:
+        if df_cached is not None:
+            print(f"使用本地缓存的{symbol}历史数据")
+        return df_cached
+    
+    df_new['日期'] = pd.to_datetime(df_new['日期']).dt.date
+    if df_cached is not None:
+        df_cached['日期'] = pd.to_datetime(df_cached['日期']).dt.date
+        df_cached = df_cached[df_cached['日期'] < df_new['日期'].iloc[0]]
+        df = pd.concat([df_cached, df_new], ignore_index=True)
+    else:
+        df = df_new.reset_index(drop=True)
+    
+    try:
+        # 先写入内存再原子替换，读取方不会读到写了一半的文件
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False)
+        write_atomic(cache_file, [buffer.getvalue()], binary=True)
+    except Exception as e:
+        print(f"保存{symbol}历史数据缓存失败：{e}")
+    
+    return df
+
+
+def get_stock_data(symbol: str, name: str) -> Optional[Dict[str, Any]]:
+    """获取股票数据
+    
+    Args:
+        symbol: 股票代码
+        name: 股票名称
+        
+    Returns:
+        包含股票信息的字典，如果获取失败则返回None
+    """
+    try:
+        df = get_stock_history(symbol)
+        if df is None:
+            raise ValueError("无法获取历史数据")
+        latest_row = df.iloc[-1]
+        previous_row = df.iloc[-2]
+        
+        price = round(latest_row['收盘'], 2)
+        prev_price = round(previous_row['收盘'], 2)
+        change_data = calculate_price_change(price, prev_price)
+        
+        return {
+            'name': name,
+            'symbol': symbol,
+            'price': price,
+            'prev_price': prev_price,
+            **change_data
+        }
+    except (KeyError, IndexError, ValueError) as e:
+        print(f"获取{name}({symbol})数据失败：{e}")
+        return None
+    except Exception as e:
+        print(f"获取{name}({symbol})时发生未知错误：{e}")
+        return None
+
+
+def get_index_snapshot(source: str, series: str = '') -> Dict[str, Dict[str, Any]]:
+    """获取指数行情快照，并建立 代码→行 的索引
+    
+    每个数据源的每个系列在一次运行内最多请求一次，获取失败时缓存空索引，
+    后续查询直接回退到下一个数据源。
+    
+    Args:
+        source: 数据源，'eastmoney' 或 'sina'
+        series: 东方财富指数系列名称，新浪数据源忽略
+        
+    Returns:
+        以指数代码为键的行数据字典
+    """
+    key = f"{source}:{series}"
+    with get_cache_lock(f"index_snapshot:{key}"):
+        if key in _index_snapshot_cache:
+            return _index_snapshot_cache[key]
+        
+        snapshot = {}
+        try:
+            if source == 'eastmoney':
+                df = call_akshare('stock_zh_index_spot_em', symbol=series)
+            else:
+                df = call_akshare('stock_zh_index_spot_sina')
+            for row in df.to_dict('records'):
+                snapshot.setdefault(str(row['代码']), row)
+        except Exception as e:
+            print(f"获取{series or source}指数行情快照失败：{e}")
+        
+        _index_snapshot_cache[key] = snapshot
+        return snapshot
+
+
+def get_eastmoney_series(symbol: str) -> str:
+    """根据指数代码确定东方财富指数系列"""
+    if symbol.startswith('000'):
+        return "上证系列指数"
+    elif symbol.startswith('399'):
+        return "深证系列指数"
+    return "中证系列指数"
+
+
+def build_index_quote(row: Dict[str, Any], symbol: str, name: str) -> Dict[str, Any]:
+    """将行情快照中的一行转换为指数数据字典"""
+    return {
+        'name': name,
+        'symbol': symbol,
+        'price': round(float(row['最新价']), 2),
+        'prev_price': round(float(row['昨收']), 2),
+        'change': round(float(row['涨跌额']), 2),
+        'change_pct': round(float(row['涨跌幅']), 2)
+    }
+
+
+def get_index_data_from_eastmoney(symbol: str, name: str) -> Optional[Dict[str, Any]]:
+    """从东方财富网获取指数数据"""
+    try:
+        row = get_index_snapshot('eastmoney', get_eastmoney_series(symbol)).get(symbol)
+        if row is not None:
+            data = build_index_quote(row, symbol, name)
+            print(f"成功从东方财富网获取{name}({symbol})数据")
+            return data
+    except Exception as e:
+        print(f"从东方财富网获取{name}({symbol})失败：{e}")
+    return None
+
+
+def get_index_data_from_sina(symbol: str, name: str) -> Optional[Dict[str, Any]]:
+    """从新浪财经获取指数数据"""
+    try:
+        sina_symbol = f"sh{symbol}" if symbol.startswith('000') else f"sz{symbol}"
+        row = get_index_snapshot('sina').get(sina_symbol)
+        if row is not None:
+            data = build_index_quote(row, symbol, name)
+            print(f"成功从新浪财经获取{name}({symbol})数据")
+            return data
+    except Exception as e:
+        print(f"从新浪财经获取{name}({symbol})失败：{e}")
+    return None
+
+
+def get_index_data_from_history(symbol: str, name: str) -> Optional[Dict[str, Any]]:
+    """从历史数据接口获取指数数据"""
+    try:
+        df_daily = call_akshare('stock_zh_index_daily', symbol=symbol)
+        
+        if 'date' in df_daily.columns:
+            latest_row = df_daily.iloc[-1]
+            previous_row = df_daily.iloc[-2]
+            price = round(latest_row['close'], 2)
+            prev_price = round(previous_row['close'], 2)
+        else:
+            latest_row = df_daily.iloc[-1]
+            previous_row = df_daily.iloc[-2]
+            price = round(latest_row[df_daily.columns[3]], 2)
+            prev_price = round(previous_row[df_daily.columns[3]], 2)
+        
+        change_data = calculate_price_change(price, prev_price)
+        
+        print(f"成功从历史数据接口获取{name}({symbol})数据")
+        return {
+            'name': name,
+            'symbol': symbol,
+            'price': price,
+            'prev_price': prev_price,
+            **change_data
+        }
+    except Exception as e:
+        print(f"从历史数据接口获取{name}({symbol})失败：{e}")
+    return None
+
+
+
+
+
+INDEX_SOURCES = {
+    'eastmoney': get_index_data_from_eastmoney,
+    'sina': get_index_data_from_sina,
+    'history': get_index_data_from_history
+}
+
+
+def load_source_stats() -> Dict[str, Dict[str, Any]]:
+    """读取持久化的数据源统计，键为 数据源:指数代码"""
+    global _source_stats
+    with _source_stats_lock:
+        if _source_stats is None:
+            _source_stats = {}
+            stats_file = get_cache_path(SOURCE_CONFIG['stats_file'])
+            try:
+                if os.path.exists(stats_file):
+                    with open(stats_file, 'r', encoding='utf-8') as f:
+                        _source_stats = json.load(f)
+            except Exception as e:
+                print(f"读取数据源统计失败：{e}")
+        return _source_stats
+
+
+def save_source_stats() -> bool:
+    """将数据源统计写回缓存目录"""
+    stats = load_source_stats()
+    stats_file = get_cache_path(SOURCE_CONFIG['stats_file'])
+    try:
+        with _source_stats_lock:
+            tmp_file = f"{stats_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(stats, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, stats_file)
+        return True
+    except Exception as e:
+        print(f"保存数据源统计失败：{e}")
+        return False
+
+
+def record_source_result(key: str, success: bool, latency: float) -> None:
+    """记录一次数据源请求结果
+    
+    连续失败达到failure_threshold后熔断，cooldown时间内该数据源被降级到最后尝试；
+    冷却结束后恢复正常顺序，再次失败则重新熔断，成功则清零失败计数。
+    """
+    stats = load_source_stats()
+    with _source_stats_lock:
+        entry = stats.setdefault(key, {'successes': 0, 'failures': 0, 'consecutive_failures': 0,
+                                       'latency_avg': None, 'open_until': 0})
+        alpha = SOURCE_CONFIG['latency_alpha']
+        if entry['latency_avg'] is None:
+            entry['latency_avg'] = round(latency, 3)
+        else:
+            entry['latency_avg'] = round(alpha * latency + (1 - alpha) * entry['latency_avg'], 3)
+        
+        if success:
+            entry['successes'] += 1
+            entry['consecutive_failures'] = 0
+            entry['open_until'] = 0
+        else:
+            entry['failures'] += 1
+            entry['consecutive_failures'] += 1
+            if entry['consecutive_failures'] >= SOURCE_CONFIG['failure_threshold']:
+                entry['open_until'] = time.time() + SOURCE_CONFIG['cooldown']
+
+
+def get_source_order(symbol: str) -> List[str]:
+    """获取指数数据源的尝试顺序，熔断中的数据源排在最后"""
+    stats = load_source_stats()
+    now = time.time()
+    healthy, tripped = [], []
+    for source in SOURCE_CONFIG['order']:
+        entry = stats.get(f"{source}:{symbol}", {})
+        if entry.get('open_until', 0) > now:
+            tripped.append(source)
+        else:
+            healthy.append(source)
+    return healthy + tripped
+
+
+def run_index_source(source: str, symbol: str, name: str) -> Optional[Dict[str, Any]]:
+    """调用单个指数数据源并记录耗时与结果"""
+    start = time.monotonic()
+    with metric_span(f"source.{source}", symbol=symbol):
+        data = INDEX_SOURCES[source](symbol, name)
+    record_source_result(f"{source}:{symbol}", data is not None, time.monotonic() - start)
+    count_metric(f"source.{source}.{'ok' if data is not None else 'failed'}")
+    return data
+
+
+def get_index_data(symbol: str, name: str) -> Optional[Dict[str, Any]]:
+    """获取指数数据，尝试多个数据源
+    
+    对冲模式下先请求首选数据源，超过hedge_delay仍未返回或已失败时启动下一个数据源，
+    采用最先返回的有效结果，其余请求的结果被丢弃。各数据源在守护线程中运行，
+    落选的请求不会拖住进程退出。
+    
+    Args:
+        symbol: 指数代码
+        name: 指数名称
+        
+    Returns:
+        包含指数信息的字典，如果获取失败则返回None
+    """
+    print(f"尝试获取{name}({symbol})数据...")
+    
+    order = get_source_order(symbol)
+    hedge_delay = SOURCE_CONFIG['hedge_delay'] if SOURCE_CONFIG['hedged'] else None
+    pending = {}
+    next_source = 0
+    data = None
+    
+    try:
+        while data is None:
+            if next_source < len(order):
+                pending[start_daemon_task(run_index_source, order[next_source], symbol, name)] = order[next_source]
+                next_source += 1
+            if not pending:
+                break
+            
+            timeout = hedge_delay if next_source < len(order) else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                source = pending.pop(future)
+                result = future.result()
+                if data is None and result:
+                    data = result
+                    # 回退跳数：实际使用的数据源在本次尝试顺序中的位置
+                    set_metric_label(f"index_source.{symbol}", source)
+                    count_metric('index.fallback_hops', order.index(source))
+    finally:
+        # 落选的数据源在守护线程中继续运行，结果和统计仍会记录，统计在运行结束时统一保存
+        for future in pending:
+            abandon_task(future)
+    
+    if data:
+        return data
+    
+    print(f"所有数据源均失败，返回None")
+    return None
+
+
+def get_http_session() -> requests.Session:
+    """获取共享的HTTP会话
+    
+    会话复用连接池并携带API_CONFIG中的请求头，进程内只创建一次。
+    """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            session.headers.update(API_CONFIG['headers'])
+            session.headers['Accept-Encoding'] = 'gzip, deflate'
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=API_CONFIG['pool_size'],
+                pool_maxsize=API_CONFIG['pool_size']
+            )
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _http_session = session
+        return _http_session
+
+
+def http_get_with_retry(url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+    """发送GET请求，对连接错误、超时和可重试状态码做带抖动的指数退避重试
+    
+    Args:
+        url: 请求地址
+        headers: 额外的请求头
+        
+    Returns:
+        最后一次请求的响应
+    """
+    session = get_http_session()
+    max_retries = API_CONFIG['max_retries']
+    
+    for attempt in range(max_retries + 1):
+        try:
+            response = session.get(url, headers=headers, timeout=API_CONFIG['timeout'])
+            if response.status_code not in API_CONFIG['retry_statuses'] or attempt == max_retries:
+                return response
+            retry_after = response.headers.get('Retry-After', '')
+            delay = float(retry_after) if retry_after.isdigit() else None
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == max_retries:
+                raise
+            delay = None
+        
+        if delay is None:
+            delay = random.uniform(0, min(API_CONFIG['backoff_max'], API_CONFIG['backoff_base'] * 2 ** attempt))
+        count_metric('http.retries')
+        time.sleep(delay)
+
+
+def get_market_ttl() -> float:
+    """获取行情类响应的缓存有效期（秒）
+    
+    交易时段内使用intraday_ttl；收盘后只要缓存晚于最近一次收盘结算时间即视为有效。
+    """
+    now = now_cn()
+    calendar = get_trade_calendar()
+    if is_market_open(now, calendar):
+        return CACHE_CONFIG['intraday_ttl']
+    
+    return max(0.0, (now - get_last_settled_time(now, calendar)).total_seconds())
+
+
+def http_get_json(url: str, ttl: float = 0) -> Any:
+    """获取JSON响应，带按URL缓存的本地响应缓存
+    
+    缓存未超过ttl时直接返回；否则携带ETag/Last-Modified发送条件请求，
+    304时复用缓存内容。请求失败但存在缓存时返回旧缓存。
+    
+    Args:
+        url: 请求地址
+        ttl: 缓存有效期（秒）
+        
+    Returns:
+        解析后的JSON对象
+    """
+    cache_dir = get_cache_path(CACHE_CONFIG['http_cache_dir'])
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    meta_file = os.path.join(cache_dir, f"{cache_key}.meta.json")
+    body_file = os.path.join(cache_dir, f"{cache_key}.body")
+    
+    meta = None
+    try:
+        if os.path.exists(meta_file) and os.path.exists(body_file):
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+    except Exception as e:
+        print(f"读取响应缓存失败：{e}")
+    
+    def read_body() -> Any:
+        with open(body_file, 'rb') as f:
+            return json.loads(f.read())
+    
+    if meta and time.time() - meta['fetched_at'] < ttl:
+        count_metric('http.cache_hits')
+        return read_body()
+    
+    headers = {}
+    if meta and meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta and meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+    
+    try:
+        with metric_span(f"http.{urlparse(url).netloc}"):
+            response = http_get_with_retry(url, headers=headers)
+        count_metric('http.requests')
+        count_metric('http.bytes', len(response.content))
+        if response.status_code == 304 and meta:
+            count_metric('http.not_modified')
+            body = read_body()
+        else:
+            response.raise_for_status()
+            body = json.loads(response.content)
+            with open(body_file, 'wb') as f:
+                f.write(response.content)
+            meta = {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified')
+            }
+    except Exception:
+        if meta:
+            print(f"请求失败，使用本地缓存的响应：{url}")
+            count_metric('http.stale_fallbacks')
+            return read_body()
+        raise
+    
+    meta['fetched_at'] = time.time()
+    with open(meta_file, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    return body
+
+
+def prune_http_cache() -> None:
+    """删除超过http_cache_max_age没有再请求过的响应缓存
+    
+    K线增量请求的URL带有每天变化的起始时间，不清理时响应缓存每天都会新增文件。
+    """
+    cache_dir = get_cache_path(CACHE_CONFIG['http_cache_dir'])
+    cutoff = time.time() - CACHE_CONFIG['http_cache_max_age']
+    for meta_file in glob.glob(os.path.join(cache_dir, '*.meta.json')):
+        try:
+            if os.path.getmtime(meta_file) < cutoff:
+                body_file = meta_file[:-len('.meta.json')] + '.body'
+                os.remove(meta_file)
+                if os.path.exists(body_file):
+                    os.remove(body_file)
+                count_metric('http.cache_evicted')
+        except OSError as e:
+            print(f"清理响应缓存失败：{e}")
+
+
+def call_akshare(func: str, **kwargs: Any) -> pd.DataFrame:
+    """调用akshare接口
+    
+    API_CONFIG['akshare_base_url']设置时改为从该地址获取JSON格式的表格
+    （{"columns": [...], "data": [[...], ...]}），用于本地模拟行情服务器。
+    
+    Args:
+        func: akshare函数名
+        **kwargs: 接口参数
+        
+    Returns:
+        接口返回的DataFrame
+    """
+    base_url = API_CONFIG['akshare_base_url']
+    with metric_span(f"akshare.{func}"):
+        if not base_url:
+            df = getattr(ak, func)(**kwargs)
+        else:
+            url = f"{base_url}/akshare/{func}"
+            if kwargs:
+                url += f"?{urlencode(kwargs)}"
+            response = get_http_session().get(url, timeout=API_CONFIG['timeout'])
+            response.raise_for_status()
+            count_metric('http.bytes', len(response.content))
+            table = json.loads(response.content)
+            df = pd.DataFrame(table['data'], columns=table['columns'])
+    count_metric('akshare.rows', len(df))
+    return df
+
+
+def parse_baidu_market_data(raw_str: str, keys: List[str]) -> pd.DataFrame:
+    """解析百度marketData字符串
+    
+    记录以';'分隔、字段以','分隔，直接交给pandas的C解析器按列解析，
+    只读取time和close两列。
+    
+    Args:
+        raw_str: marketData原始字符串
+        keys: 字段名列表
+        
+    Returns:
+        包含时间和收盘价的DataFrame
+    """
+    if not raw_str.strip(';'):
+        return pd.DataFrame({
+            'time': pd.Series(dtype='datetime64[ns]'),
+            'close': pd.Series(dtype='float64')
+        })
+    
+    df = pd.read_csv(
+        io.StringIO(raw_str),
+        sep=',',
+        lineterminator=';',
+        header=None,
+        names=keys,
+        usecols=['time', 'close'],
+        dtype={'time': str, 'close': 'float64'},
+        na_values=['--', ''],
+        engine='c',
+        low_memory=False
+    )
+    df['time'] = pd.to_datetime(df['time'], format='ISO8601')
+    count_metric('baidu.rows', len(df))
+    return df[['time', 'close']]
+
+
+def get_baidu_kline_url(code: str, is_futures: bool, start_time: Optional[str] = None) -> str:
+    """构建百度K线接口地址
+    
+    Args:
+        code: 代码
+        is_futures: 是否为期货
+        start_time: 起始时间，为None时获取全部历史
+        
+    Returns:
+        请求地址
+    """
+    f_type = "true" if is_futures else "false"
+    url = f"{API_CONFIG['baidu_base_url']}/selfselect/getstockquotation?all={0 if start_time else 1}&code={code}&isIndex={not is_futures}&isBk=false&isBlock=false&isFutures={f_type}&isStock=false&newFormat=1&ktype=1&market_type=ab&group=quotation_futures_kline&finClientType=pc"
+    if start_time:
+        url += f"&start_time={quote(start_time)}"
+    return url
+
+
+def get_baidu_kline_data(code: str, is_futures: bool, start_time: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """从百度接口获取K线数据
+    
+    Args:
+        code: 代码
+        is_futures: 是否为期货
+        start_time: 起始时间，为None时获取全部历史
+        
+    Returns:
+        包含时间和收盘价的DataFrame
+    """
+    try:
+        res_json = http_get_json(get_baidu_kline_url(code, is_futures, start_time), ttl=get_market_ttl())
+        
+        raw_str = res_json['Result']['newMarketData']['marketData']
+        keys = res_json['Result']['newMarketData']['keys']
+        
+        return parse_baidu_market_data(raw_str, keys)
+    except Exception as e:
+        print(f"从百度接口获取{code}数据失败：{e}")
+        return None
+
+
+def read_kline_store(store_file: str) -> Optional[pd.DataFrame]:
+    """读取本地K线存储，不存在或为空时返回None"""
+    try:
+        if os.path.exists(store_file):
+            df_stored = pd.read_parquet(store_file)
+            if not df_stored.empty:
+                return df_stored
+    except Exception as e:
+        print(f"读取本地K线{store_file}失败：{e}")
+    return None
+
+
+def merge_kline_store(store_file: str, df_stored: Optional[pd.DataFrame],
+                      df_new: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    """将新K线合并进本地存储
+    
+    按time合并去重，重叠部分以新数据为准，合并后写回存储文件。
+    
+    Returns:
+        合并后按时间升序的DataFrame，没有新数据时返回原存储
+    """
+    if df_new is None or df_new.empty:
+        return df_stored
+    
+    if df_stored is not None:
+        df = pd.concat([df_stored, df_new], ignore_index=True)
+        df = df.drop_duplicates(subset='time', keep='last').sort_values('time', ignore_index=True)
+    else:
+        df = df_new.sort_values('time', ignore_index=True)
+    
+    try:
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False)
+        write_atomic(store_file, [buffer.getvalue()], binary=True)
+    except Exception as e:
+        print(f"保存本地K线{store_file}失败：{e}")
+    
+    return df
+
+
+def get_baidu_kline_history(code: str, is_futures: bool) -> Optional[pd.DataFrame]:
+    """获取完整K线历史，本地按代码增量存储
+    
+    本地已有数据时只请求最后一根K线及之后的数据，按time合并去重，
+    重叠部分以新数据为准；本地没有数据时获取全部历史。
+    
+    Args:
+        code: 代码
+        is_futures: 是否为期货
+        
+    Returns:
+        按时间升序的时间和收盘价DataFrame，获取失败且无本地数据时返回None
+    """
+    store_file = get_cache_path(f"baidu_kline_{code}.parquet")
+    df_stored = read_kline_store(store_file)
+    
+    if df_stored is not None:
+        start_time = df_stored['time'].iloc[-1].strftime('%Y-%m-%d %H:%M:%S')
+        df_new = get_baidu_kline_data(code, is_futures, start_time=start_time)
+    else:
+        df_new = get_baidu_kline_data(code, is_futures)
+    
+    return merge_kline_store(store_file, df_stored, df_new)
+
+
+def get_minute_kline_data(code: str, is_futures: bool) -> Optional[pd.DataFrame]:
+    """获取分钟K线数据
+    
+    期货使用新浪分钟线（连续合约代码如IF0），指数使用东方财富分钟线，
+    两者都只返回最近若干个交易日。
+    
+    Args:
+        code: 代码
+        is_futures: 是否为期货
+        
+    Returns:
+        包含时间和收盘价的DataFrame
+    """
+    period = INTRADAY_CONFIG['period']
+    try:
+        if is_futures:
+            df = call_akshare('futures_zh_minute_sina', symbol=code, period=period)
+            df = df.rename(columns={'datetime': 'time'})
+        else:
+            df = call_akshare('index_zh_a_hist_min_em', symbol=code, period=period)
+            df = df.rename(columns={'时间': 'time', '收盘': 'close'})
+        
+        df['time'] = pd.to_datetime(df['time'])
+        df['close'] = pd.to_numeric(df['close'], errors='coerce')
+        return df[['time', 'close']]
+    except Exception as e:
+        print(f"获取{code}分钟线失败：{e}")
+        return None
+
+
+def get_minute_kline_history(code: str, is_futures: bool) -> Optional[pd.DataFrame]:
+    """获取分钟K线并累积到本地存储，使历史长度不受接口返回天数限制"""
+    store_file = get_cache_path(f"minute_kline_{code}_{INTRADAY_CONFIG['period']}.parquet")
+    df_stored = read_kline_store(store_file)
+    df_new = get_minute_kline_data(code, is_futures)
+    return merge_kline_store(store_file, df_stored, df_new)
+
+
+def align_basis_asof(df_future: pd.DataFrame, df_spot: pd.DataFrame, tolerance: str) -> pd.DataFrame:
+    """按时间就近对齐期货和现货并计算基差
+    
+    对每根期货K线取时间不晚于它、且相差不超过tolerance的最近一根现货K线，
+    超出容差没有匹配的期货K线被丢弃。
+    
+    Args:
+        df_future: 期货时间和收盘价
+        df_spot: 现货时间和收盘价
+        tolerance: 最大时间差，如'30s'
+        
+    Returns:
+        包含time、close_fut、close_spot和basis列的DataFrame
+    """
+    df_basis = pd.merge_asof(
+        df_future.sort_values('time').rename(columns={'close': 'close_fut'}),
+        df_spot.sort_values('time').rename(columns={'close': 'close_spot'}),
+        on='time',
+        direction='backward',
+        tolerance=pd.Timedelta(tolerance)
+    )
+    unmatched = int(df_basis['close_spot'].isna().sum())
+    if unmatched:
+        print(f"{unmatched}根期货K线在{tolerance}内没有对应的现货K线，已丢弃")
+    df_basis = df_basis.dropna(subset=['close_spot']).reset_index(drop=True)
+    df_basis['basis'] = df_basis['close_fut'] - df_basis['close_spot']
+    return df_basis
+
+
+def get_intraday_basis_data(spot_code: str, future_code: str, index_name: str) -> Optional[pd.DataFrame]:
+    """获取分钟级现货和期货数据，按时间就近对齐后计算基差和技术指标
+    
+    Args:
+        spot_code: 现货代码
+        future_code: 期货连续合约代码（新浪格式，如IF0）
+        index_name: 指数名称
+        
+    Returns:
+        包含基差和技术指标的DataFrame
+    """
+    try:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            spot_task = executor.submit(get_minute_kline_history, spot_code, False)
+            future_task = executor.submit(get_minute_kline_history, future_code, True)
+            df_spot = spot_task.result()
+            df_future = future_task.result()
+        
+        if df_spot is None or df_future is None:
+            return None
+        
+        df_basis = align_basis_asof(df_future, df_spot, INTRADAY_CONFIG['tolerance'])
+        state_key = f"{future_code}_{spot_code}_{INTRADAY_CONFIG['period']}min"
+        return compute_basis_indicators(df_basis, state_key)
+    except Exception as e:
+        print(f"获取{index_name}分时基差数据时出错: {e}")
+        return None
+
+
+class RollingWindow:
+    """固定长度窗口的滚动均值和样本标准差
+    
+    用可增删的Welford算法维护窗口内的均值和平方差和，每根K线O(1)更新；
+    另外保留rollback个已移出窗口的值，以便撤回最近几根被修正的K线。
+    窗口未满或含NaN时结果为NaN，与pandas的rolling(window).mean()/std()一致。
+    """
+    
+    def __init__(self, window: int, rollback: int = 0, values: Optional[List[float]] = None):
+        self.window = window
+        self.rollback = rollback
+        self.buffer: deque = deque(maxlen=window + rollback)
+        self.count = 0
+        self.nan_count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        for value in values or []:
+            self.push(value)
+    
+    def _add(self, x: float) -> None:
+        if math.isnan(x):
+            self.nan_count += 1
+            return
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+    
+    def _remove(self, x: float) -> None:
+        if math.isnan(x):
+            self.nan_count -= 1
+            return
+        self.count -= 1
+        if self.count == 0:
+            self.mean = 0.0
+            self.m2 = 0.0
+            return
+        delta = x - self.mean
+        self.mean -= delta / self.count
+        self.m2 -= delta * (x - self.mean)
+    
+    def push(self, x: float) -> None:
+        """追加一个值，窗口已满时移出最早的值"""
+        x = float(x)
+        if len(self.buffer) >= self.window:
+            self._remove(self.buffer[-self.window])
+        self.buffer.append(x)
+        self._add(x)
+    
+    def pop(self) -> float:
+        """撤回最近追加的值，并把之前移出窗口的值放回"""
+        x = self.buffer.pop()
+        self._remove(x)
+        if len(self.buffer) >= self.window:
+            self._add(self.buffer[-self.window])
+        return x
+    
+    @property
+    def ready(self) -> bool:
+        return len(self.buffer) >= self.window and self.nan_count == 0
+    
+    def get_mean(self) -> float:
+        return self.mean if self.ready else math.nan
+    
+    def get_std(self) -> float:
+        if not self.ready or self.window < 2:
+            return math.nan
+        return math.sqrt(max(self.m2, 0.0) / (self.count - 1))
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {'window': self.window, 'rollback': self.rollback, 'values': list(self.buffer)}
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'RollingWindow':
+        # 从缓冲区重新累加，避免长期增删带来的浮点误差累积
+        return cls(data['window'], data['rollback'], data['values'])
+
+
+def find_resume_index(df_stored: pd.DataFrame, df_basis: pd.DataFrame, rollback: int) -> Optional[int]:
+    """找到新基差序列与已存储序列开始不一致的位置
+    
+    一次性比较两者重叠部分的全部时间和基差（NaN视为相等）；第一个不一致的位置早于已存储序列的
+    最后rollback行时，滚动状态无法撤回到那里，返回None，需要全量重算。
+    """
+    n = len(df_stored)
+    overlap = min(n, len(df_basis))
+    stored_basis = df_stored['basis'].to_numpy(dtype=float)[:overlap]
+    new_basis = df_basis['basis'].to_numpy(dtype=float)[:overlap]
+    mismatch = ((df_stored['time'].to_numpy()[:overlap] != df_basis['time'].to_numpy()[:overlap])
+                | ~((stored_basis == new_basis) | (np.isnan(stored_basis) & np.isnan(new_basis))))
+    resume_index = int(mismatch.argmax()) if mismatch.any() else overlap
+    if resume_index < n - rollback:
+        return None
+    return resume_index
+
+
+def compute_basis_indicators(df_basis: pd.DataFrame, state_key: str) -> pd.DataFrame:
+    """计算基差的MA60和布林带，持久化滚动状态并增量更新
+    
+    本地有上次的结果和滚动状态时，撤回被修正的最近K线后只对新增K线做O(1)更新；
+    否则用pandas rolling全量计算并重建状态。目前只用于分时基差，日线基差由
+    compute_basis_matrix对全部合约一次性全量计算。
+    
+    Args:
+        df_basis: 包含time和basis列的基差DataFrame
+        state_key: 状态文件名标识
+        
+    Returns:
+        增加了ma60、mid、std、upper、lower列的DataFrame
+    """
+    ma60_window = TECHNICAL_INDICATORS['MA60_WINDOW']
+    bollinger_window = TECHNICAL_INDICATORS['BOLLINGER_WINDOW']
+    std_multiplier = TECHNICAL_INDICATORS['STD_MULTIPLIER']
+    rollback = TECHNICAL_INDICATORS['ROLLBACK_BARS']
+    indicator_columns = ['time', 'basis', 'ma60', 'mid', 'std']
+    
+    frame_file = get_cache_path(f"basis_{state_key}.parquet")
+    state_file = get_cache_path(f"basis_{state_key}.state.json")
+    df_stored = None
+    state = None
+    
+    try:
+        if os.path.exists(frame_file) and os.path.exists(state_file):
+            df_stored = pd.read_parquet(frame_file)
+            with open(state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state['config'] != [ma60_window, bollinger_window, rollback] or state['rows'] != len(df_stored):
+                state = None
+    except Exception as e:
+        print(f"读取{state_key}指标状态失败：{e}")
+        state = None
+    
+    resume_index = find_resume_index(df_stored, df_basis, rollback) if state else None
+    
+    df_result = df_basis.copy()
+    if resume_index is None:
+        df_result['ma60'] = df_result['basis'].rolling(window=ma60_window).mean()
+        df_result['mid'] = df_result['basis'].rolling(window=bollinger_window).mean()
+        df_result['std'] = df_result['basis'].rolling(window=bollinger_window).std()
+        
+        basis_values = df_result['basis'].tolist()
+        ma_window = RollingWindow(ma60_window, rollback, basis_values[-(ma60_window + rollback):])
+        boll_window = RollingWindow(bollinger_window, rollback, basis_values[-(bollinger_window + rollback):])
+    else:
+        ma_window = RollingWindow.from_dict(state['ma60'])
+        boll_window = RollingWindow.from_dict(state['bollinger'])
+        for _ in range(len(df_stored) - resume_index):
+            ma_window.pop()
+            boll_window.pop()
+        
+        ma60, mid, std = [], [], []
+        for value in df_basis['basis'].iloc[resume_index:]:
+            ma_window.push(value)
+            boll_window.push(value)
+            ma60.append(ma_window.get_mean())
+            mid.append(boll_window.get_mean())
+            std.append(boll_window.get_std())
+        
+        for column, new_values in (('ma60', ma60), ('mid', mid), ('std', std)):
+            df_result[column] = np.concatenate([df_stored[column].to_numpy()[:resume_index], new_values])
+    
+    df_result['upper'] = df_result['mid'] + std_multiplier * df_result['std']
+    df_result['lower'] = df_result['mid'] - std_multiplier * df_result['std']
+    
+    try:
+        df_result[indicator_columns].to_parquet(frame_file, index=False)
+        with open(state_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'config': [ma60_window, bollinger_window, rollback],
+                'rows': len(df_result),
+                'ma60': ma_window.to_dict(),
+                'bollinger': boll_window.to_dict()
+            }, f)
+    except Exception as e:
+        print(f"保存{state_key}指标状态失败：{e}")
+    
+    return df_result
+
+
+def get_contract_expiry(code: str, calendar: List[datetime.date]) -> Optional[datetime.date]:
+    """获取股指期货合约的最后交易日：交割月第三个周五，遇节假日顺延到下一个交易日
+    
+    Args:
+        code: 合约代码，如IF2612；主力连续合约（888）没有固定到期日
+        calendar: 交易日历
+        
+    Returns:
+        最后交易日，连续合约返回None
+    """
+    suffix = code[2:]
+    if len(suffix) != 4 or not suffix.isdigit():
+        return None
+    year, month = 2000 + int(suffix[:2]), int(suffix[2:])
+    first = datetime.date(year, month, 1)
+    expiry = first + datetime.timedelta(days=(4 - first.weekday()) % 7 + 14)
+    if calendar:
+        while expiry <= calendar[-1] and not is_trading_day(expiry, calendar):
+            expiry += datetime.timedelta(days=1)
+    return expiry
+
+
+def get_delivery_contracts(product: str, today: datetime.date, count: int,
+                           calendar: List[datetime.date]) -> List[str]:
+    """获取某品种从当月（已过最后交易日则从下月）起连续count个交割月的合约代码"""
+    year, month = today.year, today.month
+    contracts = []
+    while len(contracts) < count:
+        code = f"{product}{year % 100:02d}{month:02d}"
+        if contracts or get_contract_expiry(code, calendar) >= today:
+            contracts.append(code)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return contracts
+
+
+def get_basis_contracts() -> List[str]:
+    """获取基差引擎覆盖的全部期货合约：配置的合约、自动生成的近月合约和图表用到的合约"""
+    contracts = list(BASIS_CONFIG['contracts'])
+    if BASIS_CONFIG['delivery_months']:
+        calendar = get_trade_calendar()
+        today = now_cn().date()
+        for product in BASIS_CONFIG['products']:
+            contracts += get_delivery_contracts(product, today, BASIS_CONFIG['delivery_months'], calendar)
+    contracts += [config['future_code'] for config in FUTURES_CONFIG.values()]
+    return list(dict.fromkeys(contracts))
+
+
+def pad_rolling(values: np.ndarray, window: int, rows: int) -> np.ndarray:
+    """在窗口统计结果前补window-1行NaN，使其与原矩阵逐行对齐"""
+    padded = np.full((rows,) + values.shape[1:], np.nan)
+    padded[window - 1:] = values
+    return padded
+
+
+def rolling_mean_std(values: np.ndarray, window: int) -> tuple[np.ndarray, np.ndarray]:
+    """用累加和按列计算滑动均值和样本标准差（ddof=1），与原矩阵逐行对齐
+    
+    窗口内有NaN时结果为NaN（相当于pandas rolling的min_periods为窗口长度）。先减去各列均值再累加，
+    减小平方和相减时的舍入误差。时间和内存都是O(行数×列数)，与窗口长度无关。
+    """
+    rows = len(values)
+    mean = np.full(values.shape, np.nan)
+    std = np.full(values.shape, np.nan)
+    if rows < window:
+        return mean, std
+    
+    valid = ~np.isnan(values)
+    center = np.where(valid, values, 0.0).sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+    shifted = np.where(valid, values - center, 0.0)
+    zeros = np.zeros((1, values.shape[1]))
+    sums = np.concatenate([zeros, np.cumsum(shifted, axis=0)])
+    squares = np.concatenate([zeros, np.cumsum(shifted * shifted, axis=0)])
+    counts = np.concatenate([zeros, np.cumsum(valid, axis=0)])
+    
+    window_sum = sums[window:] - sums[:-window]
+    window_var = (squares[window:] - squares[:-window] - window_sum * window_sum / window) / (window - 1)
+    full = (counts[window:] - counts[:-window]) == window
+    mean[window - 1:] = np.where(full, window_sum / window + center, np.nan)
+    std[window - 1:] = np.where(full, np.sqrt(np.maximum(window_var, 0.0)), np.nan)
+    return mean, std
+
+
+def pack_valid_rows(values: np.ndarray) -> tuple[np.ndarray, tuple]:
+    """把每列的有效值按原顺序压紧到矩阵底部，前面用NaN补齐
+    
+    外连接对齐后，某个代码缺少的时间点在其他列上表现为NaN；压紧后每列的滑动窗口只包含
+    该列的有效行，与按列单独去掉缺失行后再计算rolling的结果相同。
+    
+    Returns:
+        (压紧后的矩阵, 供unpack_valid_rows使用的位置索引)
+    """
+    valid = ~np.isnan(values)
+    counts = valid.sum(axis=0)
+    length = int(counts.max()) if values.size else 0
+    rows, cols = np.nonzero(valid)
+    dest = (np.cumsum(valid, axis=0) - 1 + (length - counts)[None, :])[rows, cols]
+    packed = np.full((length, values.shape[1]), np.nan)
+    packed[dest, cols] = values[rows, cols]
+    return packed, (rows, cols, dest)
+
+
+def unpack_valid_rows(packed: np.ndarray, positions: tuple, shape: tuple) -> np.ndarray:
+    """把压紧矩阵上的计算结果放回原来的行，其余位置为NaN"""
+    rows, cols, dest = positions
+    values = np.full(shape, np.nan)
+    values[rows, cols] = packed[dest, cols]
+    return values
+
+
+def compute_basis_matrix(closes: pd.DataFrame, contracts: List[str],
+                         expiries: Dict[str, Optional[datetime.date]]) -> Dict[str, Any]:
+    """对所有合约一次性计算基差和技术指标
+    
+    所有期货和现货收盘价已按时间对齐为一个矩阵（行为时间，列为代码），期货列和对应的
+    现货列相减得到基差矩阵。每列只保留期现货都有收盘价的行并压紧（见pack_valid_rows），
+    均值和标准差由累加和一次算出所有合约（见rolling_mean_std），分位数按窗口内偏移逐次比较计数，
+    临时内存都只与矩阵大小成正比。结果与每个合约单独按时间内连接期现货后做pandas rolling
+    （min_periods为窗口长度）相同。
+    
+    每次运行都对全部历史重新计算，不再像compute_basis_indicators那样持久化滚动状态：
+    十几个合约、几千根日K线的全量计算只需几十毫秒，而交割月合约每月滚动，逐列维护
+    增量状态的收益抵不上保持其与K线存储一致的成本。
+    
+    Args:
+        closes: 以时间为索引、代码为列的收盘价DataFrame
+        contracts: 期货合约代码列表，对应的现货代码由品种决定
+        expiries: 合约代码 → 最后交易日，连续合约为None
+        
+    Returns:
+        {'time': 时间索引, 'contracts': 合约列表, 各指标名: 行为时间、列为合约的矩阵}，
+        指标包括close_fut、close_spot、basis、ma60、mid、std、upper、lower、basis_rate
+        （年化基差率，%）以及各窗口的zscore_{n}和pct_rank_{n}
+    """
+    ma60_window = TECHNICAL_INDICATORS['MA60_WINDOW']
+    bollinger_window = TECHNICAL_INDICATORS['BOLLINGER_WINDOW']
+    std_multiplier = TECHNICAL_INDICATORS['STD_MULTIPLIER']
+    products = BASIS_CONFIG['products']
+    
+    matrix = closes.to_numpy(dtype='float64')
+    columns = {code: i for i, code in enumerate(closes.columns)}
+    close_fut = matrix[:, [columns[code] for code in contracts]]
+    close_spot = matrix[:, [columns[products[code[:2]]['spot_code']] for code in contracts]]
+    basis = close_fut - close_spot
+    packed, positions = pack_valid_rows(basis)
+    rows = len(packed)
+    
+    windows = sorted({ma60_window, bollinger_window, *BASIS_CONFIG['zscore_windows'], *BASIS_CONFIG['percentile_windows']})
+    means, stds = {}, {}
+    for window in windows:
+        means[window], stds[window] = rolling_mean_std(packed, window)
+    
+    def unpack(values: np.ndarray) -> np.ndarray:
+        return unpack_valid_rows(values, positions, basis.shape)
+    
+    result = {
+        'time': closes.index,
+        'contracts': list(contracts),
+        'close_fut': close_fut,
+        'close_spot': close_spot,
+        'basis': basis,
+        'ma60': unpack(means[ma60_window]),
+        'mid': unpack(means[bollinger_window]),
+        'std': unpack(stds[bollinger_window]),
+        'upper': unpack(means[bollinger_window] + std_multiplier * stds[bollinger_window]),
+        'lower': unpack(means[bollinger_window] - std_multiplier * stds[bollinger_window])
+    }
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for window in BASIS_CONFIG['zscore_windows']:
+            result[f"zscore_{window}"] = unpack((packed - means[window]) / stds[window])
+        
+        # 分位数：窗口内不大于当前值的比例（%），窗口内有缺失值时为NaN
+        for window in BASIS_CONFIG['percentile_windows']:
+            if rows < window:
+                result[f"pct_rank_{window}"] = np.full(basis.shape, np.nan)
+                continue
+            current = packed[window - 1:]
+            counts = np.zeros(current.shape, dtype=np.int32)
+            for offset in range(window):
+                counts += packed[offset:offset + len(current)] <= current
+            rank = counts * (100 / window)
+            rank[np.isnan(means[window][window - 1:])] = np.nan
+            result[f"pct_rank_{window}"] = unpack(pad_rolling(rank, window, rows))
+        
+        # 年化基差率：基差/现货 × 365/剩余自然日，只对有到期日的交割月合约计算
+        expiry = np.array([np.datetime64(expiries.get(code) or 'NaT', 'D') for code in contracts])
+        days = (expiry[None, :] - closes.index.to_numpy().astype('datetime64[D]')[:, None]).astype('float64')
+        days[days <= 0] = np.nan
+        result['basis_rate'] = basis / close_spot * 365 / days * 100
+    
+    return result
+
+
+def remove_daily_basis_state() -> None:
+    """一次性删除日线基差改由基差矩阵计算前持久化的滚动状态和指标文件，完成后记入构建状态
+    
+    分时基差仍使用compute_basis_indicators，其状态键以分钟周期结尾（如IF0_000300_1min），予以保留。
+    """
+    if load_build_state().get('daily_basis_state_removed'):
+        return
+    for filepath in glob.glob(get_cache_path('basis_*.state.json')) + glob.glob(get_cache_path('basis_*.parquet')):
+        state_key = os.path.basename(filepath)[len('basis_'):].split('.')[0]
+        if not state_key.endswith('min'):
+            try:
+                os.remove(filepath)
+            except OSError as e:
+                print(f"删除过期的基差状态文件{filepath}失败：{e}")
+                return
+    mark_artifact_built('daily_basis_state_removed', 'done')
+
+
+def get_basis_engine() -> Optional[Dict[str, Any]]:
+    """获取全部合约的基差矩阵，同一次运行内只计算一次
+    
+    由有界线程池并发增量获取全部期货和现货K线，按时间外连接对齐后交给
+    compute_basis_matrix。获取失败的合约会被跳过。
+    
+    Returns:
+        compute_basis_matrix的结果，没有任何可用合约时返回None
+    """
+    global _basis_engine
+    with get_cache_lock('basis_engine'):
+        if _basis_engine is not None:
+            return _basis_engine or None
+        
+        try:
+            contracts = [code for code in get_basis_contracts() if code[:2] in BASIS_CONFIG['products']]
+            spot_codes = list(dict.fromkeys(BASIS_CONFIG['products'][code[:2]]['spot_code'] for code in contracts))
+            codes = [(code, True) for code in contracts] + [(code, False) for code in spot_codes]
+            
+            with ThreadPoolExecutor(max_workers=BASIS_CONFIG['max_workers']) as executor:
+                klines = dict(zip(
+                    [code for code, _ in codes],
+                    executor.map(lambda item: get_baidu_kline_history(*item), codes)
+                ))
+            
+            series = {code: df.set_index('time')['close'] for code, df in klines.items() if df is not None and not df.empty}
+            missing = [code for code in klines if code not in series]
+            if missing:
+                print(f"以下代码K线获取失败，不参与基差计算：{', '.join(missing)}")
+            contracts = [
+                code for code in contracts
+                if code in series and BASIS_CONFIG['products'][code[:2]]['spot_code'] in series
+            ]
+            if not contracts:
+                _basis_engine = {}
+                return None
+            
+            closes = pd.concat(series, axis=1).sort_index()
+            calendar = get_trade_calendar()
+            expiries = {code: get_contract_expiry(code, calendar) for code in contracts}
+            with metric_span('basis.matrix', contracts=len(contracts), rows=len(closes)):
+                _basis_engine = compute_basis_matrix(closes, contracts, expiries)
+            _basis_engine['expiries'] = expiries
+            remove_daily_basis_state()
+            profile_checkpoint('basis')
+            return _basis_engine
+        except Exception as e:
+            print(f"计算基差矩阵时出错: {e}")
+            _basis_engine = {}
+            return None
+
+
+def get_contract_basis_frame(engine: Dict[str, Any], code: str) -> pd.DataFrame:
+    """从基差矩阵中取出单个合约的基差DataFrame，只保留期现货都有收盘价的行"""
+    column = engine['contracts'].index(code)
+    df = pd.DataFrame({'time': engine['time']})
+    for name, values in engine.items():
+        if isinstance(values, np.ndarray) and values.ndim == 2:
+            df[name] = values[:, column]
+    return df[df['basis'].notna()].reset_index(drop=True)
+
+
+def summarize_basis_engine(engine: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """生成各合约最新一行基差指标的概览，供页面表格显示"""
+    if not engine:
+        return []
+    
+    def clean(value: float, digits: int = 2) -> Optional[float]:
+        return None if value is None or np.isnan(value) else round(float(value), digits)
+    
+    overview = []
+    for code in engine['contracts']:
+        df = get_contract_basis_frame(engine, code)
+        if df.empty:
+            continue
+        row = df.iloc[-1]
+        expiry = engine['expiries'].get(code)
+        overview.append({
+            'contract': code,
+            'name': BASIS_CONFIG['products'][code[:2]]['name'],
+            'date': row['time'].strftime('%Y-%m-%d'),
+            'expiry': expiry.isoformat() if expiry else None,
+            'basis': clean(row['basis']),
+            'basis_rate': clean(row['basis_rate']),
+            'zscores': [(window, clean(row[f"zscore_{window}"])) for window in BASIS_CONFIG['zscore_windows']],
+            'pct_ranks': [(window, clean(row[f"pct_rank_{window}"], 1)) for window in BASIS_CONFIG['percentile_windows']]
+        })
+    return overview
+
+
+def get_index_futures_data(future_code: str, index_name: str) -> Optional[pd.DataFrame]:
+    """从基差矩阵中获取单个期货合约的基差和技术指标
+    
+    K线获取失败、基差矩阵中没有该合约时改为读取本地存档中此前各次运行写入的基差历史。
+    
+    Args:
+        future_code: 期货代码
+        index_name: 指数名称
+        
+    Returns:
+        包含基差和技术指标的DataFrame
+    """
+    try:
+        engine = get_basis_engine()
+        if engine is None or future_code not in engine['contracts']:
+            return query_archived_basis(future_code)
+        df_basis = get_contract_basis_frame(engine, future_code)
+        profile_checkpoint(f"basis:{future_code}")
+        return df_basis
+    except Exception as e:
+        print(f"获取{index_name}数据时出错: {e}")
+        return None
+
+
+def render_chart_html(fig: go.Figure, chart_name: str) -> str:
+    """将图表转换为可嵌入页面的HTML
+    
+    inline模式直接输出plotly的HTML片段；lazy模式把图表数据写入单独的JSON文件，
+    只返回一个占位元素，由页面在图表滚动进入可视区域时加载数据并绘制。
+    
+    Args:
+        fig: plotly图表
+        chart_name: 图表名称，用作数据文件名
+        
+    Returns:
+        HTML字符串
+    """
+    if CHART_CONFIG['export_mode'] != 'lazy':
+        import plotly.io as pio
+        pio.json.config.default_engine = get_json_engine()
+        return fig.to_html(
+            include_plotlyjs=CHART_CONFIG['include_plotlyjs'],
+            full_html=CHART_CONFIG['full_html']
+        )
+    
+    chart_json = fig.to_json(engine=get_json_engine())
+    os.makedirs(FILE_PATHS['chart_data_dir'], exist_ok=True)
+    data_file = os.path.join(FILE_PATHS['chart_data_dir'], f"{chart_name}.json")
+    with open(data_file, 'w', encoding='utf-8') as f:
+        f.write(chart_json)
+    
+    version = hashlib.sha1(chart_json.encode('utf-8')).hexdigest()[:10]
+    from plotly.offline import get_plotlyjs_version
+    plotly_url = f"https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"
+    height = fig.layout.height or CHART_CONFIG['height']
+    return (
+        f'<div class="lazy-chart" data-src="{data_file}?v={version}" data-plotly="{plotly_url}" '
+        f'style="min-height: {height}px;"></div>'
+    )
+
+
+def minmax_bucket_indices(values: np.ndarray, n_buckets: int) -> np.ndarray:
+    """将序列等分为n_buckets个桶，返回每个桶内最小值和最大值的位置
+    
+    Args:
+        values: 数值序列，NaN不会被选为极值
+        n_buckets: 桶数量
+        
+    Returns:
+        升序排列、去重后的位置数组（总包含第一个点）
+    """
+    n = len(values)
+    size = -(-n // n_buckets)
+    padded = np.full(size * n_buckets, np.nan)
+    padded[:n] = values
+    padded = padded.reshape(n_buckets, size)
+    
+    offsets = np.arange(n_buckets) * size
+    lows = np.where(np.isnan(padded), np.inf, padded).argmin(axis=1) + offsets
+    highs = np.where(np.isnan(padded), -np.inf, padded).argmax(axis=1) + offsets
+    
+    indices = np.unique(np.concatenate([[0], lows, highs]))
+    return indices[indices < n]
+
+
+def downsample_basis(df_basis: pd.DataFrame) -> pd.DataFrame:
+    """为绘图对基差数据降采样
+    
+    总点数以图表宽度（每像素一个点）为上限：最近full_resolution_points根K线完整保留，
+    更早的历史按像素桶保留基差的最小值和最大值点。所有列按同一组行选取，
+    各条曲线仍共享同一组时间点。
+    
+    Args:
+        df_basis: 基差数据DataFrame
+        
+    Returns:
+        降采样后的DataFrame，数据量未超过上限时原样返回
+    """
+    max_points = CHART_CONFIG['width']
+    recent = CHART_CONFIG['full_resolution_points']
+    n = len(df_basis)
+    if n <= max_points:
+        return df_basis
+    
+    history = n - recent
+    n_buckets = max(1, (max_points - recent) // 2)
+    indices = minmax_bucket_indices(df_basis['basis'].to_numpy(dtype=float)[:history], n_buckets)
+    indices = np.concatenate([indices, np.arange(history, n)])
+    return df_basis.iloc[indices].reset_index(drop=True)
+
+
+def get_json_engine() -> str:
+    """获取plotly的JSON序列化引擎：配置为orjson且已安装时使用orjson，否则使用标准库json"""
+    global _json_engine
+    if _json_engine is None:
+        engine = CHART_CONFIG['json_engine']
+        if engine == 'orjson' and importlib.util.find_spec('orjson') is None:
+            engine = 'json'
+        _json_engine = engine
+    return _json_engine
+
+
+def init_render_worker() -> None:
+    """渲染进程初始化：预先导入plotly，使第一张图表不用承担导入耗时"""
+    import plotly.graph_objects
+    get_json_engine()
+
+
+def enable_render_pool() -> None:
+    """允许本次运行使用图表渲染进程池
+    
+    CPU核数不超过1或处于--profile模式时不启用，图表在当前进程内渲染，
+    profile结果才能包含图表的CPU和内存开销。
+    """
+    global _render_workers
+    workers = CHART_CONFIG['render_workers'] or os.cpu_count() or 1
+    _render_workers = workers if workers > 1 and _profiler is None else 0
+
+
+def get_render_pool() -> Optional[ProcessPoolExecutor]:
+    """获取图表渲染进程池，第一次有图表需要重建时才启动，全部图表复用上次结果时不启动"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None and _render_workers:
+            # 使用spawn而不是fork：此时已有获取数据的线程在运行，fork出的子进程可能继承被占用的锁
+            _render_pool = ProcessPoolExecutor(
+                max_workers=_render_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_render_worker
+            )
+        return _render_pool
+
+
+def shutdown_render_pool() -> None:
+    """关闭图表渲染进程池，之后的图表回到当前进程内渲染"""
+    global _render_pool, _render_workers
+    with _render_pool_lock:
+        if _render_pool is not None:
+            _render_pool.shutdown(cancel_futures=True)
+        _render_pool = None
+        _render_workers = 0
+
+
+def render_chart_job(kind: str, chart_name: str, arrays: tuple, params: Dict[str, Any]) -> str:
+    """构建并序列化一张图表，在渲染进程或当前进程中执行
+    
+    Args:
+        kind: 图表类型，对应CHART_PLOTTERS中的绘图函数
+        chart_name: 图表名称，用作数据文件名
+        arrays: 传给绘图函数的numpy数组
+        params: 传给绘图函数的其他参数
+        
+    Returns:
+        图表HTML
+    """
+    fig = CHART_PLOTTERS[kind](*arrays, **params)
+    return render_chart_html(fig, chart_name)
+
+
+def render_chart(kind: str, chart_name: str, arrays: tuple, params: Dict[str, Any]) -> str:
+    """渲染一张图表：渲染进程池已启动时交给进程池，否则在当前进程内渲染
+    
+    各获取任务在自己的线程中调用，等待结果期间不占用GIL，多张图表在多个进程中并行构建。
+    进程池异常退出时回退到当前进程内渲染。
+    """
+    pool = get_render_pool()
+    if pool is not None:
+        try:
+            return pool.submit(render_chart_job, kind, chart_name, arrays, params).result()
+        except BrokenProcessPool as e:
+            print(f"渲染进程异常退出，改为在当前进程内渲染{chart_name}：{e}")
+    return render_chart_job(kind, chart_name, arrays, params)
+
+
+def create_basis_chart(df_basis: pd.DataFrame, index_name: str, output_file: str,
+                       intraday: bool = False) -> str:
+    """创建基差交互式图表
+    
+    在当前进程内降采样并取出绘图所需的列，图表的构建和序列化交给render_chart。
+    
+    Args:
+        df_basis: 基差数据DataFrame
+        index_name: 指数名称
+        output_file: 输出文件路径
+        intraday: 是否为分钟级基差，决定均线名称和时间范围按钮
+        
+    Returns:
+        图表HTML内容，创建失败时返回空字符串
     """
     try:
         if df_basis is None or len(df_basis) < 20:
-            return False
-        
-        fig = go.Figure()
-        
-        fig.update_layout(
-            title=f'{index_name}股指期货基差分析 (含MA60及布林带)',
-            xaxis_title='时间',
-            yaxis_title='基差',
-            width=CHART_CONFIG['width'],
-            height=CHART_CONFIG['height'],
-            template=CHART_CONFIG['template'],
-            hovermode='x unified'
+            return ""
+        
+        df_basis = downsample_basis(df_basis)
+        # 时间轴以毫秒时间戳数值传入，plotly会以二进制数组编码，比日期字符串小得多
+        x_values = df_basis['time'].to_numpy().astype('datetime64[ms]').astype('int64').astype('float64')
+        series = df_basis[['basis', 'ma60', 'mid', 'upper', 'lower']].to_numpy(dtype='float64').T.copy()
+        
+        chart_html = render_chart(
+            'basis', os.path.splitext(os.path.basename(output_file))[0],
+            (x_values, series), {'index_name': index_name, 'intraday': intraday}
         )
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(chart_html)
+        
+        return chart_html
+    except Exception as e:
+        print(f"创建{index_name}图表时出错: {e}")
+        return ""
+
+
+def plot_basis_chart(x_values: np.ndarray, series: np.ndarray, index_name: str, intraday: bool) -> go.Figure:
+    """绘制基差图表
+    
+    Args:
+        x_values: 毫秒时间戳
+        series: 按行依次为基差、MA60、布林带中轨、上轨、下轨的二维数组
+        index_name: 指数名称
+        intraday: 是否为分钟级基差
+        
+    Returns:
+        plotly图表
+    """
+    basis, ma60, mid, upper, lower = series
+    
+    if intraday:
+        title = f'{index_name}股指期货分时基差分析 (含MA60及布林带)'
+        ma60_name = '基差 60周期均线'
+        hover_format = '%Y-%m-%d %H:%M'
+        range_buttons = [
+            dict(count=1, label="1小时", step="hour", stepmode="backward"),
+            dict(count=1, label="1天", step="day", stepmode="backward"),
+            dict(count=5, label="5天", step="day", stepmode="backward"),
+            dict(step="all")
+        ]
+    else:
+        title = f'{index_name}股指期货基差分析 (含MA60及布林带)'
+        ma60_name = '基差 60日均线'
+        hover_format = '%Y-%m-%d'
+        range_buttons = [
+            dict(count=1, label="1月", step="month", stepmode="backward"),
+            dict(count=3, label="3月", step="month", stepmode="backward"),
+            dict(count=6, label="6月", step="month", stepmode="backward"),
+            dict(count=1, label="1年", step="year", stepmode="backward"),
+            dict(step="all")
+        ]
+    
+    fig = go.Figure()
+    
+    fig.update_layout(
+        title=title,
+        xaxis_title='时间',
+        yaxis_title='基差',
+        width=CHART_CONFIG['width'],
+        height=CHART_CONFIG['height'],
+        template=CHART_CONFIG['template'],
+        hovermode='x unified'
+    )
+    
+    fig.add_trace(go.Scatter(
+        x=x_values,
+        y=basis,
+        name=f'{index_name}基差',
+        line=dict(color='#5386E4', width=1.5),
+        opacity=0.9
+    ))
+    
+    fig.add_trace(go.Scatter(
+        x=x_values,
+        y=ma60,
+        name=ma60_name,
+        line=dict(color='#F49E4C', width=2, dash='solid'),
+        opacity=0.8
+    ))
+    
+    fig.add_trace(go.Scatter(
+        x=x_values,
+        y=mid,
+        name='布林带中轨',
+        line=dict(color='#7FB069', width=1, dash='dash'),
+        opacity=0.6
+    ))
+    
+    fig.add_trace(go.Scatter(
+        x=x_values,
+        y=upper,
+        name='布林带上轨',
+        line=dict(color='#7FB069', width=1, dash='dash'),
+        opacity=0.6,
+        fill=None
+    ))
+    
+    fig.add_trace(go.Scatter(
+        x=x_values,
+        y=lower,
+        name='布林带下轨',
+        line=dict(color='#d0001f', width=1, dash='dash'),
+        opacity=0.6,
+        fill='tonexty',
+        fillcolor='rgba(127, 176, 105, 0.1)'
+    ))
+    
+    fig.add_hline(
+        y=0,
+        line=dict(color='black', width=1, dash='solid'),
+        name='基差=0线'
+    )
+    
+    fig.update_xaxes(
+        type='date',
+        hoverformat=hover_format,
+        rangeslider_visible=True,
+        rangeselector=dict(buttons=range_buttons)
+    )
+    
+    return fig
+
+
+def read_chart_html(chart_file: str) -> str:
+    """读取图表HTML文件
+    
+    Args:
+        chart_file: 图表文件路径
+        
+    Returns:
+        HTML内容字符串
+    """
+    try:
+        if os.path.exists(chart_file):
+            with open(chart_file, 'r', encoding='utf-8') as f:
+                return f.read()
+    except Exception as e:
+        print(f"读取{chart_file}时出错: {e}")
+    return ""
+
+
+def process_index_futures(futures_key: str) -> tuple[bool, str]:
+    """处理指数期货数据并创建图表
+    
+    Args:
+        futures_key: 期货配置键名
+        
+    Returns:
+        (是否成功, 图表HTML内容)
+    """
+    config = FUTURES_CONFIG[futures_key]
+    has_chart = False
+    chart_html = ""
+    
+    try:
+        print(f"正在获取{config['name']}基差数据...")
+        df_basis = get_index_futures_data(config['future_code'], config['name'])
+        
+        if df_basis is not None:
+            print(f"正在创建{config['name']}基差图表...")
+            chart_name = os.path.splitext(os.path.basename(config['chart_file']))[0]
+            fp = fingerprint(df_basis, config, CHART_CONFIG, TECHNICAL_INDICATORS)
+            chart_html = build_chart_artifact(
+                chart_name, fp,
+                lambda: create_basis_chart(df_basis, config['name'], config['chart_file'])
+            )
+            profile_checkpoint(f"chart:{futures_key}")
+            has_chart = bool(chart_html)
+            
+            if has_chart:
+                print(f"{config['name']}基差图表创建成功！")
+            else:
+                print(f"{config['name']}基差图表创建失败！")
+        else:
+            print(f"未能获取{config['name']}数据！")
+    except Exception as e:
+        print(f"处理{config['name']}数据时出错: {e}")
+        has_chart = False
+    
+    # 如果没有获取到新数据，但是之前已经生成了图表文件，那么使用之前的图表文件
+    if not has_chart and not chart_html:
+        chart_html = read_chart_html(config['chart_file'])
+        if chart_html:
+            print(f"使用之前生成的{config['name']}基差图表文件！")
+            has_chart = True
+    
+    return has_chart, chart_html
+
+
+def process_intraday_basis(futures_key: str) -> Dict[str, Any]:
+    """处理指数期货分时基差数据并创建图表
+    
+    Args:
+        futures_key: 期货配置键名
+        
+    Returns:
+        {'name': 指数名称, 'html': 图表HTML内容}，失败时html为空字符串
+    """
+    config = FUTURES_CONFIG[futures_key]
+    chart_html = ""
+    
+    try:
+        print(f"正在获取{config['name']}分时基差数据...")
+        df_basis = get_intraday_basis_data(config['spot_code'], config['intraday_future_code'], config['name'])
+        
+        if df_basis is not None:
+            chart_name = os.path.splitext(os.path.basename(config['intraday_chart_file']))[0]
+            fp = fingerprint(df_basis, config, CHART_CONFIG, TECHNICAL_INDICATORS, INTRADAY_CONFIG)
+            chart_html = build_chart_artifact(
+                chart_name, fp,
+                lambda: create_basis_chart(df_basis, config['name'], config['intraday_chart_file'], intraday=True)
+            )
+        
+        if chart_html:
+            print(f"{config['name']}分时基差图表创建成功！")
+        else:
+            print(f"{config['name']}分时基差图表创建失败！")
+    except Exception as e:
+        print(f"处理{config['name']}分时数据时出错: {e}")
+    
+    return {'name': config['name'], 'html': chart_html}
+
+
+def get_latest_strategy_png() -> Optional[str]:
+    """获取最新的红利ETF策略PNG图片
+    
+    Returns:
+        最新的PNG文件路径
+    """
+    try:
+        png_files = glob.glob(FILE_PATHS['strategy_png_pattern'])
+        png_files.sort(key=os.path.getmtime, reverse=True)
+        return png_files[0] if png_files else None
+    except Exception as e:
+        print(f"查找策略图片时出错: {e}")
+        return None
+
+
+def read_strategy_fragment() -> str:
+    """读取策略HTML片段
+    
+    Returns:
+        HTML片段内容
+    """
+    try:
+        if os.path.exists(FILE_PATHS['strategy_fragment']):
+            with open(FILE_PATHS['strategy_fragment'], 'r', encoding='utf-8') as f:
+                return f.read()
+    except Exception as e:
+        print(f"读取策略片段时出错: {e}")
+    return ""
+
+
+def get_page_template() -> jinja2.Template:
+    """获取页面模板
+    
+    模板环境在进程内只创建一次，编译后的字节码缓存在缓存目录中，
+    模板文件未修改时后续运行无需重新编译。
+    """
+    global _template_env
+    with _template_env_lock:
+        if _template_env is None:
+            bytecode_dir = get_cache_path(CACHE_CONFIG['template_cache_dir'])
+            os.makedirs(bytecode_dir, exist_ok=True)
+            _template_env = jinja2.Environment(
+                loader=jinja2.FileSystemLoader(searchpath=FILE_PATHS['template_dir']),
+                bytecode_cache=jinja2.FileSystemBytecodeCache(bytecode_dir)
+            )
+        return _template_env.get_template(os.path.basename(FILE_PATHS['template_file']))
+
+
+def get_template_variables(date: str, stock_data: Dict, **context: Any) -> Dict[str, Any]:
+    """将render_html_to_file的参数转换为模板变量"""
+    return {'date': date, 'stock': stock_data, **context}
+
+
+def write_atomic(filepath: str, chunks: Iterable[Any], binary: bool = False) -> None:
+    """将文本块（binary为True时为bytes块）依次写入同目录的临时文件，完成后原子替换目标文件"""
+    directory = os.path.dirname(os.path.abspath(filepath))
+    fd, tmp_file = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(filepath)}.", suffix='.tmp')
+    try:
+        with (os.fdopen(fd, 'wb') if binary else os.fdopen(fd, 'w', encoding='utf-8')) as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.chmod(tmp_file, 0o644)
+        os.replace(tmp_file, filepath)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+
+def render_html_to_file(filepath: str, date: str, stock_data: Dict,
+                        published: Optional[List[str]] = None, **context: Any) -> bool:
+    """流式渲染HTML页面并原子替换目标文件
+    
+    模板按块生成并直接写入同目录下的临时文件，完成后重命名覆盖目标文件，
+    不在内存中拼接整页字符串，读取方也不会看到写了一半的页面。
+    
+    Args:
+        filepath: 输出文件路径
+        date: 日期
+        stock_data: 股票数据
+        published: 传入时在同一遍写出中抽出页面的共享资源（见extract_page_assets），
+            发布的资源路径追加到其中
+        context: 其余模板参数：
+            indices: 指数数据列表
+            has_hs300_chart: 是否有沪深300图表
+            hs300_chart_html: 沪深300图表HTML
+            has_zz1000_chart: 是否有中证1000图表
+            zz1000_chart_html: 中证1000图表HTML
+            latest_png: 最新策略图片路径
+            strategy_html: 策略HTML片段
+            hot_concepts: 热点概念数据
+            stocks_by_concept: 按概念分组的个股数据
+            recent_trading_data: 最近交易日数据
+            stock_kline_html: 股票日K线图HTML
+            intraday_charts: 分时基差图表列表
+            watchlist: 自选股行情和K线图列表
+            basis_overview: 各合约最新基差指标概览
+            stock_trail: 股票当天各次运行的行情快照
+            run_metrics: 本次运行的耗时汇总，见get_timing_summary
+        
+    Returns:
+        是否成功保存
+    """
+    try:
+        template = get_page_template()
+        chunks = template.generate(get_template_variables(date, stock_data, **context))
+        if published is not None:
+            chunks = extract_page_assets(chunks, published)
+        write_atomic(filepath, chunks)
+        return True
+    except Exception as e:
+        print(f"渲染HTML文件{filepath}时出错: {e}")
+        return False
+
+
+def save_json(data: Dict, filepath: str) -> bool:
+    """保存JSON数据
+    
+    Args:
+        data: 要保存的数据
+        filepath: 文件路径
+        
+    Returns:
+        是否成功保存
+    """
+    try:
+        write_atomic(filepath, [json.dumps(data, ensure_ascii=False)])
+        return True
+    except Exception as e:
+        print(f"保存JSON文件{filepath}时出错: {e}")
+        return False
+
+
+def get_hot_concepts() -> Optional[Dict[str, Any]]:
+    """获取热点概念数据
+    
+    Returns:
+        热点概念分析数据，如果文件不存在则返回None
+    """
+    try:
+        if os.path.exists(FILE_PATHS['hot_concepts_json']):
+            with open(FILE_PATHS['hot_concepts_json'], 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return None
+    except Exception as e:
+        print(f"读取热点概念数据失败: {e}")
+        return None
+
+
+def build_concept_index(data: Dict[str, Any]) -> Dict[str, Any]:
+    """由热门个股数据构建概念倒排索引
+    
+    Args:
+        data: all_hot_stocks.json的内容，各榜单为个股列表
         
-        fig.add_trace(go.Scatter(
-            x=df_basis['time'],
-            y=df_basis['basis'],
-            name=f'{index_name}基差',
-            line=dict(color='#5386E4', width=1.5),
-            opacity=0.9
-        ))
+    Returns:
+        包含 概念→股票代码列表、代码→个股记录、代码→概念列表、各概念股票数
+        以及按股票数降序排列的概念列表的索引字典
+    """
+    total_stocks = 0
+    records: Dict[str, Dict[str, Any]] = {}
+    concept_codes: Dict[str, List[str]] = {}
+    code_concepts: Dict[str, List[str]] = {}
+    seen = set()
+    
+    for stocks_list in data.values():
+        if not isinstance(stocks_list, list):
+            continue
+        total_stocks += len(stocks_list)
+        for stock in stocks_list:
+            code = stock['code']
+            records.setdefault(code, stock)
+            for concept in (stock.get('concept') or '').split():
+                # 只添加唯一的股票（根据代码）
+                if (concept, code) in seen:
+                    continue
+                seen.add((concept, code))
+                concept_codes.setdefault(concept, []).append(code)
+                code_concepts.setdefault(code, []).append(concept)
+    
+    concept_counts = {concept: len(codes) for concept, codes in concept_codes.items()}
+    return {
+        'total_stocks': total_stocks,
+        'records': records,
+        'concept_codes': concept_codes,
+        'code_concepts': code_concepts,
+        'concept_counts': concept_counts,
+        'sorted_concepts': sorted(concept_codes, key=lambda c: concept_counts[c], reverse=True)
+    }
+
+
+def get_concept_index(data_file: str) -> Optional[Dict[str, Any]]:
+    """获取热门个股数据文件的概念索引
+    
+    索引保存在缓存目录（<数据文件名>.index.json），以数据文件内容的哈希为键：内容未变化时
+    直接读取，否则重新构建并保存。检出仓库会改变文件的修改时间，因此不按修改时间判断。
+    
+    Args:
+        data_file: 热门个股数据文件路径
         
-        fig.add_trace(go.Scatter(
-            x=df_basis['time'],
-            y=df_basis['ma60'],
-            name='基差 60日均线',
-            line=dict(color='#F49E4C', width=2, dash='solid'),
-            opacity=0.8
-        ))
+    Returns:
+        概念索引，数据文件不存在时返回None
+    """
+    if not os.path.exists(data_file):
+        return None
+    
+    content = read_file_bytes(data_file)
+    source = {'sha1': hashlib.sha1(content).hexdigest()}
+    index_file = get_cache_path(f"{os.path.splitext(os.path.basename(data_file))[0]}.index.json")
+    
+    try:
+        if os.path.exists(index_file):
+            with open(index_file, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('source') == source:
+                count_metric('concept_index.reused')
+                return index
+    except Exception as e:
+        print(f"读取概念索引失败：{e}")
+    
+    index = build_concept_index(json.loads(content))
+    index['source'] = source
+    
+    try:
+        write_atomic(index_file, [json.dumps(index, ensure_ascii=False)])
+    except Exception as e:
+        print(f"保存概念索引失败：{e}")
+    return index
+
+
+def get_top_concepts(index: Dict[str, Any], k: int) -> List[Dict[str, Any]]:
+    """获取股票数最多的前k个概念"""
+    return [
+        {'concept': concept, 'count': index['concept_counts'][concept]}
+        for concept in index['sorted_concepts'][:k]
+    ]
+
+
+def get_stocks_in_concepts(index: Dict[str, Any], concepts: List[str]) -> List[Dict[str, Any]]:
+    """获取同时属于所有给定概念的个股，按第一个概念中的顺序排列"""
+    if not concepts:
+        return []
+    common = set(index['concept_codes'].get(concepts[0], []))
+    for concept in concepts[1:]:
+        common &= set(index['concept_codes'].get(concept, []))
+    return [index['records'][code] for code in index['concept_codes'].get(concepts[0], []) if code in common]
+
+
+def get_stock_concepts(index: Dict[str, Any], code: str) -> List[str]:
+    """获取个股所属的概念列表"""
+    return index['code_concepts'].get(code, [])
+
+
+def get_stocks_by_concept() -> Optional[Dict[str, Any]]:
+    """获取按概念分组的个股数据
+    
+    Returns:
+        按概念分组的个股数据，如果文件不存在则返回None
+    """
+    try:
+        index = get_concept_index(FILE_PATHS['hot_stocks_json'])
+        if index is None:
+            return None
         
-        fig.add_trace(go.Scatter(
-            x=df_basis['time'],
-            y=df_basis['mid'],
-            name='布林带中轨',
-            line=dict(color='#7FB069', width=1, dash='dash'),
-            opacity=0.6
-        ))
+        records = index['records']
+        return {
+            'total_stocks': index['total_stocks'],
+            'total_concepts': len(index['sorted_concepts']),
+            'sorted_concepts': [
+                {'concept': concept, 'stocks': [records[code] for code in index['concept_codes'][concept]]}
+                for concept in index['sorted_concepts']
+            ]
+        }
+    except Exception as e:
+        print(f"读取个股数据失败: {e}")
+        return None
+
+
+def get_recent_trading_days_data(symbol: str, name: str, days: int = 20) -> Optional[List[Dict[str, Any]]]:
+    """获取最近N个交易日的数据
+    
+    Args:
+        symbol: 股票代码
+        name: 股票名称
+        days: 交易日天数
         
-        fig.add_trace(go.Scatter(
-            x=df_basis['time'],
-            y=df_basis['upper'],
-            name='布林带上轨',
-            line=dict(color='#7FB069', width=1, dash='dash'),
-            opacity=0.6,
-            fill=None
-        ))
+    Returns:
+        包含最近交易日数据的列表
+    """
+    try:
+        df = get_stock_history(symbol)
+        if df is None:
+            return None
+        # 获取最近N个交易日的数据
+        recent_data = []
         
-        fig.add_trace(go.Scatter(
-            x=df_basis['time'],
-            y=df_basis['lower'],
-            name='布林带下轨',
-            line=dict(color='#d0001f', width=1, dash='dash'),
-            opacity=0.6,
-            fill='tonexty',
-            fillcolor='rgba(127, 176, 105, 0.1)'
-        ))
+        # 确保有足够的数据
+        start_idx = max(0, len(df) - days)
         
-        fig.add_hline(
-            y=0,
-            line=dict(color='black', width=1, dash='solid'),
-            name='基差=0线'
-        )
+        for i in range(start_idx, len(df)):
+            row = df.iloc[i]
+            
+            # 尝试获取日期
+            if '日期' in df.columns:
+                date = row['日期']
+            elif 'date' in df.columns:
+                date = row['date']
+            else:
+                # 如果没有日期列，使用索引
+                date = str(row.name)
+            
+            # 计算涨跌幅
+            close = round(row['收盘'], 2)
+            open_price = round(row['开盘'], 2)
+            high = round(row['最高'], 2)
+            low = round(row['最低'], 2)
+            volume = int(row['成交量'])
+            amount = round(row['成交额'], 2)
+            
+            # 计算涨跌幅
+            change = round(close - open_price, 2)
+            change_pct = round((change / open_price) * 100, 2) if open_price != 0 else 0.0
+            
+            recent_data.append({
+                'date': date,
+                'open': open_price,
+                'high': high,
+                'low': low,
+                'close': close,
+                'change': change,
+                'change_pct': change_pct,
+                'volume': volume,
+                'amount': amount
+            })
         
-        fig.update_xaxes(
-            rangeslider_visible=True,
-            rangeselector=dict(
-                buttons=list([
-                    dict(count=1, label="1月", step="month", stepmode="backward"),
-                    dict(count=3, label="3月", step="month", stepmode="backward"),
-                    dict(count=6, label="6月", step="month", stepmode="backward"),
-                    dict(count=1, label="1年", step="year", stepmode="backward"),
-                    dict(step="all")
-                ])
-            )
-        )
+        return recent_data
+    except Exception as e:
+        print(f"获取{name}最近{days}个交易日数据失败: {e}")
+        return None
+
+
+def create_stock_kline_chart(symbol: str, name: str, days: int = 180,
+                             df: Optional[pd.DataFrame] = None) -> str:
+    """创建股票日k图
+    
+    Args:
+        symbol: 股票代码
+        name: 股票名称
+        days: 显示的交易日天数
+        df: 已加载的日线数据，为None时通过get_stock_history获取
         
-        fig.write_html(
-            output_file,
-            include_plotlyjs=CHART_CONFIG['include_plotlyjs'],
-            full_html=CHART_CONFIG['full_html']
-        )
+    Returns:
+        生成的HTML图表字符串
+    """
+    try:
+        if df is None:
+            df = get_stock_history(symbol)
+        if df is None:
+            return ""
         
-        return True
+        # 获取最近N个交易日的数据
+        start_idx = max(0, len(df) - days)
+        df_recent = df.iloc[start_idx:]
+        
+        chart_name = f"stock_kline_{symbol}"
+        fp = fingerprint(df_recent, symbol, name, days, CHART_CONFIG)
+        return build_chart_artifact(chart_name, fp, lambda: render_stock_kline_chart(df_recent, symbol, name))
     except Exception as e:
-        print(f"创建{index_name}图表时出错: {e}")
-        return False
+        print(f"创建{name}日K线图失败: {e}")
+        return ""
 
 
-def read_chart_html(chart_file: str) -> str:
-    """读取图表HTML文件
+def render_stock_kline_chart(df_recent: pd.DataFrame, symbol: str, name: str) -> str:
+    """取出日K线图所需的列，交给render_chart构建和序列化
     
     Args:
-        chart_file: 图表文件路径
+        df_recent: 最近N个交易日的日线数据
+        symbol: 股票代码
+        name: 股票名称
         
     Returns:
-        HTML内容字符串
+        生成的HTML图表字符串
     """
     try:
-        if os.path.exists(chart_file):
-            with open(chart_file, 'r', encoding='utf-8') as f:
-                return f.read()
+        dates = pd.to_datetime(df_recent['日期']).to_numpy().astype('datetime64[D]')
+        ohlc = df_recent[['开盘', '最高', '最低', '收盘']].to_numpy(dtype='float64').round(2).T.copy()
+        volumes = df_recent['成交量'].to_numpy(dtype='int64')
+        return render_chart('stock_kline', f"stock_kline_{symbol}", (dates, ohlc, volumes),
+                            {'symbol': symbol, 'name': name})
     except Exception as e:
-        print(f"读取{chart_file}时出错: {e}")
-    return ""
+        print(f"创建{name}日K线图失败: {e}")
+        return ""
 
 
-def process_index_futures(futures_key: str) -> tuple[bool, str]:
-    """处理指数期货数据并创建图表
+def plot_stock_kline_chart(dates: np.ndarray, ohlc: np.ndarray, volumes: np.ndarray,
+                           symbol: str, name: str) -> go.Figure:
+    """绘制股票日K线图
     
     Args:
-        futures_key: 期货配置键名
+        dates: 交易日期
+        ohlc: 按行依次为开盘、最高、最低、收盘价的二维数组
+        volumes: 成交量
+        symbol: 股票代码
+        name: 股票名称
         
     Returns:
-        (是否成功, 图表HTML内容)
+        plotly图表
     """
-    config = FUTURES_CONFIG[futures_key]
-    has_chart = False
-    chart_html = ""
+    dates = np.datetime_as_string(dates, unit='D')
+    opens, highs, lows, closes = ohlc
+    
+    # 创建K线图
+    fig = go.Figure(data=[go.Candlestick(
+        x=dates,
+        open=opens,
+        high=highs,
+        low=lows,
+        close=closes,
+        increasing_line_color='#27ae60',
+        decreasing_line_color='#e74c3c'
+    )])
+    
+    # 更新布局
+    fig.update_layout(
+        title=f'{name}({symbol}) 日K线图',
+        xaxis_title='日期',
+        yaxis_title='价格',
+        width=1000,
+        height=600,
+        template='plotly_white',
+        hovermode='x unified'
+    )
+    
+    # 添加成交量
+    fig.add_trace(go.Bar(
+        x=dates,
+        y=volumes,
+        name='成交量',
+        yaxis='y2',
+        marker_color=np.where(closes >= opens, '#27ae60', '#e74c3c'),
+        opacity=0.6
+    ))
+    
+    # 更新Y轴
+    fig.update_layout(
+        yaxis2=dict(
+            title='成交量',
+            overlaying='y',
+            side='right',
+            showgrid=False
+        )
+    )
+    
+    # 更新X轴
+    fig.update_xaxes(
+        rangeslider_visible=False,
+        rangeselector=dict(
+            buttons=list([
+                dict(count=30, label="30天", step="day", stepmode="backward"),
+                dict(count=60, label="60天", step="day", stepmode="backward"),
+                dict(count=90, label="90天", step="day", stepmode="backward"),
+                dict(count=180, label="180天", step="day", stepmode="backward"),
+                dict(step="all")
+            ])
+        )
+    )
     
+    return fig
+
+
+# 图表类型 → 绘图函数，渲染进程按名称查找，只需传递可序列化的数组和参数
+CHART_PLOTTERS = {
+    'basis': plot_basis_chart,
+    'stock_kline': plot_stock_kline_chart
+}
+
+
+def profile_checkpoint(label: str) -> None:
+    """剖析模式下在阶段边界记录一次内存快照，未开启剖析时什么也不做"""
+    if _profiler is None:
+        return
+    import tracemalloc
+    # 快照不在这里过滤：filter_traces逐条遍历，大量分配时比快照本身慢几个数量级
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    with _profiler_lock:
+        _profiler['checkpoints'].append({
+            'label': label,
+            'at': round(time.perf_counter() - _profiler['start'], 3),
+            'current': current,
+            'peak': peak,
+            'snapshot': snapshot
+        })
+
+
+def profile_call(func: Callable[..., Any], *args: Any) -> Any:
+    """剖析模式下用独立的cProfile剖析本线程中的调用，结果在运行结束后合并"""
+    if _profiler is None:
+        return func(*args)
+    import cProfile
+    profile = cProfile.Profile()
     try:
-        print(f"正在获取{config['name']}基差数据...")
-        df_basis = get_index_futures_data(config['spot_code'], config['future_code'], config['name'])
-        
-        if df_basis is not None:
-            print(f"正在创建{config['name']}基差图表...")
-            has_chart = create_basis_chart(df_basis, config['name'], config['chart_file'])
-            
-            if has_chart:
-                print(f"{config['name']}基差图表创建成功！")
-                chart_html = read_chart_html(config['chart_file'])
+        profile.enable()
+    except ValueError:
+        # Python 3.12起同一时间只能有一个剖析器，此时只剖析主线程
+        return func(*args)
+    try:
+        return func(*args)
+    finally:
+        profile.disable()
+        with _profiler_lock:
+            _profiler['profiles'].append(profile)
+
+
+def sample_stacks(stop: threading.Event, interval: float) -> None:
+    """按固定间隔采样所有线程的调用栈，累计为折叠栈计数"""
+    counts = _profiler['stacks']
+    labels = {}
+    own_id = threading.get_ident()
+    while not stop.wait(interval):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                if code not in labels:
+                    labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                stack.append(labels[code])
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)))
+            key = ';'.join(reversed(stack))
+            counts[key] = counts.get(key, 0) + 1
+
+
+def write_allocation_report(checkpoints: List[Dict[str, Any]], report_file: str) -> None:
+    """写出各阶段的内存占用和相对上一阶段新增最多的分配位置"""
+    import tracemalloc
+    top_n = PROFILE_CONFIG['top_allocations']
+    ignored = (tracemalloc.__file__, '<frozen importlib._bootstrap', '<unknown>')
+    previous = None
+    with open(report_file, 'w', encoding='utf-8') as f:
+        for checkpoint in sorted(checkpoints, key=lambda c: c['at']):
+            snapshot = checkpoint['snapshot']
+            f.write(f"== {checkpoint['label']} @ {checkpoint['at']:.3f}s  "
+                    f"current {checkpoint['current'] / 2 ** 20:.1f} MiB  peak {checkpoint['peak'] / 2 ** 20:.1f} MiB\n")
+            if previous is None:
+                f.write("-- 占用最多的分配位置\n")
+                stats = snapshot.statistics('lineno')
+                for stat in [s for s in stats if not s.traceback[0].filename.startswith(ignored)][:top_n]:
+                    f.write(f"{stat.size / 1024:10.1f} KiB  {stat.count:8d}  {stat.traceback}\n")
             else:
-                print(f"{config['name']}基差图表创建失败！")
+                f.write("-- 相对上一阶段新增最多的分配位置\n")
+                stats = snapshot.compare_to(previous, 'lineno')
+                for stat in [s for s in stats if not s.traceback[0].filename.startswith(ignored)][:top_n]:
+                    f.write(f"{stat.size_diff / 1024:+10.1f} KiB  {stat.count_diff:+8d}  {stat.traceback}\n")
+            f.write("\n")
+            previous = snapshot
+
+
+def run_profiled(func: Callable[[], bool], profile_dir: str) -> bool:
+    """在CPU和内存剖析下运行更新流程
+    
+    主线程和每个获取任务分别用cProfile剖析后合并为profile.pstats和cpu_top.txt；
+    后台线程采样所有线程的调用栈，写出可直接交给flamegraph.pl或speedscope的
+    折叠栈文件stacks.folded；各阶段边界的tracemalloc快照写出为allocations.txt。
+    页面和数据文件的输出与普通运行相同。
+    
+    Args:
+        func: 更新流程函数
+        profile_dir: 剖析结果目录，每次运行在其下新建一个时间戳子目录
+        
+    Returns:
+        更新流程的返回值
+    """
+    global _profiler
+    import cProfile
+    import pstats
+    import tracemalloc
+    
+    run_dir = os.path.join(profile_dir, datetime.datetime.now().strftime('%Y%m%d-%H%M%S'))
+    os.makedirs(run_dir, exist_ok=True)
+    
+    _profiler = {'start': time.perf_counter(), 'profiles': [], 'checkpoints': [], 'stacks': {}}
+    tracemalloc.start(PROFILE_CONFIG['traceback_frames'])
+    stop = threading.Event()
+    sampler = threading.Thread(target=sample_stacks, args=(stop, PROFILE_CONFIG['sample_interval']),
+                               name='profile-sampler', daemon=True)
+    sampler.start()
+    main_profile = cProfile.Profile()
+    main_profile.enable()
+    try:
+        return func()
+    finally:
+        main_profile.disable()
+        stop.set()
+        sampler.join()
+        tracemalloc.stop()
+        profiler, _profiler = _profiler, None
+        
+        stats = pstats.Stats(main_profile)
+        for profile in profiler['profiles']:
+            stats.add(profile)
+        stats.dump_stats(os.path.join(run_dir, 'profile.pstats'))
+        with open(os.path.join(run_dir, 'cpu_top.txt'), 'w', encoding='utf-8') as f:
+            stats.stream = f
+            stats.sort_stats('cumulative').print_stats(PROFILE_CONFIG['top_functions'])
+        
+        with open(os.path.join(run_dir, 'stacks.folded'), 'w', encoding='utf-8') as f:
+            for stack, count in sorted(profiler['stacks'].items()):
+                f.write(f"{stack} {count}\n")
+        
+        write_allocation_report(profiler['checkpoints'], os.path.join(run_dir, 'allocations.txt'))
+        print(f"剖析结果已保存到 {run_dir}")
+
+
+def get_watchlist_quotes() -> Dict[str, Dict[str, Any]]:
+    """从一次全市场行情快照中取出全部自选股的当前行情
+    
+    同一次运行内只请求一次快照，获取失败时返回空字典，由调用方回退到历史数据。
+    
+    Returns:
+        股票代码 → 行情字典（name、symbol、price、prev_price、change、change_pct）
+    """
+    global _watchlist_quotes
+    with get_cache_lock('watchlist_quotes'):
+        if _watchlist_quotes is not None:
+            return _watchlist_quotes
+        
+        quotes = {}
+        try:
+            df = call_akshare('stock_zh_a_spot_em')
+            df = df[df['代码'].astype(str).isin(WATCHLIST_CONFIG['symbols'])]
+            # 停牌等没有最新价的股票不计入，回退到历史数据
+            df = df.dropna(subset=['最新价', '昨收'])
+            for row in df.to_dict('records'):
+                symbol = str(row['代码'])
+                quotes[symbol] = {
+                    'name': row['名称'],
+                    'symbol': symbol,
+                    'price': round(float(row['最新价']), 2),
+                    'prev_price': round(float(row['昨收']), 2),
+                    'change': round(float(row['涨跌额']), 2),
+                    'change_pct': round(float(row['涨跌幅']), 2)
+                }
+            print(f"从行情快照获取{len(quotes)}/{len(WATCHLIST_CONFIG['symbols'])}只自选股行情")
+        except Exception as e:
+            print(f"获取全市场行情快照失败：{e}")
+        
+        count_metric('watchlist.snapshot_quotes', len(quotes))
+        _watchlist_quotes = quotes
+        return quotes
+
+
+def load_watchlist_symbol(symbol: str, quote: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """刷新单只自选股的日线历史，生成行情卡片数据和日K线图
+    
+    日线历史在与get_stock_history相同的锁下从本地缓存增量加载，已在运行内缓存中的
+    （如主股票）直接复用；自选股本身不进入运行内缓存，只在内存中保留K线所需的最近几天。
+    
+    Args:
+        symbol: 股票代码
+        quote: 行情快照中的行情，为None时用历史数据的最后两个收盘价
+        
+    Returns:
+        行情字典加上kline_html，行情和历史数据都获取失败时返回None
+    """
+    name = quote['name'] if quote else symbol
+    days = WATCHLIST_CONFIG['kline_days']
+    with get_cache_lock(f"stock_hist:{symbol}"):
+        if symbol in _stock_history_cache:
+            df = _stock_history_cache[symbol]
         else:
-            print(f"未能获取{config['name']}数据！")
-    except Exception as e:
-        print(f"处理{config['name']}数据时出错: {e}")
-        has_chart = False
+            df = load_stock_history(symbol)
+    if df is not None:
+        df = df.iloc[-days:]
     
-    # 如果没有获取到新数据，但是之前已经生成了图表文件，那么使用之前的图表文件
-    if not has_chart and not chart_html:
-        chart_html = read_chart_html(config['chart_file'])
-        if chart_html:
-            print(f"使用之前生成的{config['name']}基差图表文件！")
-            has_chart = True
+    if quote is None:
+        if df is None or len(df) < 2:
+            print(f"自选股{symbol}行情获取失败")
+            return None
+        price = round(float(df['收盘'].iloc[-1]), 2)
+        prev_price = round(float(df['收盘'].iloc[-2]), 2)
+        quote = {'name': name, 'symbol': symbol, 'price': price, 'prev_price': prev_price,
+                 **calculate_price_change(price, prev_price)}
+    
+    kline_html = create_stock_kline_chart(symbol, name, days=days, df=df) if df is not None else ""
+    return {**quote, 'kline_html': kline_html}
+
+
+def get_watchlist_data() -> List[Dict[str, Any]]:
+    """获取全部自选股的行情卡片和日K线图
+    
+    当前行情来自一次全市场快照，日线历史由有界线程池并发增量刷新，
+    K线图按输入指纹只重建有变化的股票。
+    
+    Returns:
+        按WATCHLIST_CONFIG['symbols']顺序排列的自选股数据列表
+    """
+    quotes = get_watchlist_quotes()
+    with ThreadPoolExecutor(max_workers=WATCHLIST_CONFIG['max_workers']) as executor:
+        cards = list(executor.map(
+            lambda symbol: load_watchlist_symbol(symbol, quotes.get(symbol)),
+            WATCHLIST_CONFIG['symbols']
+        ))
+    return [card for card in cards if card]
+
+
+def refresh_watchlist_quotes(watchlist: List[Dict[str, Any]],
+                             quotes: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """用最新行情快照更新已有的自选股卡片，K线图保持不变"""
+    return [{**card, **quotes.get(card['symbol'], {})} for card in watchlist]
+
+
+def run_fetch_task(name: str, task: Dict[str, Any]) -> Any:
+    """执行单个获取任务并记录耗时"""
+    with metric_span(f"fetch.{name}"):
+        return profile_call(task['func'], *task.get('args', ()))
+
+
+def run_fetch_stage(tasks: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """在守护线程中并发执行数据获取任务
+    
+    每个任务在其依赖全部完成后启动，同时运行的任务不超过max_workers个。超过截止时间
+    未完成的任务结果记为None并被放弃：它不再占用并发名额，但线程不会被中止，
+    akshare的大部分接口没有超时，线程可能一直运行到进程退出（见exit_process）。
+    
+    Args:
+        tasks: 任务名 → {'func': 可调用对象, 'args': 参数元组, 'deps': 依赖任务名列表}
+        
+    Returns:
+        任务名 → 任务结果，失败或超时的任务结果为None
+    """
+    results: Dict[str, Any] = {}
+    remaining = dict(tasks)
+    pending = {}
+    deadlines = {}
     
-    return has_chart, chart_html
+    try:
+        while remaining or pending:
+            for name in list(remaining):
+                if len(pending) >= FETCH_CONFIG['max_workers']:
+                    break
+                task = remaining[name]
+                if all(dep in results for dep in task.get('deps', [])):
+                    del remaining[name]
+                    future = start_daemon_task(run_fetch_task, name, task)
+                    pending[future] = name
+                    deadline = FETCH_CONFIG['deadlines'].get(name, FETCH_CONFIG['default_deadline'])
+                    deadlines[name] = time.monotonic() + deadline
+            
+            if not pending:
+                for name in remaining:
+                    print(f"任务{name}的依赖无法满足，跳过")
+                    results[name] = None
+                break
+            
+            timeout = max(0.0, min(deadlines[name] for name in pending.values()) - time.monotonic())
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    print(f"任务{name}执行出错: {e}")
+                    results[name] = None
+            
+            now = time.monotonic()
+            for future, name in list(pending.items()):
+                if now >= deadlines[name]:
+                    print(f"任务{name}超时，放弃等待")
+                    count_metric('fetch.timeouts')
+                    abandon_task(future)
+                    del pending[future]
+                    results[name] = None
+    finally:
+        for future in pending:
+            abandon_task(future)
+    
+    return results
 
 
-def get_latest_strategy_png() -> Optional[str]:
-    """获取最新的红利ETF策略PNG图片
+def build_quote_tasks() -> Dict[str, Dict[str, Any]]:
+    """构建行情获取任务：主股票行情和各指数行情
     
     Returns:
-        最新的PNG文件路径
+        可传给run_fetch_stage的任务字典
     """
-    try:
-        png_files = glob.glob(FILE_PATHS['strategy_png_pattern'])
-        png_files.sort(key=os.path.getmtime, reverse=True)
-        return png_files[0] if png_files else None
-    except Exception as e:
-        print(f"查找策略图片时出错: {e}")
-        return None
+    stock_config = STOCK_CONFIG['main_stock']
+    
+    tasks = {
+        'stock_history': {'func': get_stock_history, 'args': (stock_config['symbol'],)},
+        'stock': {'func': get_stock_data, 'args': (stock_config['symbol'], stock_config['name']),
+                  'deps': ['stock_history']}
+    }
+    
+    for idx in INDEX_CONFIG:
+        tasks[f"index_{idx['symbol']}"] = {'func': get_index_data, 'args': (idx['symbol'], idx['name'])}
+    
+    if WATCHLIST_CONFIG['enabled']:
+        tasks['watchlist_quotes'] = {'func': get_watchlist_quotes}
+    
+    return tasks
 
 
-def read_strategy_fragment() -> str:
-    """读取策略HTML片段
+def build_fetch_tasks() -> Dict[str, Dict[str, Any]]:
+    """构建数据获取阶段的任务依赖图
+    
+    股票行情、最近交易日数据和日K线图共享同一份历史数据，依赖stock_history；
+    指数行情、基差图表和本地文件读取互不依赖。
     
     Returns:
-        HTML片段内容
+        可传给run_fetch_stage的任务字典
     """
+    stock_config = STOCK_CONFIG['main_stock']
+    stock_args = (stock_config['symbol'], stock_config['name'])
+    
+    tasks = build_quote_tasks()
+    tasks.update({
+        'recent_trading': {'func': get_recent_trading_days_data, 'args': stock_args, 'deps': ['stock_history']},
+        'stock_kline': {'func': create_stock_kline_chart, 'args': stock_args, 'deps': ['stock_history']},
+        'latest_png': {'func': get_latest_strategy_png},
+        'strategy_html': {'func': read_strategy_fragment},
+        'hot_concepts': {'func': get_hot_concepts},
+        'stocks_by_concept': {'func': get_stocks_by_concept}
+    })
+    
+    tasks['basis_engine'] = {'func': get_basis_engine}
+    for futures_key in FUTURES_CONFIG:
+        tasks[f"futures_{futures_key}"] = {'func': process_index_futures, 'args': (futures_key,), 'deps': ['basis_engine']}
+        if INTRADAY_CONFIG['enabled']:
+            tasks[f"intraday_{futures_key}"] = {'func': process_intraday_basis, 'args': (futures_key,)}
+    
+    if WATCHLIST_CONFIG['enabled']:
+        tasks['watchlist'] = {'func': get_watchlist_data, 'deps': ['watchlist_quotes']}
+    
+    return tasks
+
+
+def collect_quotes(results: Dict[str, Any]) -> Optional[tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+    """从获取结果中取出股票和指数行情，任一缺失时返回None"""
+    stock_data = results['stock']
+    
+    # 检查关键数据是否获取成功
+    if not stock_data:
+        print("❌ 核心股票数据获取失败，程序终止！")
+        return None
+    
+    indices = []
+    for idx in INDEX_CONFIG:
+        idx_data = results[f"index_{idx['symbol']}"]
+        if not idx_data:
+            print(f"❌ 指数 {idx['name']} 数据获取失败，程序终止！")
+            return None
+        indices.append(idx_data)
+    
+    return stock_data, indices
+
+
+def load_page_context() -> Optional[Dict[str, Any]]:
+    """读取上次完整更新时保存的页面参数"""
+    context_file = get_cache_path(CACHE_CONFIG['page_context_file'])
     try:
-        if os.path.exists(FILE_PATHS['strategy_fragment']):
-            with open(FILE_PATHS['strategy_fragment'], 'r', encoding='utf-8') as f:
-                return f.read()
+        if os.path.exists(context_file):
+            with open(context_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
     except Exception as e:
-        print(f"读取策略片段时出错: {e}")
-    return ""
+        print(f"读取页面参数缓存失败：{e}")
+    return None
 
 
-def generate_html(date: str, stock_data: Dict, indices: List[Dict], 
-                  has_hs300_chart: bool, hs300_chart_html: str,
-                  has_zz1000_chart: bool, zz1000_chart_html: str,
-                  latest_png: Optional[str], strategy_html: str,
-                  hot_concepts: Optional[Dict[str, Any]],
-                  stocks_by_concept: Optional[Dict[str, Any]],
-                  recent_trading_data: Optional[List[Dict[str, Any]]],
-                  stock_kline_html: str) -> str:
-    """生成HTML页面
+def find_missing_chart_data(context: Dict[str, Any]) -> List[str]:
+    """找出页面参数中lazy图表引用、但本地已不存在的数据文件"""
+    missing = []
     
-    Args:
-        date: 日期
-        stock_data: 股票数据
-        indices: 指数数据列表
-        has_hs300_chart: 是否有沪深300图表
-        hs300_chart_html: 沪深300图表HTML
-        has_zz1000_chart: 是否有中证1000图表
-        zz1000_chart_html: 中证1000图表HTML
-        latest_png: 最新策略图片路径
-        strategy_html: 策略HTML片段
-        hot_concepts: 热点概念数据
-        stocks_by_concept: 按概念分组的个股数据
-        recent_trading_data: 最近交易日数据
-        stock_kline_html: 股票日K线图HTML
-        
-    Returns:
-        生成的HTML字符串
-    """
-    try:
-        template_loader = jinja2.FileSystemLoader(searchpath=FILE_PATHS['template_dir'])
-        template_env = jinja2.Environment(loader=template_loader)
-        template = template_env.get_template('index.html')
-        
-        return template.render(
-            date=date,
-            stock=stock_data,
-            indices=indices,
-            has_hs300_chart=has_hs300_chart,
-            hs300_chart_html=hs300_chart_html,
-            has_zz1000_chart=has_zz1000_chart,
-            zz1000_chart_html=zz1000_chart_html,
-            latest_png=latest_png,
-            strategy_html=strategy_html,
-            hot_concepts=hot_concepts,
-            stocks_by_concept=stocks_by_concept,
-            recent_trading_data=recent_trading_data,
-            stock_kline_html=stock_kline_html
-        )
-    except Exception as e:
-        print(f"生成HTML时出错: {e}")
-        return ""
+    def visit(value: Any) -> None:
+        if isinstance(value, str):
+            missing.extend(source for source in CHART_DATA_PATTERN.findall(value) if not os.path.isfile(source))
+        elif isinstance(value, dict):
+            for item in value.values():
+                visit(item)
+        elif isinstance(value, list):
+            for item in value:
+                visit(item)
+    
+    visit(context)
+    return missing
 
 
-def save_json(data: Dict, filepath: str) -> bool:
-    """保存JSON数据
+# 页面中需要发布为独立资源的元素
+ASSET_OPEN_PATTERN = re.compile(r'<style>|<script(?: type="text/javascript")?>')
+CHART_DATA_PATTERN = re.compile(r'data-src="([^"?:]+\.json)(?:\?[^"]*)?"')
+IMAGE_PATTERN = re.compile(r'src="([^"?:]+\.(?:png|jpe?g|gif|webp|svg))"')
+
+
+def publish_asset(content: bytes, name: str, suffix: str, published: List[str]) -> str:
+    """将内容写入以内容哈希命名的资源文件，已存在时不重写
     
     Args:
-        data: 要保存的数据
-        filepath: 文件路径
+        content: 文件内容
+        name: 文件名前缀
+        suffix: 扩展名（含点）
+        published: 本次发布的资源列表，新资源路径会追加到其中
         
     Returns:
-        是否成功保存
+        页面中引用该资源的相对路径
     """
-    try:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False)
-        return True
-    except Exception as e:
-        print(f"保存JSON文件{filepath}时出错: {e}")
-        return False
+    digest = hashlib.sha256(content).hexdigest()[:PUBLISH_CONFIG['hash_length']]
+    path = f"{PUBLISH_CONFIG['asset_dir']}/{name}.{digest}{suffix}"
+    if not os.path.exists(path):
+        os.makedirs(PUBLISH_CONFIG['asset_dir'], exist_ok=True)
+        write_atomic(path, [content], binary=True)
+        count_metric('publish.assets_written')
+    if path not in published:
+        published.append(path)
+    return path
+
+
+def publish_file_refs(html: str, published: List[str]) -> str:
+    """将lazy图表的数据文件和本地图片复制为带哈希的文件名，并改写页面片段中的引用"""
+    def replace_file(match: re.Match, attribute: str) -> str:
+        source = match.group(1)
+        if not os.path.isfile(source):
+            print(f"⚠️ 页面引用的{source}不存在，保留原引用")
+            count_metric('publish.missing_refs')
+            return match.group(0)
+        stem, suffix = os.path.splitext(os.path.basename(source))
+        return f'{attribute}="{publish_asset(read_file_bytes(source), stem, suffix, published)}"'
+    
+    html = CHART_DATA_PATTERN.sub(lambda match: replace_file(match, 'data-src'), html)
+    return IMAGE_PATTERN.sub(lambda match: replace_file(match, 'src'), html)
 
 
-def save_html(html_content: str, filepath: str) -> bool:
-    """保存HTML文件
+def publish_element(open_tag: str, body: str, published: List[str]) -> str:
+    """将一个<style>或内联脚本发布为资源文件，返回替换它的页面片段
+    
+    <style>替换为同位置的<link>；超过inline_max_bytes的内联脚本（包括inline模式下图表的
+    绘制脚本）原位替换为同步加载的外部脚本，执行顺序不变，较小的脚本保留在页面中。
+    """
+    if open_tag == '<style>':
+        return f'<link rel="stylesheet" href="{publish_asset(body.encode("utf-8"), "site", ".css", published)}">'
+    if len(body.encode('utf-8')) <= PUBLISH_CONFIG['inline_max_bytes']:
+        return publish_file_refs(f"{open_tag}{body}</script>", published)
+    return f'<script src="{publish_asset(body.encode("utf-8"), "page", ".js", published)}"></script>'
+
+
+def extract_page_assets(chunks: Iterable[str], published: List[str]) -> Iterator[str]:
+    """在流式渲染的页面块中抽出共享资源，改写引用后按块输出
+    
+    模板输出的块边界可能落在<style>/<script>元素或标签中间：元素内容缓存到结束标签出现，
+    元素之外只保留末尾未闭合的标签，其余内容立即输出，不在内存中拼接整页。
     
     Args:
-        html_content: HTML内容
-        filepath: 文件路径
+        chunks: 模板按块生成的页面
+        published: 本次发布的资源列表
         
-    Returns:
-        是否成功保存
+    Yields:
+        改写引用后的页面块
     """
-    try:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        return True
-    except Exception as e:
-        print(f"保存HTML文件{filepath}时出错: {e}")
-        return False
+    buffer = ''
+    open_tag = None
+    for chunk in itertools.chain(chunks, [None]):
+        if chunk is not None:
+            buffer += chunk
+        while buffer:
+            if open_tag is None:
+                match = ASSET_OPEN_PATTERN.search(buffer)
+                if match:
+                    yield publish_file_refs(buffer[:match.start()], published)
+                    open_tag, buffer = match.group(0), buffer[match.end():]
+                    continue
+                # 末尾未闭合的标签可能是被拆开的<style>、<script>或图片引用，留到下一块再处理
+                cut = buffer.rfind('<')
+                if chunk is None or cut < 0 or '>' in buffer[cut:]:
+                    cut = len(buffer)
+                yield publish_file_refs(buffer[:cut], published)
+                buffer = buffer[cut:]
+                break
+            
+            close_tag = '</style>' if open_tag == '<style>' else '</script>'
+            end = buffer.find(close_tag)
+            if end < 0:
+                break
+            yield publish_element(open_tag, buffer[:end], published)
+            open_tag, buffer = None, buffer[end + len(close_tag):]
+    if open_tag is not None:
+        # 页面以没有结束标签的元素结尾时原样输出
+        yield open_tag + buffer
 
 
-def get_hot_concepts() -> Optional[Dict[str, Any]]:
-    """获取热点概念数据
+def compress_file(filepath: str) -> None:
+    """为文件生成.gz和.br预压缩版本，已有版本不比原文件旧时跳过
     
-    Returns:
-        热点概念分析数据，如果文件不存在则返回None
+    brotli是可选依赖，未安装时只生成.gz。
     """
+    if (os.path.splitext(filepath)[1] not in PUBLISH_CONFIG['compress_suffixes']
+            or os.path.getsize(filepath) < PUBLISH_CONFIG['compress_min_bytes']):
+        return
+    
+    variants = {'.gz': lambda data: gzip.compress(data, compresslevel=PUBLISH_CONFIG['gzip_level'], mtime=0)}
+    if importlib.util.find_spec('brotli') is not None:
+        import brotli
+        variants['.br'] = lambda data: brotli.compress(data, quality=PUBLISH_CONFIG['brotli_quality'])
+    
+    data = None
+    for suffix, compress in variants.items():
+        target = filepath + suffix
+        if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(filepath):
+            continue
+        if data is None:
+            data = read_file_bytes(filepath)
+        with metric_span(f"publish.compress{suffix}"):
+            write_atomic(target, [compress(data)], binary=True)
+
+
+def load_publish_manifest() -> List[List[str]]:
+    """读取最近几次发布引用的资源列表，最新的在最后"""
+    manifest_file = get_cache_path(PUBLISH_CONFIG['manifest_file'])
     try:
-        if os.path.exists('hot_concepts_analysis.json'):
-            with open('hot_concepts_analysis.json', 'r', encoding='utf-8') as f:
+        if os.path.exists(manifest_file):
+            with open(manifest_file, 'r', encoding='utf-8') as f:
                 return json.load(f)
-        return None
     except Exception as e:
-        print(f"读取热点概念数据失败: {e}")
-        return None
+        print(f"读取发布清单失败：{e}")
+    return []
 
 
-def get_stocks_by_concept() -> Optional[Dict[str, Any]]:
-    """获取按概念分组的个股数据
-    
-    Returns:
-        按概念分组的个股数据，如果文件不存在则返回None
-    """
-    try:
-        if os.path.exists('all_hot_stocks.json'):
-            with open('all_hot_stocks.json', 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # 收集所有股票
-            all_stocks = []
-            for key, stocks_list in data.items():
-                if isinstance(stocks_list, list):
-                    all_stocks.extend(stocks_list)
-            
-            # 提取所有概念并统计
-            concept_stocks = {}
-            for stock in all_stocks:
-                if 'concept' in stock and stock['concept']:
-                    concepts = [c.strip() for c in stock['concept'].split() if c.strip()]
-                    for concept in concepts:
-                        if concept not in concept_stocks:
-                            concept_stocks[concept] = []
-                        # 只添加唯一的股票（根据代码）
-                        if not any(s['code'] == stock['code'] for s in concept_stocks[concept]):
-                            concept_stocks[concept].append(stock)
-            
-            # 按股票数量排序概念
-            sorted_concepts = sorted(concept_stocks.items(), key=lambda x: len(x[1]), reverse=True)
-            
-            return {
-                'total_stocks': len(all_stocks),
-                'total_concepts': len(concept_stocks),
-                'sorted_concepts': [{'concept': c, 'stocks': s} for c, s in sorted_concepts]
-            }
-        return None
-    except Exception as e:
-        print(f"读取个股数据失败: {e}")
-        return None
+def remove_stale_assets(generations: List[List[str]]) -> None:
+    """删除资源目录中不再被最近几次发布引用的文件及其压缩版本"""
+    keep = {path for generation in generations for path in generation}
+    for filepath in glob.glob(os.path.join(PUBLISH_CONFIG['asset_dir'], '*')):
+        source = filepath[:-len(os.path.splitext(filepath)[1])] if filepath.endswith(('.gz', '.br')) else filepath
+        if source.replace(os.sep, '/') not in keep:
+            os.remove(filepath)
+            count_metric('publish.assets_removed')
 
 
-def get_recent_trading_days_data(symbol: str, name: str, days: int = 20) -> Optional[List[Dict[str, Any]]]:
-    """获取最近N个交易日的数据
+def publish_site(html_file: str, published: List[str]) -> bool:
+    """发布阶段：为页面和资源生成预压缩版本，并清理不再引用的旧资源
+    
+    共享资源已在render_html_to_file流式写出页面时抽出，页面本身只剩下随每次运行变化的
+    HTML外壳，其余资源以内容哈希命名，内容不变时文件名不变，可以长期缓存。
     
     Args:
-        symbol: 股票代码
-        name: 股票名称
-        days: 交易日天数
+        html_file: 已渲染的页面文件
+        published: 渲染时发布的资源列表
         
     Returns:
-        包含最近交易日数据的列表
+        是否发布成功
     """
+    if not PUBLISH_CONFIG['enabled']:
+        return True
+    
     try:
-        df = ak.stock_zh_a_hist(symbol=symbol, period="daily", adjust="")
-        # 获取最近N个交易日的数据
-        recent_data = []
-        
-        # 确保有足够的数据
-        start_idx = max(0, len(df) - days)
-        
-        for i in range(start_idx, len(df)):
-            row = df.iloc[i]
-            
-            # 尝试获取日期
-            if '日期' in df.columns:
-                date = row['日期']
-            elif 'date' in df.columns:
-                date = row['date']
-            else:
-                # 如果没有日期列，使用索引
-                date = str(row.name)
-            
-            # 计算涨跌幅
-            close = round(row['收盘'], 2)
-            open_price = round(row['开盘'], 2)
-            high = round(row['最高'], 2)
-            low = round(row['最低'], 2)
-            volume = int(row['成交量'])
-            amount = round(row['成交额'], 2)
-            
-            # 计算涨跌幅
-            change = round(close - open_price, 2)
-            change_pct = round((change / open_price) * 100, 2) if open_price != 0 else 0.0
-            
-            recent_data.append({
-                'date': date,
-                'open': open_price,
-                'high': high,
-                'low': low,
-                'close': close,
-                'change': change,
-                'change_pct': change_pct,
-                'volume': volume,
-                'amount': amount
-            })
+        for filepath in [html_file, *published]:
+            compress_file(filepath)
         
-        return recent_data
+        generations = (load_publish_manifest() + [published])[-PUBLISH_CONFIG['keep_generations']:]
+        remove_stale_assets(generations)
+        write_atomic(get_cache_path(PUBLISH_CONFIG['manifest_file']), [json.dumps(generations, ensure_ascii=False)])
+        print(f"已发布{len(published)}个资源文件到 {PUBLISH_CONFIG['asset_dir']}/")
+        return True
     except Exception as e:
-        print(f"获取{name}最近{days}个交易日数据失败: {e}")
-        return None
+        print(f"发布页面资源失败：{e}")
+        return False
 
 
-def create_stock_kline_chart(symbol: str, name: str, days: int = 180) -> str:
-    """创建股票日k图
+def publish_outputs(date: str, context: Dict[str, Any]) -> bool:
+    """写出price.json和index.html，并保存页面参数供轻量更新使用
     
     Args:
-        symbol: 股票代码
-        name: 股票名称
-        days: 显示的交易日天数
+        date: 日期
+        context: 除日期外的模板参数，与render_html_to_file相同
         
     Returns:
-        生成的HTML图表字符串
+        页面是否成功生成
     """
+    data = {
+        'date': date,
+        'stock': context['stock_data'],
+        'indices': context['indices'],
+        'has_hs300_chart': context['has_hs300_chart'],
+        'has_zz1000_chart': context['has_zz1000_chart']
+    }
+    # 日期不参与指纹计算：行情没有变化时（如节假日）不重写文件
+    price_fp = fingerprint({k: v for k, v in data.items() if k != 'date'})
+    if is_artifact_clean('price_json', price_fp, [FILE_PATHS['price_json']]):
+        print(f"行情数据未变化，跳过写入 {FILE_PATHS['price_json']}")
+        count_metric('build.reused')
+    else:
+        with metric_span('publish.price_json'):
+            if save_json(data, FILE_PATHS['price_json']):
+                mark_artifact_built('price_json', price_fp)
+    
     try:
-        df = ak.stock_zh_a_hist(symbol=symbol, period="daily", adjust="")
-        
-        # 获取最近N个交易日的数据
-        start_idx = max(0, len(df) - days)
-        df_recent = df.iloc[start_idx:]
-        
-        # 准备数据
-        dates = []
-        opens = []
-        highs = []
-        lows = []
-        closes = []
-        
-        for i in range(len(df_recent)):
-            row = df_recent.iloc[i]
-            date = row.name.strftime('%Y-%m-%d') if hasattr(row.name, 'strftime') else str(row.name)
-            dates.append(date)
-            opens.append(round(row['开盘'], 2))
-            highs.append(round(row['最高'], 2))
-            lows.append(round(row['最低'], 2))
-            closes.append(round(row['收盘'], 2))
-        
-        # 创建K线图
-        fig = go.Figure(data=[go.Candlestick(
-            x=dates,
-            open=opens,
-            high=highs,
-            low=lows,
-            close=closes,
-            increasing_line_color='#27ae60',
-            decreasing_line_color='#e74c3c'
-        )])
-        
-        # 更新布局
-        fig.update_layout(
-            title=f'{name}({symbol}) 日K线图',
-            xaxis_title='日期',
-            yaxis_title='价格',
-            width=1000,
-            height=600,
-            template='plotly_white',
-            hovermode='x unified'
-        )
-        
-        # 添加成交量
-        volumes = [int(row['成交量']) for _, row in df_recent.iterrows()]
-        fig.add_trace(go.Bar(
-            x=dates,
-            y=volumes,
-            name='成交量',
-            yaxis='y2',
-            marker_color=['#27ae60' if closes[i] >= opens[i] else '#e74c3c' for i in range(len(closes))],
-            opacity=0.6
-        ))
-        
-        # 更新Y轴
-        fig.update_layout(
-            yaxis2=dict(
-                title='成交量',
-                overlaying='y',
-                side='right',
-                showgrid=False
-            )
-        )
-        
-        # 更新X轴
-        fig.update_xaxes(
-            rangeslider_visible=False,
-            rangeselector=dict(
-                buttons=list([
-                    dict(count=30, label="30天", step="day", stepmode="backward"),
-                    dict(count=60, label="60天", step="day", stepmode="backward"),
-                    dict(count=90, label="90天", step="day", stepmode="backward"),
-                    dict(count=180, label="180天", step="day", stepmode="backward"),
-                    dict(step="all")
-                ])
-            )
-        )
-        
-        # 转换为HTML
-        return fig.to_html(
-            include_plotlyjs='cdn',
-            full_html=False
-        )
+        write_atomic(get_cache_path(CACHE_CONFIG['page_context_file']),
+                     [json.dumps(context, ensure_ascii=False, default=str)])
     except Exception as e:
-        print(f"创建{name}日K线图失败: {e}")
-        return ""
+        print(f"保存页面参数缓存失败：{e}")
+    
+    # 耗时汇总每次都不同，不参与指纹计算，只在页面因其他输入变化而重新渲染时更新
+    page_fp = fingerprint(context, read_file_bytes(FILE_PATHS['template_file']), PUBLISH_CONFIG)
+    assets = (load_publish_manifest() or [[]])[-1] if PUBLISH_CONFIG['enabled'] else []
+    if is_artifact_clean('index_html', page_fp, [FILE_PATHS['index_html'], *assets]):
+        print(f"✅ 页面输入未变化，跳过渲染 {FILE_PATHS['index_html']}")
+        count_metric('build.reused')
+        return True
+    
+    published = [] if PUBLISH_CONFIG['enabled'] else None
+    with metric_span('publish.index_html'):
+        rendered = render_html_to_file(FILE_PATHS['index_html'], date=date, published=published,
+                                       run_metrics=get_timing_summary(), **context)
+    if rendered:
+        # 发布失败时页面仍是可用的渲染结果，不记录指纹，下次运行重新渲染和发布
+        with metric_span('publish.assets'):
+            compressed = publish_site(FILE_PATHS['index_html'], published or [])
+        if compressed:
+            mark_artifact_built('index_html', page_fp)
+        print(f"✅ 数据更新完成！HTML文件已保存到 {FILE_PATHS['index_html']}")
+        return True
+    else:
+        print("❌ HTML生成失败！")
+        return False
 
 
 def main():
@@ -762,83 +3596,154 @@ def main():
     
     date = datetime.datetime.now().strftime('%Y-%m-%d')
     
-    stock_config = STOCK_CONFIG['main_stock']
-    stock_data = get_stock_data(stock_config['symbol'], stock_config['name'])
+    enable_render_pool()
+    try:
+        with metric_span('stage.fetch'):
+            results = run_fetch_stage(build_fetch_tasks())
+    finally:
+        shutdown_render_pool()
+    profile_checkpoint('fetch')
     
-    # 检查关键数据是否获取成功
-    if not stock_data:
-        print("❌ 核心股票数据获取失败，程序终止！")
+    quotes = collect_quotes(results)
+    if quotes is None:
         return False
+    stock_data, indices = quotes
     
-    # 获取最近20个交易日数据
-    recent_trading_data = get_recent_trading_days_data(stock_config['symbol'], stock_config['name'])
+    # 最近20个交易日数据
+    recent_trading_data = results['recent_trading']
     
-    # 创建长江电力日K线图
-    stock_kline_html = create_stock_kline_chart(stock_config['symbol'], stock_config['name'])
-    
-    # 获取指数数据
-    indices = []
-    for idx in INDEX_CONFIG:
-        idx_data = get_index_data(idx['symbol'], idx['name'])
-        if not idx_data:
-            print(f"❌ 指数 {idx['name']} 数据获取失败，程序终止！")
-            return False
-        indices.append(idx_data)
+    # 长江电力日K线图
+    stock_kline_html = results['stock_kline'] or ""
     
-    # 获取基差图表
-    has_hs300_chart, hs300_chart_html = process_index_futures('hs300')
-    has_zz1000_chart, zz1000_chart_html = process_index_futures('zz1000')
+    # 基差图表
+    has_hs300_chart, hs300_chart_html = results['futures_hs300'] or (False, "")
+    has_zz1000_chart, zz1000_chart_html = results['futures_zz1000'] or (False, "")
     
     # 检查基差图表是否获取成功
     if not has_hs300_chart or not has_zz1000_chart:
         print("❌ 基差图表获取失败，程序终止！")
         return False
     
-    data = {
-        'date': date,
-        'stock': stock_data,
+    latest_png = results['latest_png']
+    strategy_html = results['strategy_html'] or ""
+    
+    # 热点概念数据
+    hot_concepts = results['hot_concepts']
+    # 按概念分组的个股数据
+    stocks_by_concept = results['stocks_by_concept']
+    
+    # 分时基差图表（仅在启用分时模式时获取）
+    intraday_charts = [
+        results[f"intraday_{futures_key}"]
+        for futures_key in FUTURES_CONFIG
+        if results.get(f"intraday_{futures_key}") and results[f"intraday_{futures_key}"]['html']
+    ]
+    
+    context = {
+        'stock_data': stock_data,
         'indices': indices,
         'has_hs300_chart': has_hs300_chart,
-        'has_zz1000_chart': has_zz1000_chart
+        'hs300_chart_html': hs300_chart_html,
+        'has_zz1000_chart': has_zz1000_chart,
+        'zz1000_chart_html': zz1000_chart_html,
+        'latest_png': latest_png,
+        'strategy_html': strategy_html,
+        'hot_concepts': hot_concepts,
+        'stocks_by_concept': stocks_by_concept,
+        'recent_trading_data': recent_trading_data,
+        'stock_kline_html': stock_kline_html,
+        'intraday_charts': intraday_charts,
+        'watchlist': results.get('watchlist') or [],
+        'basis_overview': summarize_basis_engine(results['basis_engine'])
     }
-    save_json(data, FILE_PATHS['price_json'])
-    
-    latest_png = get_latest_strategy_png()
-    strategy_html = read_strategy_fragment()
-    
-    # 获取热点概念数据
-    hot_concepts = get_hot_concepts()
-    # 获取按概念分组的个股数据
-    stocks_by_concept = get_stocks_by_concept()
-    
-    html = generate_html(
-        date=date,
-        stock_data=stock_data,
-        indices=indices,
-        has_hs300_chart=has_hs300_chart,
-        hs300_chart_html=hs300_chart_html,
-        has_zz1000_chart=has_zz1000_chart,
-        zz1000_chart_html=zz1000_chart_html,
-        latest_png=latest_png,
-        strategy_html=strategy_html,
-        hot_concepts=hot_concepts,
-        stocks_by_concept=stocks_by_concept,
-        recent_trading_data=recent_trading_data,
-        stock_kline_html=stock_kline_html
-    )
+    with metric_span('stage.archive'):
+        archive_run(stock_data, indices, context['watchlist'], results['basis_engine'])
+    context['stock_trail'] = get_quote_trail(stock_data['symbol'])
     
-    if html:
-        save_html(html, FILE_PATHS['index_html'])
-        print(f"✅ 数据更新完成！HTML文件已保存到 {FILE_PATHS['index_html']}")
-        return True
-    else:
-        print("❌ HTML生成失败！")
+    with metric_span('stage.publish'):
+        success = publish_outputs(date, context)
+    profile_checkpoint('render')
+    return success
+
+
+def run_light_update() -> bool:
+    """轻量更新：只刷新股票和指数行情，其余页面内容沿用上次完整更新的结果
+    
+    没有上次完整更新保存的页面参数，或其中的图表引用的数据文件已不存在时退回完整更新。
+    """
+    context = load_page_context()
+    if context is None:
+        print("没有可用的页面参数缓存，执行完整更新")
+        return main()
+    missing = find_missing_chart_data(context)
+    if missing:
+        print(f"页面参数引用的图表数据已不存在（{', '.join(missing)}），执行完整更新")
+        return main()
+    
+    print("开始轻量更新行情数据...")
+    date = datetime.datetime.now().strftime('%Y-%m-%d')
+    
+    with metric_span('stage.fetch'):
+        results = run_fetch_stage(build_quote_tasks())
+    profile_checkpoint('fetch')
+    quotes = collect_quotes(results)
+    if quotes is None:
         return False
+    context['stock_data'], context['indices'] = quotes
+    context['watchlist'] = refresh_watchlist_quotes(context.get('watchlist') or [],
+                                                    results.get('watchlist_quotes') or {})
+    with metric_span('stage.archive'):
+        archive_run(context['stock_data'], context['indices'], context['watchlist'])
+    context['stock_trail'] = get_quote_trail(context['stock_data']['symbol'])
+    
+    with metric_span('stage.publish'):
+        success = publish_outputs(date, context)
+    profile_checkpoint('render')
+    return success
 
 
-if __name__ == '__main__':
-    success = main()
+def cli(argv: Optional[List[str]] = None) -> int:
+    """命令行入口
+    
+    Args:
+        argv: 命令行参数，默认读取sys.argv
+        
+    Returns:
+        进程退出码
+    """
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='更新股票行情数据和仪表盘页面')
+    parser.add_argument(
+        '--tier',
+        choices=['full', 'light'],
+        default='full',
+        help='更新级别：full为完整更新（默认），light只刷新行情并更新已有页面'
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='开启CPU和内存剖析，结果写入剖析目录，不影响页面和数据文件'
+    )
+    parser.add_argument(
+        '--profile-dir',
+        default=PROFILE_CONFIG['dir'],
+        help=f"剖析结果目录（默认{PROFILE_CONFIG['dir']}）"
+    )
+    args = parser.parse_args(argv)
+    
+    run_update = run_light_update if args.tier == 'light' else main
+    reset_metrics()
+    success = run_profiled(run_update, args.profile_dir) if args.profile else run_update()
+    if _source_stats is not None:
+        save_source_stats()
+    prune_http_cache()
+    write_metrics(args.tier, success)
     if not success:
         print("❌ 程序执行失败，退出！")
-        import sys
-        sys.exit(1)
\ No newline at end of file
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    exit_process(cli())